@@ -0,0 +1,120 @@
+# OFFLINE BENCHMARK OF RAW SOURCES
+# Replays recorded http responses (python main.py raw --record PATH) with latency and errors:
+# route discovery, paging throughput and memory per source class, no network
+# ex: python benchmark.py --fixtures data/_fixtures --sources eia wb --latency 0.05 0.2 --error-rate 0.02
+import os
+import time
+import shutil
+import inspect
+import argparse
+import tempfile
+import importlib
+import contextlib
+import tracemalloc
+import main
+import raw
+import utils.stats as stats
+
+
+# Raw source classes defined in a source module
+def _source_classes(module):
+    return [cls for _, cls in inspect.getmembers(module, inspect.isclass)
+            if issubclass(cls, raw.Raw) and cls.__module__ == module.__name__]
+
+
+# Fresh output and cache folders, no state of a previous run: every response comes from the replay adapter
+def _reset(data_path, cls):
+    shutil.rmtree(data_path, ignore_errors=True)
+    raw.data_raw = os.path.join(data_path, '_raw/')
+    raw.data_cache = os.path.join(data_path, '_cache/')
+    raw._sessions.clear()
+    raw._caches.clear()
+    raw._limiters.clear()
+    raw._stores.clear()
+    raw._decoders.clear()
+    raw._page_links.clear()
+    cls._clear_state()
+
+
+def _adapter(cls):
+    return cls._session().get_adapter('https://')
+
+
+def benchmark(cls, data_path, log):
+    """
+    Replays a source class: route discovery (routes analysis and links), then all routes to raw files.
+    :return: dict of timings, requests, rows, bytes and peak memory (python allocations)
+    """
+    result = {'source': cls.__name__}
+    _reset(data_path, cls)
+    with contextlib.redirect_stdout(log):
+        start = time.perf_counter()
+        routes = cls._routes()
+        if issubclass(cls, raw.File):
+            for route in routes:
+                cls(cls.base_url, cls.base_params, route)._get_url()
+        result['discovery'] = time.perf_counter() - start
+        result['discovery_requests'] = _adapter(cls).requests
+
+        _reset(data_path, cls)
+        tracemalloc.start()
+        start = time.perf_counter()
+        cls.to_raw()
+        result['paging'] = time.perf_counter() - start
+        result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    adapter = _adapter(cls)
+    result.update(stats.output_stats(raw.data_raw))
+    result['requests'] = adapter.requests
+    result['misses'] = adapter.misses
+    result['rows_per_second'] = result['rows'] / result['paging'] if result['paging'] else 0
+    return result
+
+
+def _print_results(results):
+    print(f"{'source':<14} {'discovery':>10} {'paging':>9} {'requests':>9} {'misses':>7} {'rows':>10} "
+          f"{'rows/s':>10} {'bytes':>13} {'peak MB':>8}")
+    for result in results:
+        print(f"{result['source']:<14} {result['discovery']:>9.2f}s {result['paging']:>8.2f}s {result['requests']:>9} "
+              f"{result['misses']:>7} {result['rows']:>10,} {result['rows_per_second']:>10,.0f} {result['bytes']:>13,} "
+              f"{result['peak_memory'] / 1024 ** 2:>8.1f}")
+
+
+def run(fixtures_path, source_list=None, latency=0, error_rate=0, repeat=1):
+    raw.Raw.replay_path = fixtures_path
+    raw.Raw.replay_latency = tuple(latency) if isinstance(latency, (list, tuple)) else latency
+    raw.Raw.replay_error_rate = error_rate
+    # Retries are part of the benchmark, not their delays
+    raw.Api.retry_delay = 0
+    raw.File.retry_delay = 0
+
+    results = []
+    data_path = tempfile.mkdtemp(prefix='sdp_benchmark_')
+    log_filename = os.path.join(tempfile.gettempdir(), 'sdp_benchmark.log')
+    try:
+        with open(log_filename, 'w', encoding='utf-8') as log:
+            for source, module_names in main._sources(source_list):
+                for module_name in module_names:
+                    module = importlib.import_module(module_name)
+                    for cls in _source_classes(module):
+                        for _ in range(repeat):
+                            results.append(benchmark(cls, os.path.join(data_path, 'data'), log))
+    finally:
+        shutil.rmtree(data_path, ignore_errors=True)
+
+    _print_results(results)
+    print(f'\nSources log: {log_filename}')
+    return results
+
+
+if __name__== "__main__":
+    parser = argparse.ArgumentParser(description='SDP raw sources offline benchmark')
+    parser.add_argument('--fixtures', required=True, help='fixtures recorded with: python main.py raw --record PATH')
+    parser.add_argument('--sources', nargs='*', help='sources to run (ex: eia wb), all if not set')
+    parser.add_argument('--latency', nargs='+', type=float, default=[0], help='seconds per response, or min max')
+    parser.add_argument('--error-rate', type=float, default=0, help='share of requests failing with a 503')
+    parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args()
+
+    run(args.fixtures, args.sources, args.latency if len(args.latency) > 1 else args.latency[0], args.error_rate, args.repeat)
@@ -1,41 +1,153 @@
 
 # MAIN FILE FOR SDP
 import os
+import time
+import argparse
 import importlib
+import contextlib
+import traceback
+import concurrent.futures
+from datetime import datetime
 
 # Get the parent path of the current script
 cur_path = os.path.dirname(os.path.abspath(__file__))
 sources_path = 'sources'
-source_modules = []
+# Source registry from file names only: {source: [module names]}
+# a module is imported (with pandas, requests and its routes) only when its source is selected
+source_modules = {}
 
-# Init source modules
+# Init source registry
 # loop through all raw sources in the folder
-for module in os.listdir(os.path.join(cur_path, sources_path)):
+for module in sorted(os.listdir(os.path.join(cur_path, sources_path))):
     # check if the file is a python module
-    if module.startswith('raw_') or module.startswith('process_'):
-        # extract the module name
+    if (module.startswith('raw_') or module.startswith('process_')) and module.endswith('.py'):
+        # extract the module and source names
         module_name = module[:-3]
-        source_modules.append(importlib.import_module(sources_path + '.' + module_name))
+        source = module_name.split('_')[1]
+        source_modules.setdefault(source, []).append(sources_path + '.' + module_name)
 
 
-def _main(source_list=None, exclude_list=None, raw=True, test=False):
-    
-    # loop through all raw sources in the folder
-    for module in source_modules:
+# Max sources run at the same time (one worker process per source)
+max_workers = 4
+# Per source logs of a run
+data_log = 'data/_log/'
+
+
+# Available sources, nothing imported
+def list_sources():
+    return list(source_modules)
+
+
+def _sources(source_list=None, exclude_list=None):
+    sources = []
+    for source, module_names in source_modules.items():
         # Filter sources based on main params
-        source=module.__name__.split('_')[1]
         if (not source_list or source in source_list) and (not exclude_list or not source in exclude_list):
+            sources.append((source, module_names))
+    for source in (source_list or []):
+        if source not in source_modules:
+            print(f'[WARNING] Unknown source: {source} (available: {", ".join(list_sources())})')
+    return sources
+
+
+# Worker process: run the steps of one source, stdout and stderr to the source log file
+def _run_source(source, module_names, steps, test, offline, check=False, run_id=None, record_path=None, replay_path=None):
+    from raw import Raw, data_raw, data_processed
+    import utils.stats as stats
+    import utils.manifest as manifest
+    
+    # Same run id for all sources (manifest changes)
+    manifest.run_id = run_id or manifest.run_id
+    
+    # Offline: http responses served from cache only
+    Raw.offline = offline
+    # Check: only tell if new files are available
+    Raw.check = check
+    # Record or replay http responses (fixtures)
+    Raw.record_path = record_path
+    Raw.replay_path = replay_path
+    
+    if not os.path.exists(data_log):
+        os.makedirs(data_log)
+    log_filename = data_log + source + '.log'
+    summary = []
+    with open(log_filename, 'w', encoding='utf-8', buffering=1) as log, \
+            contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        modules = [importlib.import_module(module_name) for module_name in module_names]
+        for raw in steps:
+            step = 'raw' if raw else 'process'
+            start = time.time()
+            status = 'ok'
             print('\n------------------------------------------------------------------------------------')
             if (test):
                 print('\n################################')
                 print('## TEST MODE')
                 print('################################')
                  
-            print('\n-- ' + 'RAW' if raw else 'PROCESS')
+            print('\n-- ' + ('RAW' if raw else 'PROCESS'))
             print(f'-- SOURCE NAME: {source.upper()}')
+            
+            # Run main method for this source, a failure only stops this source
+            try:
+                for module in modules:
+                    module.main(raw, test)
+            except Exception:
+                status = 'failed'
+                print(f'[ERROR] {source} {step} failed')
+                traceback.print_exc()
+            
+            output_path = (data_raw if raw else data_processed) + source + '/'
+            summary.append({'source': source, 'step': step, 'status': status,
+                            'duration': round(time.time() - start, 1), 
+                            **stats.output_stats(output_path, since=start), 'log': log_filename})
+            # a failed raw step leaves nothing new to process
+            if status == 'failed':
+                break
+    return summary
+
+
+def _print_summary(summary):
+    print('\n------------------------------------------------------------------------------------')
+    print('-- SUMMARY')
+    for item in summary:
+        print(f"{item['source']:<8} {item['step']:<8} {item['status']:<7} {item['duration']:>8}s "
+              f"{item['files']:>4} files {item['bytes']:>14,} bytes {item['rows']:>12,} rows  ({item['log']})")
+
 
-            # Run main method for this source
-            module.main(raw, test)       
+def _main(source_list=None, exclude_list=None, steps=(True,), test=False, offline=False, workers=None, check=False,
+          record_path=None, replay_path=None):
+    
+    sources = _sources(source_list, exclude_list)
+    summary = []
+    if not sources:
+        return summary
+    
+    # Sources hit different hosts: run them in parallel, each source runs its steps in order
+    run_id = datetime.now().isoformat(timespec='seconds')
+    print(f'-- RUN ID: {run_id}')
+    workers = max(1, min(workers or max_workers, len(sources)))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_run_source, source, module_names, steps, test, offline, check, run_id,
+                                   record_path, replay_path): source 
+                   for source, module_names in sources}
+        for future in concurrent.futures.as_completed(futures):
+            source = futures[future]
+            try:
+                source_summary = future.result()
+            except Exception as e:
+                # worker process crash (ex: killed), other sources keep running
+                source_summary = [{'source': source, 'step': 'raw' if steps[0] else 'process', 'status': 'failed',
+                                   'duration': 0, 'files': 0, 'bytes': 0, 'rows': 0, 'log': data_log + source + '.log'}]
+                print(f'[ERROR] {source}: {e}')
+            for item in source_summary:
+                print(f"-- {item['source'].upper()} {item['step']}: {item['status']} in {item['duration']}s")
+            summary.extend(source_summary)
+    
+    # Sources order for the summary
+    order = [source for source, _ in sources]
+    summary.sort(key=lambda item: order.index(item['source']))
+    _print_summary(summary)
+    return summary
     
     # if (not test):
     #     import utils.zip as zip
@@ -43,20 +155,43 @@ def _main(source_list=None, exclude_list=None, raw=True, test=False):
 
 # Shortcuts
 # Get raw data from sources
-def raw(source_list=None, exclude_list=None, test=False):
-    _main(source_list, exclude_list, True, test)
+def raw(source_list=None, exclude_list=None, test=False, offline=False, workers=None, check=False,
+        record_path=None, replay_path=None):
+    return _main(source_list, exclude_list, (True,), test, offline, workers, check, record_path, replay_path)
 
 # Process data from raw csv files
-def process(source_list=None, exclude_list=None, test=False):
-    _main(source_list, exclude_list, False, test)
+def process(source_list=None, exclude_list=None, test=False, offline=False, workers=None):
+    return _main(source_list, exclude_list, (False,), test, offline, workers)
     
-# Raw AND Process
-def all(source_list=None, exclude_list=None, test=False):
-    raw(source_list, exclude_list, test)  
-    process(source_list, exclude_list, test)     
+# Raw AND Process (a source is processed as soon as its raw step is done)
+def all(source_list=None, exclude_list=None, test=False, offline=False, workers=None, record_path=None, replay_path=None):
+    return _main(source_list, exclude_list, (True, False), test, offline, workers, False, record_path, replay_path)
            
-# Default behavior when running this file       
+# Default behavior when running this file  
+# ex: python main.py raw --sources eia wb --offline     
 if __name__== "__main__":
-    #main(['wb'],['eia'], True, False) 
-    #all(['wb'] , [], True) 
-    raw(['eia'] , [] ,False)
+    parser = argparse.ArgumentParser(description='SDP raw sources')
+    parser.add_argument('mode', nargs='?', choices=['raw', 'process', 'all'], default='raw')
+    parser.add_argument('--sources', nargs='*', help='sources to run (ex: eia wb), all if not set')
+    parser.add_argument('--exclude', nargs='*', help='sources to skip')
+    parser.add_argument('--test', action='store_true', help='only analyze and list routes')
+    parser.add_argument('--offline', action='store_true', help='serve http responses from cache only')
+    parser.add_argument('--check', action='store_true', help='raw: only tell if new files are available')
+    parser.add_argument('--record', metavar='PATH', help='record http responses as fixtures in PATH')
+    parser.add_argument('--replay', metavar='PATH', help='replay http responses from the fixtures in PATH (no network)')
+    parser.add_argument('--list', action='store_true', help='list available sources and exit')
+    parser.add_argument('--workers', type=int, help=f'max sources run in parallel (default {max_workers})')
+    args = parser.parse_args()
+    if args.list:
+        print('\n'.join(list_sources()))
+        exit(0)
+    
+    modes = {'raw': raw, 'process': process, 'all': all}
+    if args.check:
+        summary = raw(args.sources, args.exclude, args.test, args.offline, args.workers, check=True)
+    elif args.mode == 'process':
+        summary = process(args.sources, args.exclude, args.test, args.offline, args.workers)
+    else:
+        summary = modes[args.mode](args.sources, args.exclude, args.test, args.offline, args.workers,
+                                   record_path=args.record, replay_path=args.replay)
+    exit(1 if any(item['status'] == 'failed' for item in summary) else 0)
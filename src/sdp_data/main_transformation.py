@@ -8,14 +8,20 @@ from src.sdp_data.transformation.demographic.worldbank_scrap import WorldBankScr
 from src.sdp_data.transformation.demographic.gdp import GdpMaddissonPerZoneAndCountryProcessor, GdpWorldBankPerZoneAndCountryProcessor
 from src.sdp_data.transformation.eia import EiaConsumptionGasBySectorProcessor, EiaConsumptionOilPerProductProcessor, EiaFinalEnergyConsumptionProcessor, EiaFinalEnergyPerSectorPerEnergyProcessor, EiaElectricityGenerationByEnergyProcessor, EiaConsumptionOilsPerSectorProcessor, EiaFinalEnergyConsumptionPerSectorProcessor
 from src.sdp_data.utils.format import StatisticsDataframeFormatter
+from src.sdp_data.utils.excel import read_excel
 from src.sdp_data.transformation.ghg.pik import PikCleaner
 from src.sdp_data.transformation.ghg.edgar import EdgarCleaner
 from src.sdp_data.transformation.ghg.ghg import GhgPikEdgarCombinator, PikUnfcccAnnexesCombinator, EdgarUnfcccAnnexesCombinator, GhgMultiSourcesCombinator
 from src.sdp_data.transformation.ghg.unfcc import UnfcccAnnexesCleaner, UnfccProcessor
 from src.sdp_data.transformation.ghg.fao import FaoDataProcessor
 from src.sdp_data.transformation.ghg.cait import CaitProcessor
+from src.sdp_data.utils.gwp import GWP_SETS
+from src.sdp_data.utils.dag import Stage, Dag
+from src.sdp_data.utils.stage_cache import StageCache
 import pandas as pd
 import os
+import argparse
+from functools import partial
 import requests
 from pandas import json_normalize
 
@@ -23,9 +29,26 @@ RAW_DATA_DIR = os.path.join(os.path.dirname(__file__), "../../results/raw_new_da
 RESULTS_DIR = os.path.join(os.path.dirname(__file__), "../../results/new_prod_data")
 CURRENT_DATA_DIR = os.path.join(os.path.dirname(__file__), "../../results/current_data")
 CURRENT_PROD_DATA = os.path.join(os.path.dirname(__file__), "../../results/current_prod_data")
+GHG_DATA_DIR = os.path.join(os.path.dirname(__file__), "../../data/thibaud/ghg/")
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "../../data/_cache/transformation")
 
 
 class TransformationPipeline:
+    """
+    Transformation stages, declared with the datasets they read and produce (see stages()):
+    run() executes the stages required by the targets, independent stages in parallel processes.
+    """
+
+    # Max stages run at the same time (1 = sequential, in this process)
+    max_workers = 4
+    # Stage outputs cache (parquet, with the exported csv): a stage runs again only if its inputs, raw files
+    # or processors code changed (code of the package modules they use included)
+    cache_max_size = 5 * 1024 ** 3
+    # Max requests in flight to the IEA stats api, shared by the IEA stages running at the same time
+    iea_api_max_requests = 16
+    # GWP sets used to convert emissions to CO2eq (see utils/gwp.py)
+    pik_gwp_set = "AR6_CH4_AR5"
+    edgar_gwp_set = "AR4"
 
     def process_country_data(self):
         # Update demographic data
@@ -39,67 +62,54 @@ class TransformationPipeline:
         df_population_raw = WorldBankScrapper().run("population")
         df_population = PopulationPerZoneAndCountryProcessor().run(df_population_raw, df_country)
         df_population.to_csv(f"{RESULTS_DIR}/DEMOGRAPHIC_POPULATION_WORLDBANK_prod.csv", index=False)
-        
+        return df_population
+
+    def process_gapminder_data(self, df_country):
         # update GapMinder data (source GapMinder)
-        df_population_gapmidner_raw = pd.read_excel(f"{RAW_DATA_DIR}/population/GM-Population - Dataset - v7.xlsx", sheet_name="data-pop-gmv6-in-columns")
+        df_population_gapmidner_raw = read_excel(f"{RAW_DATA_DIR}/population/GM-Population - Dataset - v7.xlsx", sheet_name="data-pop-gmv6-in-columns")
         df_gapminder = GapMinderPerZoneAndCountryProcessor().run(df_population_gapmidner_raw, df_country)
         df_gapminder.to_csv(f"{RESULTS_DIR}/DEMOGRAPHIC_POPULATION_GAPMINDER_prod.csv", index=False)
-        return df_population, df_gapminder
+        return df_gapminder
 
     def process_footprint_vs_territorial_data(self, df_country, df_population):
         # update footprint vs territorial
         df_eora_cba = pd.read_csv(f"{RAW_DATA_DIR}/co2_cba/national.cba.report.1990.2022.txt", sep="\t")
-        df_gcb_territorial = pd.read_excel(f"{RAW_DATA_DIR}/co2_cba/National_Fossil_Carbon_Emissions_2023v1.0.xlsx", sheet_name="Territorial Emissions")
-        df_gcb_cba = pd.read_excel(f"{RAW_DATA_DIR}/co2_cba/National_Fossil_Carbon_Emissions_2023v1.0.xlsx", sheet_name="Consumption Emissions")
+        dict_df_gcb = read_excel(f"{RAW_DATA_DIR}/co2_cba/National_Fossil_Carbon_Emissions_2023v1.0.xlsx", sheet_name=["Territorial Emissions", "Consumption Emissions"])
+        df_gcb_territorial, df_gcb_cba = dict_df_gcb["Territorial Emissions"], dict_df_gcb["Consumption Emissions"]
         df_footprint_vs_territorial = FootprintVsTerrotorialProcessor().run(df_gcb_territorial, df_gcb_cba, df_eora_cba, df_country)
         df_footprint_vs_territorial.to_csv(f"{RESULTS_DIR}/CO2_CONSUMPTION_BASED_ACCOUNTING_footprint_vs_territorial_prod.csv", index=False)
 
         df_footprint_vs_territorial_per_capita = StatisticsPerCapitaJoiner().run_footprint_vs_territorial_per_capita(df_footprint_vs_territorial, df_population)
         df_footprint_vs_territorial_per_capita.to_csv(f"{RESULTS_DIR}/CO2_CBA_PER_CAPITA_eora_cba_zones_per_capita_prod.csv", index=False)
-    
-    def process_iea_data(self, df_country):
-        
-        # gas products
-        df_gas_cons_by_sector = EiaConsumptionGasBySectorProcessor().prepare_data(df_country)
-        df_gas_cons_by_sector.to_csv(f"{RESULTS_DIR}/FINAL_CONS_GAS_BY_SECTOR_prod.csv", index=False)
-        df_original = pd.read_csv(f"{CURRENT_DATA_DIR}/final_cons_gas_by_sector_prod.csv", sep=',')
-        df_original = StatisticsDataframeFormatter.select_and_sort_values(df_original, "final_energy", round_statistics=4)
-        df_original.to_csv(f"{CURRENT_PROD_DATA}/FINAL_CONS_GAS_BY_SECTOR_prod.csv", index=False)
-
-        # oil products 
-        df_oil_cons_per_product = EiaConsumptionOilPerProductProcessor().prepare_data(df_country)
-        df_oil_cons_per_product.to_csv(f"{RESULTS_DIR}/FINAL_CONS_OIL_BY_PRODUCT_prod.csv", index=False)
-        df_original = pd.read_csv(f"{CURRENT_DATA_DIR}/final_cons_oil_products_by_product.csv", sep=',')
-        df_original = StatisticsDataframeFormatter.select_and_sort_values(df_original, "final_energy", round_statistics=4)
-        df_original.to_csv(f"{CURRENT_PROD_DATA}/FINAL_CONS_OIL_BY_PRODUCT_prod.csv", index=False)
-        
-        df_oil_cons_per_sector = EiaConsumptionOilsPerSectorProcessor().prepare_data(df_country)
-        df_oil_cons_per_sector.to_csv(f"{RESULTS_DIR}/FINAL_CONS_OIL_BY_SECTOR_prod.csv", index=False)
-        df_original = pd.read_csv(f"{CURRENT_DATA_DIR}/final_cons_oil_products_by_sector_prod.csv", sep=',')
-        df_original = StatisticsDataframeFormatter.select_and_sort_values(df_original, "final_energy", round_statistics=4)
-        df_original.to_csv(f"{CURRENT_PROD_DATA}/FINAL_CONS_OIL_BY_SECTOR_prod.csv", index=False)
-
-        # final energy
-        df_final_energy_consumption = EiaFinalEnergyConsumptionProcessor().prepare_data(df_country)
-        df_final_energy_consumption.to_csv(f"{RESULTS_DIR}/FINAL_ENERGY_CONSUMPTION_prod.csv", index=False)
-        df_original = pd.read_csv(f"{CURRENT_DATA_DIR}/final_cons_by_energy_family_prepared.csv", sep=',')
-        df_original = StatisticsDataframeFormatter.select_and_sort_values(df_original, "final_energy", round_statistics=4)
-        df_original.to_csv(f"{CURRENT_PROD_DATA}/FINAL_ENERGY_CONSUMPTION_prod.csv", index=False)
-
-        df_final_energy_consumption_per_sector = EiaFinalEnergyConsumptionPerSectorProcessor().prepare_data(df_country)
-        df_final_energy_consumption_per_sector.to_csv(f"{RESULTS_DIR}/FINAL_ENERGY_CONSUMPTION_PER_SECTOR_prod.csv", index=False)
-        df_original = pd.read_csv(f"{CURRENT_DATA_DIR}/final_cons_by_sector_prod.csv", sep=',')
-        df_original = StatisticsDataframeFormatter.select_and_sort_values(df_original, "final_energy", round_statistics=4)
-        df_original.to_csv(f"{CURRENT_PROD_DATA}/FINAL_ENERGY_CONSUMPTION_PER_SECTOR_prod.csv", index=False)
-
-        df_energy_per_sector_per_energy_family = EiaFinalEnergyPerSectorPerEnergyProcessor().prepare_data(df_country)
-        df_energy_per_sector_per_energy_family.to_csv(f"{RESULTS_DIR}/FINAL_ENERGY_PER_SECTOR_PER_ENERGY_FAMILY_prod.csv", index=False)
-        df_original = pd.read_csv(f"{CURRENT_DATA_DIR}/final_cons_by_sector_by_energy_family_prod.csv", sep=',')
-        df_original = StatisticsDataframeFormatter.select_and_sort_values(df_original, "final_energy", round_statistics=4)
-        df_original.to_csv(f"{CURRENT_PROD_DATA}/FINAL_ENERGY_PER_SECTOR_PER_ENERGY_FAMILY_prod.csv", index=False)
-
+        return df_footprint_vs_territorial, df_footprint_vs_territorial_per_capita
+
+    # IEA datasets prepared by a processor: (dataset, processor, current data file, statistics column)
+    iea_datasets = [
+        ("FINAL_CONS_GAS_BY_SECTOR", EiaConsumptionGasBySectorProcessor, "final_cons_gas_by_sector_prod.csv", "final_energy"),
+        ("FINAL_CONS_OIL_BY_PRODUCT", EiaConsumptionOilPerProductProcessor, "final_cons_oil_products_by_product.csv", "final_energy"),
+        ("FINAL_CONS_OIL_BY_SECTOR", EiaConsumptionOilsPerSectorProcessor, "final_cons_oil_products_by_sector_prod.csv", "final_energy"),
+        ("FINAL_ENERGY_CONSUMPTION", EiaFinalEnergyConsumptionProcessor, "final_cons_by_energy_family_prepared.csv", "final_energy"),
+        ("FINAL_ENERGY_CONSUMPTION_PER_SECTOR", EiaFinalEnergyConsumptionPerSectorProcessor, "final_cons_by_sector_prod.csv", "final_energy"),
+        ("FINAL_ENERGY_PER_SECTOR_PER_ENERGY_FAMILY", EiaFinalEnergyPerSectorPerEnergyProcessor, "final_cons_by_sector_by_energy_family_prod.csv", "final_energy"),
+    ]
+
+    def process_iea_data(self, dataset, df_country):
+        _, processor, current_data_file, statistics = next(iea_dataset for iea_dataset in self.iea_datasets if iea_dataset[0] == dataset)
+        df = processor().prepare_data(df_country, self.iea_api_workers())
+        df.to_csv(f"{RESULTS_DIR}/{dataset}_prod.csv", index=False)
+        df_original = pd.read_csv(f"{CURRENT_DATA_DIR}/{current_data_file}", sep=',')
+        df_original = StatisticsDataframeFormatter.select_and_sort_values(df_original, statistics, round_statistics=4)
+        df_original.to_csv(f"{CURRENT_PROD_DATA}/{dataset}_prod.csv", index=False)
+        return df
+
+    def iea_api_workers(self):
+        # Concurrent requests of an IEA stage: the stages (at most one per worker process) share the api
+        iea_stages = min(self.max_workers, len(self.iea_datasets) + 1)
+        return max(1, self.iea_api_max_requests // iea_stages)
+
+    def process_iea_electricity_data(self, df_country):
         # electricity generation
-        electricity_generator = EiaElectricityGenerationByEnergyProcessor().prepare_data(df_country)
+        electricity_generator = EiaElectricityGenerationByEnergyProcessor().prepare_data(df_country, self.iea_api_workers())
         df_electricity_generation = electricity_generator.df_electricity_by_energy_family
         df_electricity_generation.to_csv(f"{RESULTS_DIR}/ELECTRICITY_GENERATION_prod.csv", index=False)
         df_original = pd.read_csv(f"{CURRENT_DATA_DIR}/electricity_by_energy_family_prepared_prod.csv", sep=',')
@@ -113,35 +123,52 @@ class TransformationPipeline:
         df_original = StatisticsDataframeFormatter.select_and_sort_values(df_original, "nuclear_share_of_electricity_generation", round_statistics=4)
         df_original.to_csv(f"{CURRENT_PROD_DATA}/ELECTRICITY_NUCLEAR_SHARE_prod.csv", index=False)
 
-        df_intensity_co2_per_energy = pd.read_excel(os.path.join(os.path.join(os.path.dirname(__file__), "../../data/thibaud/eia_api/co2_intensity_electricity_by_energy.xlsx")))
+        df_intensity_co2_per_energy = read_excel(os.path.join(os.path.join(os.path.dirname(__file__), "../../data/thibaud/eia_api/co2_intensity_electricity_by_energy.xlsx")))
         df_electricity_co2_intensity = electricity_generator.compute_electricity_co2_intensity(df_intensity_co2_per_energy)
         df_electricity_co2_intensity.to_csv(f"{RESULTS_DIR}/ELECTRICITY_CO2_INTENSITY_prod.csv", index=False, sep=',')
         df_original = pd.read_csv(f"{CURRENT_DATA_DIR}/country_co2_intensity.csv")
         df_original = StatisticsDataframeFormatter.select_and_sort_values(df_original, "co2_intensity", round_statistics=3)
         df_original.to_csv(f"{CURRENT_PROD_DATA}/ELECTRICITY_CO2_INTENSITY_prod.csv", index=False)
+        return df_electricity_generation, df_electricity_nuclear_share, df_electricity_co2_intensity
 
-    def process_ghg_data(self, df_country):
-
+    def process_pik_data(self):
         # update PIK data
         df_pik = pd.read_csv(f"{RAW_DATA_DIR}/ghg/Guetschow_et_al_2023b-PRIMAP-hist_v2.5_final_15-Oct-2023.csv")
-        df_pik_cleaned = PikCleaner().run(df_pik)
+        df_pik_cleaned = PikCleaner(self.pik_gwp_set).run(df_pik)
         df_pik_cleaned.to_csv(f"{RESULTS_DIR}/GHG_PIK_WITH_EDGAR_SECTORS_prod.csv", index=False)
-        df_original = pd.read_excel(os.path.join(os.path.dirname(__file__), "../../data/thibaud/ghg/" + "pik_with_edgar_sectors.xlsx"))
+        df_original = read_excel(GHG_DATA_DIR + "pik_with_edgar_sectors.xlsx")
         df_original = StatisticsDataframeFormatter.select_and_sort_values(df_original, "ghg", round_statistics=5)
         df_original.to_csv(f"{CURRENT_PROD_DATA}/GHG_PIK_WITH_EDGAR_SECTORS_prod.csv", index=False)  # TODO - supprimer cet export ? Pas utilisé dans la BDD de PROD.
+        return df_pik_cleaned
 
+    def process_edgar_data(self):
         # update EDGAR data
-        df_edgar_gases = pd.read_excel(os.path.join(os.path.dirname(__file__), "../../data/thibaud/ghg/" + "edgar_f_gases.xlsx"))
-        df_edgar_n2o = pd.read_excel(os.path.join(os.path.dirname(__file__), "../../data/thibaud/ghg/" + "edgar_n2o_raw.xlsx"))
-        df_edgar_ch4 = pd.read_excel(os.path.join(os.path.dirname(__file__), "../../data/thibaud/ghg/" + "edgar_ch4_raw.xlsx"))
-        df_edgar_co2_short_cycle = pd.read_excel(os.path.join(os.path.dirname(__file__), "../../data/thibaud/ghg/" + "edgar_co2_shortcycle_raw.xlsx"))
-        df_edgar_co2_short_without_cycle = pd.read_excel(os.path.join(os.path.dirname(__file__), "../../data/thibaud/ghg/" + "edgar_co2_withoutshortcycle_raw.xlsx"))
-        df_edgar_clean = EdgarCleaner().run(df_edgar_gases, df_edgar_n2o, df_edgar_ch4, df_edgar_co2_short_cycle, df_edgar_co2_short_without_cycle)
+        df_edgar_gases = read_excel(GHG_DATA_DIR + "edgar_f_gases.xlsx")
+        df_edgar_n2o = read_excel(GHG_DATA_DIR + "edgar_n2o_raw.xlsx")
+        df_edgar_ch4 = read_excel(GHG_DATA_DIR + "edgar_ch4_raw.xlsx")
+        df_edgar_co2_short_cycle = read_excel(GHG_DATA_DIR + "edgar_co2_shortcycle_raw.xlsx")
+        df_edgar_co2_short_without_cycle = read_excel(GHG_DATA_DIR + "edgar_co2_withoutshortcycle_raw.xlsx")
+        df_edgar_clean = EdgarCleaner(self.edgar_gwp_set).run(df_edgar_gases, df_edgar_n2o, df_edgar_ch4, df_edgar_co2_short_cycle, df_edgar_co2_short_without_cycle)
+        return df_edgar_clean
+
+    def process_fao_data(self, df_country):
+        # update FAO data
+        df_fao = read_excel(GHG_DATA_DIR + "fao_raw.xlsx")
+        df_fao_clean = FaoDataProcessor().run(df_fao, df_country)
+        return df_fao_clean
+
+    def process_cait_data(self, df_country):
+        # update CAIT data
+        df_cait = read_excel(GHG_DATA_DIR + "cait_raw.xlsx")
+        df_cait_sector_stacked, df_cait_gas_stacked = CaitProcessor().run(df_cait, df_country)
+        return df_cait_sector_stacked, df_cait_gas_stacked
+
+    def process_ghg_data(self, df_pik_cleaned, df_edgar_clean, df_fao_clean, df_cait_sector_stacked, df_cait_gas_stacked, df_country):
 
         # combine PIK and EDGAR data STACKED  # TODO - potentiellement à supprimer car pas utilisé en PROD (ref 21/04)
         # df_pik_edgar_stacked = GhgPikEdgarCombinator().compute_pik_edgar_stacked(df_pik_cleaned, df_edgar_clean)
         # df_pik_edgar_stacked.to_csv(f"{RESULTS_DIR}/GHG_PIK_EDGAR_STACKED_prod.csv", index=False)
-        # df_original = pd.read_csv(os.path.join(os.path.dirname(__file__), "../../data/thibaud/ghg/" + "pik_edgar_stacked.csv"))
+        # df_original = pd.read_csv(GHG_DATA_DIR + "pik_edgar_stacked.csv")
         # df_original["source"] = df_original["source"].fillna("edgar")
         # df_original = StatisticsDataframeFormatter.select_and_sort_values(df_original, "ghg", round_statistics=5)
         # df_original.to_csv(f"{CURRENT_PROD_DATA}/GHG_PIK_EDGAR_STACKED_prod.csv", index=False)
@@ -149,26 +176,26 @@ class TransformationPipeline:
         # combine PIK and EDGAR data FILTER SECTOR   # TODO - potentiellement à supprimer car pas utilisé en PROD (ref 21/04)
         # df_pik_edgar_sector = GhgPikEdgarCombinator().compute_pik_edgar_filter_sector(df_pik_cleaned, df_edgar_clean)
         # df_pik_edgar_sector.to_csv(f"{RESULTS_DIR}/GHG_PIK_EDGAR_SECTOR_prod.csv", index=False)
-        # df_original = pd.read_excel(os.path.join(os.path.dirname(__file__), "../../data/thibaud/ghg/" + "pik_edgar_1.xlsx"))
+        # df_original = read_excel(GHG_DATA_DIR + "pik_edgar_1.xlsx")
         # df_original = StatisticsDataframeFormatter.select_and_sort_values(df_original, "ghg", round_statistics=5)
         # df_original.to_csv(f"{CURRENT_PROD_DATA}/GHG_PIK_EDGAR_SECTOR_prod.csv", index=False)
 
         # combine PIK and EDGAR EXTRAPOLATED GLUED    # TODO - potentiellement à supprimer car pas utilisé en PROD (ref 21/04)
         # df_pik_edgar_extrapolated = GhgPikEdgarCombinator().compute_pik_edgar_extrapolated_glued(df_pik_cleaned, df_edgar_clean)
         # df_pik_edgar_extrapolated.to_csv(f"{RESULTS_DIR}/GHG_PIK_EDGAR_EXTRAPOLATED_GLUED_prod.csv", index=False)
-        # df_original = pd.read_excel(os.path.join(os.path.dirname(__file__), "../../data/thibaud/ghg/" + "edgar_pik_extrapolated_glued_prod.xlsx"))
+        # df_original = read_excel(GHG_DATA_DIR + "edgar_pik_extrapolated_glued_prod.xlsx")
         # df_original = StatisticsDataframeFormatter.select_and_sort_values(df_original, "ghg", round_statistics=5)
         # df_original.to_csv(f"{CURRENT_PROD_DATA}/GHG_PIK_EDGAR_EXTRAPOLATED_GLUED_prod.csv", index=False)
 
         # update UNFCCC annexes data  # TODO - potentiellement à supprimer car pas utilisé en PROD (ref 21/04)
-        # df_unfccc_annex_1 = pd.read_excel(os.path.join(os.path.dirname(__file__), "../../data/thibaud/ghg/" + "unfccc_annex1.xlsx"))
-        # df_unfccc_annex_2 = pd.read_excel(os.path.join(os.path.dirname(__file__), "../../data/thibaud/ghg/" + "unfccc_annex2.xlsx"))
+        # df_unfccc_annex_1 = read_excel(GHG_DATA_DIR + "unfccc_annex1.xlsx")
+        # df_unfccc_annex_2 = read_excel(GHG_DATA_DIR + "unfccc_annex2.xlsx")
         # df_unfccc_annex_clean = UnfcccAnnexesCleaner().run(df_unfccc_annex_1, df_unfccc_annex_2)
         
         # combine PIK and UNFCCC annexes data  # TODO - potentiellement à supprimer car pas utilisé en PROD (ref 21/04)
         # df_pik_unfccc_annexes = PikUnfcccAnnexesCombinator().run(df_pik_cleaned, df_unfccc_annex_clean)
         # df_pik_unfccc_annexes.to_csv(f"{RESULTS_DIR}/GHG_PIK_UNFCCC_prod.csv", index=False)
-        # df_original = pd.read_excel(os.path.join(os.path.dirname(__file__), "../../data/thibaud/ghg/" + "pik_unfccc.xlsx"))
+        # df_original = read_excel(GHG_DATA_DIR + "pik_unfccc.xlsx")
         # df_original = StatisticsDataframeFormatter.select_and_sort_values(df_original, "ghg", round_statistics=4)
         # df_original.to_csv(f"{CURRENT_PROD_DATA}/GHG_PIK_UNFCCC_prod.csv", index=False)
 
@@ -176,25 +203,17 @@ class TransformationPipeline:
         # df_ghg_edunf_by_gas, df_ghg_edunf_by_sector = EdgarUnfcccAnnexesCombinator().run(df_edgar_clean, df_unfccc_annex_clean, df_country)
         # df_ghg_edunf_by_gas.to_csv(f"{RESULTS_DIR}/GHG_EDUNF_BY_GAS_prod.csv", index=False)
         # df_ghg_edunf_by_sector.to_csv(f"{RESULTS_DIR}/GHG_EDUNF_BY_SECTOR_prod.csv", index=False)
-        # df_original_gas = pd.read_excel(os.path.join(os.path.dirname(__file__), "../../data/thibaud/ghg/" + "ghg_edunf_by_gas_prod.xlsx"))
+        # df_original_gas = read_excel(GHG_DATA_DIR + "ghg_edunf_by_gas_prod.xlsx")
         # df_original_gas = StatisticsDataframeFormatter.select_and_sort_values(df_original_gas, "ghg", round_statistics=4)
         # df_original_gas.to_csv(f"{CURRENT_PROD_DATA}/GHG_EDUNF_BY_GAS_prod.csv", index=False)
-        # df_original_sector = pd.read_excel(os.path.join(os.path.dirname(__file__), "../../data/thibaud/ghg/" + "ghg_edunf_by_sector_prod.xlsx"))
+        # df_original_sector = read_excel(GHG_DATA_DIR + "ghg_edunf_by_sector_prod.xlsx")
         # df_original_sector = StatisticsDataframeFormatter.select_and_sort_values(df_original_sector, "ghg", round_statistics=4)
         # df_original_sector.to_csv(f"{CURRENT_PROD_DATA}/GHG_EDUNF_BY_SECTOR_prod.csv", index=False)
 
         # update UNFCC data  # TODO - potentiellement à supprimer car pas utilisé en PROD (ref 21/04)
-        # df_unfcc = pd.read_excel(os.path.join(os.path.dirname(__file__), "../../data/thibaud/ghg/" + "unfcc.xlsx"))
+        # df_unfcc = read_excel(GHG_DATA_DIR + "unfcc.xlsx")
         # df_unfcc_clean = UnfccProcessor().run(df_unfcc)  # TODO - à fixer - We can't use UNFCCC because for non annex 1 countries (ex:China) we only have data every 5 years
 
-        # update FAO data
-        df_fao = pd.read_excel(os.path.join(os.path.dirname(__file__), "../../data/thibaud/ghg/" + "fao_raw.xlsx"))
-        df_fao_clean = FaoDataProcessor().run(df_fao, df_country)
-
-        # update CAIT data
-        df_cait = pd.read_excel(os.path.join(os.path.dirname(__file__), "../../data/thibaud/ghg/" + "cait_raw.xlsx"))
-        df_cait_sector_stacked, df_cait_gas_stacked = CaitProcessor().run(df_cait, df_country)
-
         # combine all sources together  # TODO - potentiellement à supprimer car pas utilisé en PROD (ref 21/04)
         list_df_multi_sources = GhgMultiSourcesCombinator().run(df_pik_clean=df_pik_cleaned,
                                                                 df_edgar_clean=df_edgar_clean,
@@ -208,65 +227,141 @@ class TransformationPipeline:
         df_ghg_full_by_sector.to_csv(f"{RESULTS_DIR}/GHG_FULL_BY_SECTOR_prod.csv", index=False)
         df_ghg_full_aggregated.to_csv(f"{RESULTS_DIR}/GHG_FULL_AGGREGATED_prod.csv", index=False)
 
-        df_original_gas = pd.read_excel(os.path.join(os.path.dirname(__file__), "../../data/thibaud/ghg/" + "ghg_full_by_gas_prod.xlsx"))
+        df_original_gas = read_excel(GHG_DATA_DIR + "ghg_full_by_gas_prod.xlsx")
         df_original_gas = StatisticsDataframeFormatter.select_and_sort_values(df_original_gas, "ghg", round_statistics=5)
         df_original_gas.to_csv(f"{CURRENT_PROD_DATA}/GHG_FULL_BY_GAS_prod.csv", index=False)
 
-        df_original_sector = pd.read_excel(os.path.join(os.path.dirname(__file__), "../../data/thibaud/ghg/" + "ghg_full_by_sector_prod.xlsx"))
+        df_original_sector = read_excel(GHG_DATA_DIR + "ghg_full_by_sector_prod.xlsx")
         df_original_sector = StatisticsDataframeFormatter.select_and_sort_values(df_original_sector, "ghg", round_statistics=5)
         df_original_sector.to_csv(f"{CURRENT_PROD_DATA}/GHG_FULL_BY_SECTOR_prod.csv", index=False)
 
-        df_original_agg = pd.read_excel(os.path.join(os.path.dirname(__file__), "../../data/thibaud/ghg/" + "ghg_full_aggregated.xlsx"))
+        df_original_agg = read_excel(GHG_DATA_DIR + "ghg_full_aggregated.xlsx")
         df_original_agg = StatisticsDataframeFormatter.select_and_sort_values(df_original_agg, "ghg", round_statistics=5)
         df_original_agg.to_csv(f"{CURRENT_PROD_DATA}/GHG_FULL_AGGREGATED_prod.csv", index=False)
+        return df_ghg_full_by_gas, df_ghg_full_by_sector, df_ghg_full_aggregated
 
-
-    def run(self):
+    def stages(self):
         """
-
-        :return:
+        Transformation stages: inputs and outputs are dataset names (a dataset is produced by one stage only).
+        :return: list of Stage
         """
-        # demographic data
-        df_country = self.process_country_data()
-        # df_population, df_gapminder = self.process_population_data(df_country)
-
-        # consumption-based accounting
-        # self.process_footprint_vs_territorial_data(df_country)
-
-        # EAI data
-        # self.process_iea_data(df_country)
-
-        # update GHG emissions data
-        self.process_ghg_data(df_country)
-
-
-        # update GDP data (World Bank)
+        stages = [
+            # demographic data
+            Stage("country", self.process_country_data, outputs=["COUNTRY"],
+                  files=[f"{RAW_DATA_DIR}/country/country_groups.csv"],
+                  exports=[f"{RESULTS_DIR}/COUNTRY_country_groups_prod.csv"]),
+            Stage("population_worldbank", self.process_population_data, ["COUNTRY"], ["DEMOGRAPHIC_POPULATION_WORLDBANK"],
+                  cached=False),  # World Bank api
+            Stage("population_gapminder", self.process_gapminder_data, ["COUNTRY"], ["DEMOGRAPHIC_POPULATION_GAPMINDER"],
+                  files=[f"{RAW_DATA_DIR}/population/GM-Population - Dataset - v7.xlsx"],
+                  processors=[GapMinderPerZoneAndCountryProcessor],
+                  exports=[f"{RESULTS_DIR}/DEMOGRAPHIC_POPULATION_GAPMINDER_prod.csv"]),
+
+            # consumption-based accounting
+            Stage("footprint_vs_territorial", self.process_footprint_vs_territorial_data,
+                  ["COUNTRY", "DEMOGRAPHIC_POPULATION_WORLDBANK"],
+                  ["CO2_CONSUMPTION_BASED_ACCOUNTING", "CO2_CBA_PER_CAPITA"],
+                  files=[f"{RAW_DATA_DIR}/co2_cba/national.cba.report.1990.2022.txt",
+                         f"{RAW_DATA_DIR}/co2_cba/National_Fossil_Carbon_Emissions_2023v1.0.xlsx"],
+                  processors=[FootprintVsTerrotorialProcessor, StatisticsPerCapitaJoiner],
+                  exports=[f"{RESULTS_DIR}/CO2_CONSUMPTION_BASED_ACCOUNTING_footprint_vs_territorial_prod.csv",
+                           f"{RESULTS_DIR}/CO2_CBA_PER_CAPITA_eora_cba_zones_per_capita_prod.csv"]),
+
+            # EIA data
+            Stage("iea_electricity", self.process_iea_electricity_data, ["COUNTRY"],
+                  ["ELECTRICITY_GENERATION", "ELECTRICITY_NUCLEAR_SHARE", "ELECTRICITY_CO2_INTENSITY"],
+                  cached=False),  # EIA api
+
+            # GHG emissions data
+            Stage("ghg_pik", self.process_pik_data, outputs=["GHG_PIK_WITH_EDGAR_SECTORS"],
+                  files=[f"{RAW_DATA_DIR}/ghg/Guetschow_et_al_2023b-PRIMAP-hist_v2.5_final_15-Oct-2023.csv",
+                         GHG_DATA_DIR + "pik_with_edgar_sectors.xlsx"],
+                  processors=[PikCleaner], params={"gwp_set": self.pik_gwp_set},
+                  exports=[f"{folder}/GHG_PIK_WITH_EDGAR_SECTORS_prod.csv" for folder in [RESULTS_DIR, CURRENT_PROD_DATA]]),
+            Stage("ghg_edgar", self.process_edgar_data, outputs=["GHG_EDGAR"],
+                  files=[GHG_DATA_DIR + file_name for file_name in ["edgar_f_gases.xlsx", "edgar_n2o_raw.xlsx", "edgar_ch4_raw.xlsx",
+                                                                    "edgar_co2_shortcycle_raw.xlsx", "edgar_co2_withoutshortcycle_raw.xlsx"]],
+                  processors=[EdgarCleaner], params={"gwp_set": self.edgar_gwp_set}),
+            Stage("ghg_fao", self.process_fao_data, ["COUNTRY"], ["GHG_FAO"],
+                  files=[GHG_DATA_DIR + "fao_raw.xlsx"], processors=[FaoDataProcessor]),
+            Stage("ghg_cait", self.process_cait_data, ["COUNTRY"], ["GHG_CAIT_SECTOR_STACKED", "GHG_CAIT_GAS_STACKED"],
+                  files=[GHG_DATA_DIR + "cait_raw.xlsx"], processors=[CaitProcessor]),
+            Stage("ghg_full", self.process_ghg_data,
+                  ["GHG_PIK_WITH_EDGAR_SECTORS", "GHG_EDGAR", "GHG_FAO", "GHG_CAIT_SECTOR_STACKED", "GHG_CAIT_GAS_STACKED", "COUNTRY"],
+                  ["GHG_FULL_BY_GAS", "GHG_FULL_BY_SECTOR", "GHG_FULL_AGGREGATED"],
+                  files=[GHG_DATA_DIR + file_name for file_name in ["ghg_full_by_gas_prod.xlsx", "ghg_full_by_sector_prod.xlsx", "ghg_full_aggregated.xlsx"]],
+                  processors=[GhgMultiSourcesCombinator],
+                  exports=[f"{folder}/GHG_FULL_{name}_prod.csv" for folder in [RESULTS_DIR, CURRENT_PROD_DATA]
+                           for name in ["BY_GAS", "BY_SECTOR", "AGGREGATED"]]),
+        ]
+        for dataset, *_ in self.iea_datasets:
+            stages.append(Stage("iea_" + dataset.lower(), partial(self.process_iea_data, dataset), ["COUNTRY"], [dataset],
+                                cached=False))  # EIA api
+        return stages
+
+    def run(self, targets=None, max_workers=None, force=False):
         """
-        df_gdp_raw = WorldBankScrapper().run("gdp")
-        df_population = GdpWorldBankPerZoneAndCountryProcessor().run(df_gdp_raw, df_country)
-        df_population.to_csv(f"{RESULTS_DIR}/DEMOGRAPHIC_GDP_prod.csv", index=False)
-
-        # Compute CO2 consumption based accounting
-        df_gcb_territorial = pd.read_excel("../../data/thibaud/co2_consumption_based_accounting/gcb_territorial.xlsx")
-        df_gcb_cba = pd.read_excel("../../data/thibaud/co2_consumption_based_accounting/gcb_cba.xlsx")
-
-        df_eora_co2_trade = pd.read_excel("../../data/thibaud/co2_consumption_based_accounting/eora_co2_trade_sectorwise.xlsx")
-        df_trade_by_country, df_trade_by_sector = EoraCo2TradePerZoneAndCountryProcessor().run(df_eora_co2_trade, df_country)
-
-        # compute statistics per capita
-        df_population_gm_zones = pd.read_excel("../../data/thibaud/per_capita/population_gm_zones_energy.xlsx")
-        df_energy = pd.read_excel("../../data/thibaud/per_capita/energies.xlsx")
-        df_energy_consumption = pd.read_excel("../../data/thibaud/per_capita/energy_consumption_per_capita/final_cons_full.xlsx")
-        df_ghg_by_sector = pd.read_excel("../../data/thibaud/per_capita/ghg_per_capita/ghg_full_by_sector.xlsx")
-        df_historical_co2 = pd.read_excel("../../data/thibaud/per_capita/historical_co2_per_capita/eia_with_zones_aggregated.xlsx")
-
-        df_eora_cba_per_capita = StatisticsPerCapitaJoiner().run_eora_cba_per_capita(df_footprint_vs_territorial, df_population)
-        df_energy_per_capita = StatisticsPerCapitaJoiner().run_energy_per_capita(df_energy, df_population_gm_zones)
-        df_final_energy_per_capita = StatisticsPerCapitaJoiner().run_final_energy_consumption_per_capita(df_energy_consumption, df_population)
-        df_ghg_per_capita = StatisticsPerCapitaJoiner().run_ghg_per_capita(df_ghg_by_sector, df_population)
-        df_historical_co2_per_capita = StatisticsPerCapitaJoiner().run_historical_emissions_per_capita(df_historical_co2, df_population)
+        Runs the stages required by the targets (datasets or stage names), all stages if no targets.
+        Unchanged stages read their outputs from the cache, unless force.
+        :return: (datasets of the targets, summary list of dict stage, status, duration)
         """
+        self.max_workers = max_workers or self.max_workers
+        cache = StageCache(CACHE_DIR, self.cache_max_size, code_root=os.path.dirname(__file__))
+        datasets, summary = Dag(self.stages()).run(targets, self.max_workers, cache, force)
+        self._print_summary(summary)
+        return datasets, summary
+
+    @staticmethod
+    def _print_summary(summary):
+        print(f"\n{'stage':<50} {'status':<8} {'duration':>9}")
+        for result in summary:
+            print(f"{result['stage']:<50} {result['status']:<8} {result['duration']:>8}s")
+
+    # TODO - stages to declare: GDP data (World Bank), CO2 consumption based accounting, statistics per capita
+    """
+    df_gdp_raw = WorldBankScrapper().run("gdp")
+    df_population = GdpWorldBankPerZoneAndCountryProcessor().run(df_gdp_raw, df_country)
+    df_population.to_csv(f"{RESULTS_DIR}/DEMOGRAPHIC_GDP_prod.csv", index=False)
+
+    # Compute CO2 consumption based accounting
+    df_gcb_territorial = read_excel("../../data/thibaud/co2_consumption_based_accounting/gcb_territorial.xlsx")
+    df_gcb_cba = read_excel("../../data/thibaud/co2_consumption_based_accounting/gcb_cba.xlsx")
+
+    df_eora_co2_trade = read_excel("../../data/thibaud/co2_consumption_based_accounting/eora_co2_trade_sectorwise.xlsx")
+    df_trade_by_country, df_trade_by_sector = EoraCo2TradePerZoneAndCountryProcessor().run(df_eora_co2_trade, df_country)
+
+    # compute statistics per capita
+    df_population_gm_zones = read_excel("../../data/thibaud/per_capita/population_gm_zones_energy.xlsx")
+    df_energy = read_excel("../../data/thibaud/per_capita/energies.xlsx")
+    df_energy_consumption = read_excel("../../data/thibaud/per_capita/energy_consumption_per_capita/final_cons_full.xlsx")
+    df_ghg_by_sector = read_excel("../../data/thibaud/per_capita/ghg_per_capita/ghg_full_by_sector.xlsx")
+    df_historical_co2 = read_excel("../../data/thibaud/per_capita/historical_co2_per_capita/eia_with_zones_aggregated.xlsx")
+
+    df_eora_cba_per_capita = StatisticsPerCapitaJoiner().run_eora_cba_per_capita(df_footprint_vs_territorial, df_population)
+    df_energy_per_capita = StatisticsPerCapitaJoiner().run_energy_per_capita(df_energy, df_population_gm_zones)
+    df_final_energy_per_capita = StatisticsPerCapitaJoiner().run_final_energy_consumption_per_capita(df_energy_consumption, df_population)
+    df_ghg_per_capita = StatisticsPerCapitaJoiner().run_ghg_per_capita(df_ghg_by_sector, df_population)
+    df_historical_co2_per_capita = StatisticsPerCapitaJoiner().run_historical_emissions_per_capita(df_historical_co2, df_population)
+    """
 
 
 if __name__ == "__main__":
-    TransformationPipeline().run()
+    parser = argparse.ArgumentParser(description='SDP transformation pipeline')
+    parser.add_argument('mode', choices=['run', 'list'], nargs='?', default='run',
+                        help='run: stages required by the targets (all if no target), list: stages and their datasets')
+    parser.add_argument('--target', nargs='*', help='datasets or stages to compute (ex: GHG_FULL_BY_SECTOR)')
+    parser.add_argument('--workers', type=int, help=f'max stages run at the same time (default {TransformationPipeline.max_workers})')
+    parser.add_argument('--force', action='store_true', help='runs the stages even if their cached outputs are up to date')
+    parser.add_argument('--gwp-set', choices=list(GWP_SETS), help='GWP set of the PIK and EDGAR emissions (default: '
+                        f'{TransformationPipeline.pik_gwp_set} for PIK, {TransformationPipeline.edgar_gwp_set} for EDGAR)')
+    args = parser.parse_args()
+
+    pipeline = TransformationPipeline()
+    if args.gwp_set:
+        pipeline.pik_gwp_set = pipeline.edgar_gwp_set = args.gwp_set
+    if args.mode == 'list':
+        for stage in Dag(pipeline.stages()).required(args.target):
+            print(f"{stage.name:<50} {', '.join(stage.inputs) or '-'} -> {', '.join(stage.outputs)}")
+    else:
+        _, summary = pipeline.run(args.target, args.workers, args.force)
+        sys.exit(1 if any(result['status'] in ('failed', 'skipped') for result in summary) else 0)
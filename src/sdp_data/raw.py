@@ -7,10 +7,22 @@ import re
 from urllib.parse import urlencode
 import pandas as pd
 import traceback
+import contextlib
 import utils.download as download
+import utils.concurrency as concurrency
+import utils.http_cache as http_cache
+import utils.sink as sink
+import utils.rate_limit as rate_limit
+import utils.manifest as manifest
+import utils.replay as replay
+import utils.storage as storage
+import utils.json_stream as json_stream
 from datetime import datetime
 import json
 import time
+import threading
+import functools
+import atexit
 
 # GLOBAL DEFINITIONS
 date = datetime.now()
@@ -19,6 +31,38 @@ month = date.month
 
 data_raw = 'data/_raw/'
 data_processed = 'data/_processed/'
+data_cache = 'data/_cache/'
+
+# Http sessions, response caches and rate limiters (one per source class)
+_sessions = {}
+_caches = {}
+_limiters = {}
+_stores = {}
+_decoders = {}
+_sessions_lock = threading.Lock()
+# File sources: links of the search pages, fetched once per run (by page url)
+_page_links = {}
+_href_pattern = re.compile(r'href=["\'](.*?)["\']')
+
+
+# Rate limited response (HTTP 429, OVER_RATE_LIMIT...): can be retried after a while
+class RateLimitError(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# Response that will not change if retried (bad request, unknown route, not found...)
+class PermanentError(Exception):
+    pass
+
+
+# Glob like route search (ex: 'EER2023*Yearly*.csv') to a compiled link pattern
+@functools.lru_cache(maxsize=None)
+def _search_pattern(search):
+    search = search.replace('.','@@').replace('*','.*').replace('@@','\\.')
+    return re.compile(r'^.*' + search + '.*$')
+
 
 # ---------------------------------------------------------------------------------------------
 # # SDP raw source (Base class)
@@ -30,6 +74,35 @@ class Raw():
     base_params = None
     
     routes = []
+    
+    # Http session: max pooled (keep-alive) connections and (connect, read) timeouts in seconds
+    pool_size = 10
+    timeout = (10, 120)
+    
+    # Http cache: max size in bytes (per source) and time to live in seconds per route type
+    # A route can override it with a 'cache_ttl' key. Expired entries are revalidated (ETag/Last-Modified)
+    cache_size = 2 * 1024 ** 3
+    cache_ttl = {'info': 21 * 24 * 3600, 'data': 0, 'file': 0}
+    
+    # Rate limit: max requests per second (token bucket, None = no limit) and max burst of requests
+    rate_limit = None
+    rate_burst = 1
+    # Offline mode: responses are served from the http cache only
+    offline = False
+    # Check mode: only tell if new data is available, nothing downloaded
+    check = False
+    # Record/replay: http responses recorded to, or served from, fixtures (one folder per source)
+    # replayed responses may be delayed (seconds or (min, max)) and fail at a given rate (benchmarks)
+    record_path = None
+    replay_path = None
+    replay_latency = 0
+    replay_error_rate = 0
+    
+    # Raw output file format ('parquet' or 'csv'), written page by page
+    # parquet files are also exported as csv (csv_export): notebooks still read the raw csv files,
+    # to be turned off once they read the raw files with utils.storage.read
+    raw_format = 'parquet'
+    csv_export = True
         
     def __init__(self, base_url=None, base_params=None, route=None):
         # Base Url
@@ -47,12 +120,18 @@ class Raw():
       
     @classmethod    
     def main(cls, raw, test):
-        if test:
-            cls._routes()
-        elif raw:
-            cls.to_raw()    
-        else:
-            cls.to_processed()  
+        try:
+            if test:
+                cls._routes()
+            elif raw and cls.check:
+                cls.to_check()
+            elif raw:
+                cls.to_raw()    
+            else:
+                cls.to_processed()  
+        finally:
+            # Http cache index written once per run
+            cls._flush_cache()
             
     @classmethod   
     def to_raw(cls):
@@ -67,6 +146,10 @@ class Raw():
     @classmethod   
     def to_processed(cls):
         pass
+    
+    @classmethod   
+    def to_check(cls):
+        print(f'[WARNING] No check mode for {cls.__name__}')
               
     # ---------------------------------------------------------------------------------------------
     # Private
@@ -91,6 +174,132 @@ class Raw():
     def _route_params(cls, _route):
         return _route.get('route_params') or {}
     
+    # Pooled http session shared by all requests of the source class
+    @classmethod
+    def _session(cls):
+        with _sessions_lock:
+            session = _sessions.get(cls)
+            if session is None:
+                session = download.new_session(cls.pool_size)
+                if cls.replay_path or cls.record_path:
+                    store = cls._fixture_store(cls.replay_path or cls.record_path)
+                    if cls.replay_path:
+                        adapter = replay.ReplayAdapter(store, cls.replay_latency, cls.replay_error_rate,
+                                                       pool_maxsize=cls.pool_size)
+                    else:
+                        adapter = replay.RecordAdapter(store, pool_maxsize=cls.pool_size)
+                    replay.mount(session, adapter)
+                _sessions[cls] = session
+        return session
+    
+    # Fixture store of the source class (called with _sessions_lock held)
+    @classmethod
+    def _fixture_store(cls, path):
+        path = os.path.join(path, cls.__name__.lower().split('_')[0])
+        store = _stores.get(path)
+        if store is None:
+            store = replay.FixtureStore(path)
+            _stores[path] = store
+        return store
+    
+    # On-disk http response cache of the source class
+    @classmethod
+    def _cache(cls):
+        with _sessions_lock:
+            cache = _caches.get(cls)
+            if cache is None:
+                cache_path = data_cache + 'http/' + cls.__name__.lower().split('_')[0] + '/'
+                cache = http_cache.ResponseCache(cache_path, cls.cache_size)
+                _caches[cls] = cache
+                # Index also written at exit when the run does not go through main (ex: benchmark)
+                atexit.register(cache.flush)
+        return cache
+    
+    @classmethod
+    def _flush_cache(cls):
+        with _sessions_lock:
+            cache = _caches.get(cls)
+        if cache is not None:
+            cache.flush()
+    
+    # Class level data loaded once per run (ex: World Bank indicator catalogue), cleared between benchmark runs
+    @classmethod
+    def _clear_state(cls):
+        pass
+    
+    # Token bucket rate limiter of the source class (shared by all its workers)
+    @classmethod
+    def _limiter(cls):
+        with _sessions_lock:
+            limiter = _limiters.get(cls)
+            if limiter is None:
+                limiter = rate_limit.TokenBucket(cls.rate_limit, cls.rate_burst)
+                _limiters[cls] = limiter
+        return limiter
+    
+    # Route type (key of cache_ttl)
+    def _route_type(self, route=None):
+        route = route or self.route or {}
+        return 'info' if bool(route.get('info')) else 'data'
+    
+    def _cache_ttl(self, route=None):
+        route = route or self.route or {}
+        if 'cache_ttl' in route:
+            return route['cache_ttl']
+        return self.cache_ttl.get(self._route_type(route), 0)
+    
+    # Cached http GET: fresh entries are served from cache, expired ones are revalidated
+    # A downloaded body is cached by _store() once its data is known to be valid (error bodies can come with a 200)
+    # stream: body read as it is consumed (see _body_chunks), not loaded
+    def _get(self, url, route=None, stream=False):
+        cache = self._cache()
+        key = cache.key(url)
+        entry = cache.get(key)
+        if entry is not None and (self.offline or cache.is_fresh(entry, self._cache_ttl(route))):
+            return cache.response(key, url, entry, stream)
+        if self.offline:
+            print(f'[OFFLINE] Not in http cache: {url}')
+            return cache.response(key, url)
+        
+        self._limiter().acquire()
+        response = self._session().get(url, headers=cache.validators(entry), timeout=self.timeout, stream=stream)
+        if response.status_code == 304 and entry is not None:
+            cache.revalidated(key)
+            return cache.response(key, url, entry, stream)
+        if response.status_code == 200:
+            response.cache_store = (key, url)
+        return response
+    
+    # Caches the body of a downloaded response (not served from the cache)
+    def _store(self, response):
+        store = getattr(response, 'cache_store', None)
+        if store is None:
+            return
+        key, url = store
+        if getattr(response, 'cache_streamed', False):
+            self._cache().put_streamed(key, url, response.headers)
+        else:
+            self._cache().put(key, url, response.content, response.headers)
+    
+    # Body chunks of a response as they are read (a downloaded body is written to the cache on the way)
+    def _body_chunks(self, response, chunk_size):
+        store = getattr(response, 'cache_store', None)
+        if store is None:
+            return response.iter_content(chunk_size)
+        response.cache_streamed = True
+        return self._cache().iter_body(store[0], response, chunk_size)
+    
+    # Whole body of a response partly read from _body_chunks (ex: an error message instead of a data page)
+    def _read_body(self, response, chunks):
+        for _ in chunks:
+            pass
+        if getattr(response, 'cache_streamed', False):
+            response._content = self._cache().read_streamed(response.cache_store[0])
+        elif hasattr(response.raw, 'seek'):
+            # cached body file
+            response.raw.seek(0)
+            response._content = response.raw.read()
+    
     # Url based on instance properties
     def _get_url(self):
         return self.base_url + ('' if not self.base_params else '?' + urlencode(self.base_params))
@@ -124,34 +333,110 @@ class Raw():
     def _csv_full_name(self, raw=True):
         return self._csv_path(raw) + self._csv_name() + '.csv'
     
-    # Default raw to csv via dataframe (_raw_df)
+    def _raw_full_name(self, raw=True):
+        return self._csv_path(raw) + self._csv_name() + '.' + self.raw_format
+    
+    # Default raw dataframe pages (a single page: _raw_df)
+    def _raw_pages(self):
+        df = self._raw_df()
+        if df is not None:
+            yield df
+    
+    # Default raw to csv: pages are streamed to the raw file as they arrive
     def _raw_to_csv(self):
-        # Raw Csv Output file
-        csv_filename = self._csv_full_name(True)
+        # Raw output file (new periods file first when incremental, merged afterwards)
+        raw_filename = self._raw_full_name(True)
+        incremental = self._incremental(raw_filename)
+        out_filename = raw_filename + '.new' if incremental else raw_filename
         try:
-            # All base route subroutes in same csv
-            if 'routes' in self.route:
-                df = pd.DataFrame()
-                for route in self.route['routes']:
+            with sink.new_sink(out_filename, self.raw_format, self._fields()) as raw_sink:
+                # All base route subroutes in same file
+                if 'routes' in self.route:
                     cls = self._cls()
-                    inst =  cls(cls.base_url, cls.base_params, route)
-                    route_df = inst._raw_df()  
-                    if route_df is not None:
-                        df=pd.concat([df, route_df], ignore_index=True)                     
-            else:    
-                # Get dataframe
-                df = self._raw_df() 
+                    for route in self.route['routes']:
+                        inst =  cls(cls.base_url, cls.base_params, route)
+                        for page_df in inst._raw_pages():
+                            raw_sink.write(page_df)
+                else:    
+                    for page_df in self._raw_pages():
+                        raw_sink.write(page_df)
+            
+            if raw_sink.rows and not os.path.exists(out_filename):
+                raise FileNotFoundError(f"[FATAL] : Raw file not found!")          
             
-            if df is not None and not df.empty: 
-                # Ok, backup to raw csv    
-                df.to_csv(csv_filename, index=False, encoding='utf-8') 
-                if not os.path.exists(csv_filename):
-                    raise FileNotFoundError(f"[FATAL] : Csv file not found!")          
+            if incremental and raw_sink.rows:
+                self._merge_raw(out_filename, raw_filename)
+            if bool(self.route.get('incremental')) and os.path.exists(raw_filename):
+                self._write_watermark(raw_filename)
+            if raw_sink.rows:
+                manifest.update(raw_filename)
+            if self.csv_export and self.raw_format != 'csv' and os.path.exists(raw_filename):
+                storage.export_csv(raw_filename, self._csv_full_name(True))
             
         except Exception as e:
-            print('[ERROR] Raw to csv: ' + csv_filename)
+            print('[ERROR] Raw to file: ' + raw_filename)
             print('[ERROR] Exception:\n' + str(e))
             traceback.print_exc()
+        finally:
+            if incremental and os.path.exists(out_filename):
+                os.remove(out_filename)
+    
+    # Raw file as dataframe, values as text (a route raw file if no filename, csv if not stored as parquet)
+    def _read_raw(self, filename=None, columns=None):
+        return storage.read(filename or self._csv_path(True) + self._csv_name(), columns, text=True)
+    
+    # ---------------------------------------------------------------------------------------------
+    # Incremental routes
+    # Route keys: 'incremental' (True), 'period' (period column, default 'period'),
+    # 'lookback' (periods fetched again for revisions), 'key' (columns identifying a row for the merge)
+    
+    def _period_column(self):
+        return self.route.get('period') or 'period'
+    
+    def _watermark_name(self, raw_filename=None):
+        return (raw_filename or self._raw_full_name(True)) + '.watermark.json'
+    
+    # Max period stored in the raw file (sidecar watermark file first)
+    def _watermark(self):
+        raw_filename = self._raw_full_name(True)
+        if not os.path.exists(raw_filename):
+            return None
+        if os.path.exists(self._watermark_name(raw_filename)):
+            with open(self._watermark_name(raw_filename), 'r') as file:
+                return json.load(file).get('period')
+        periods = self._read_raw(raw_filename, [self._period_column()])[self._period_column()].astype(str)
+        return periods.max() if not periods.empty else None
+    
+    def _write_watermark(self, raw_filename):
+        periods = self._read_raw(raw_filename, [self._period_column()])[self._period_column()].astype(str)
+        with open(self._watermark_name(raw_filename), 'w') as file:
+            json.dump({'period': periods.max(), 'updated': datetime.now().isoformat(timespec='seconds')}, file)
+    
+    # Incremental fetch only if the route was rewritten from a watermark and the raw file is there
+    def _incremental(self, raw_filename):
+        return self.route is not None and bool(self.route.get('since')) and os.path.exists(raw_filename)
+    
+    # New rows replace stored rows with the same key (or all stored rows since the fetched period)
+    # Rows are merged typed: declared fields dtypes, or else those of the stored file
+    def _merge_raw(self, new_filename, raw_filename):
+        fields = self._fields()
+        stored_df = storage.read(raw_filename)
+        new_df = storage.read(new_filename)
+        if fields:
+            stored_df = stored_df.reindex(columns=list(fields)).astype(fields)
+            new_df = new_df.reindex(columns=list(fields)).astype(fields)
+        else:
+            new_df = new_df.reindex(columns=stored_df.columns).astype(stored_df.dtypes.to_dict())
+        key = self.route.get('key')
+        if key:
+            new_keys = pd.MultiIndex.from_frame(new_df[key].astype(str))
+            keep = ~pd.MultiIndex.from_frame(stored_df[key].astype(str)).isin(new_keys)
+        else:
+            keep = stored_df[self._period_column()].astype(str) < str(self.route['since'])
+        merged_df = pd.concat([stored_df[keep], new_df], ignore_index=True)
+        print(f'... Incremental merge: {len(new_df)} new/revised rows, {int(keep.sum())} stored rows kept')
+        with sink.new_sink(raw_filename, self.raw_format, fields) as raw_sink:
+            raw_sink.write(merged_df)
             
     def process_raw_df(self):
         pass            
@@ -166,8 +451,22 @@ class Api(Raw):
     # Api default max results per request
     max_results = 10000
     
+    # Retries: jittered exponential backoff starting at retry_delay seconds (capped to max_retry_delay)
     max_retries = 1
     retry_delay = 0
+    max_retry_delay = 60
+    
+    # Api max concurrent requests (pages of a route, route and group probes) against the source host
+    max_workers = 1
+    
+    # Fields extracted from data pages: {field ('.' for nested fields): dtype}, pages json normalized if None
+    # every page gets the same typed columns, fields not declared are dropped (and logged)
+    fields = None
+    # Path of the records array in data pages (ex: ['response', 'data']): with declared fields, records are
+    # decoded while the page is downloaded (page_chunk_size bytes at a time), without loading its body,
+    # building its json document nor a normalized frame
+    page_path = None
+    page_chunk_size = 64 * 1024
        
     # ---------------------------------------------------------------------------------------------
     # Public
@@ -193,43 +492,78 @@ class Api(Raw):
         _routes = []  
         # Test first level for the route and deeper if sub routes
         print('-- Analyzing routes, please wait...')
-        with requests.Session():
-                     
-            for route in cls.routes:
-                
-                if (cls._route_skip_analysis(route)):
-                    continue 
-                
-                # OK, analyze route                                 
-                _route = dict(route)
-                print(f'... Analysing route : {_route}')                  
-                _data, _route =  cls._route_analysis(_route)
-            
-                if not _route:
-                    continue   
-                                 
-                # We iterate on all groups     
-                for group in cls._groups(_route):
-                                                            
-                    _group = cls._group(_route, group)        
-                    _route_routes = cls._group_routes(_route, _group, _data)
-                    # Set routes group for the route
-                    if (_route_routes):
-                        if (bool(_route.get('first'))) :
-                            _group =  _route_routes[0]
-                        else: 
-                            _group['routes'] =  _route_routes 
-                    #print(group_route)
-                    
-                    _routes.append(_group)
+        
+        # Routes analyzed concurrently (all done before groups: groups may need info routes)
+        routes = [cls._route_incremental(dict(route)) for route in cls.routes if not cls._route_skip_analysis(route)]
+        analyses = list(concurrency.ordered_map(cls._route_analysis_print, routes, cls.max_workers))
+
+        # Routes downloaded before the groups (ex: info routes), one at a time: their pages use the workers
+        for _data, _route in analyses:
+            if _route and cls._route_prefetch(_route):
+                cls(cls.base_url, cls.base_params, _route)._raw_to_csv()
+
+        for _data, _route in analyses:
+
+            if not _route or cls._route_prefetch(_route):
+                continue
+
+            # We iterate on all groups     
+            for group in cls._groups(_route):
+
+                _group = cls._group(_route, group)        
+                _route_routes = cls._group_routes(_route, _group, _data)
+                # Set routes group for the route
+                if (_route_routes):
+                    if (bool(_route.get('first'))) :
+                        _group =  _route_routes[0]
+                    else: 
+                        _group['routes'] =  _route_routes 
+                #print(group_route)
+
+                _routes.append(_group)
+
 
-                
         print(f'\nFound routes:\n{_routes}')                    
         return _routes 
            
     @classmethod
     def _route_skip_analysis(cls, _route):
         return False
+
+    # Route downloaded once analyzed, before the groups routes are built (not a to_raw route)
+    @classmethod
+    def _route_prefetch(cls, _route):
+        return False
+
+    # Incremental route: only periods from the stored watermark (minus lookback for revisions) are requested
+    @classmethod
+    def _route_incremental(cls, _route):
+        if not bool(_route.get('incremental')):
+            return _route
+        watermark = cls(cls.base_url, cls.base_params, _route)._watermark()
+        if not watermark:
+            return _route
+        since = cls._period_start(watermark, int(_route.get('lookback') or 0))
+        route_params = dict(_route.get('route_params') or {})
+        route_params['start'] = since
+        route_params.pop('end', None)
+        _route['route_params'] = route_params
+        _route['since'] = since
+        print(f'... Incremental route {_route["route"]}: from period {since} (stored up to {watermark})')
+        return _route
+    
+    # Period minus lookback periods (same format: 2021 -> 2020, 2021-03 -> 2021-02)
+    @classmethod
+    def _period_start(cls, period, lookback):
+        try:
+            return str(pd.Period(str(period)) - lookback)
+        except (ValueError, TypeError):
+            return str(period)
+    
+    @classmethod
+    def _route_analysis_print(cls, _route):
+        print(f'... Analysing route : {_route}')
+        return cls._route_analysis(_route)
       
     @classmethod
     def _route_analysis(cls, _route):
@@ -253,29 +587,33 @@ class Api(Raw):
          
     @classmethod
     def _group_routes(cls, _route, _group, _data):
-        # Get all actual routes for this group                                                              
-        _group_routes = []
-        for group_path in cls._group_routes_paths(_route, _group, _data):
-            
+        # Get all actual routes for this group
+        group_params = {**(cls.base_params or {}), **(cls._route_params(_route)), **(cls._group_route_params(_route, _group))}
+        
+        def group_route_probe(group_path):
             _group_route = {'route': _route['route'] +'/'+ group_path}
             # We build actual route (existing API route url)                          
             group_route_path = cls._route_path(_group_route)
             print(f'... route path: {group_route_path}')
-            #print(f'route _group_route: {_group_route}')
-                        
             # Here we can access /data path directly (actual api sub route)
-            #response = requests.get(cls.base_url + group_route_path, {**(cls.base_params), **(cls._route_params(_route)), **(cls._group_route_params(_route, _group))})
-            #print('!!! response.url' + response.url)
-            #sub_route = cls()._response_data(response, _group)[1]
-            sub_route = cls()._response(cls.base_url + group_route_path, {**(cls.base_params), **(cls._route_params(_route)), **(cls._group_route_params(_route, _group))} , _group)[1]
+            sub_route = cls()._response(cls.base_url + group_route_path, group_params, _group)[1]
             if not sub_route:
-                continue  
-            
-            # Sub route returns results                                                                     
-            _group_routes.append({**(sub_route), **(_group_route)})   
-            # Test if route params includes 'first' to exit when first non zero dataset is found
-            if (bool(_route.get('first'))):
-                break
+                return None
+            return {**(sub_route), **(_group_route)}
+        
+        # Probes run concurrently but results are kept in group paths order
+        _group_routes = []
+        group_paths = cls._group_routes_paths(_route, _group, _data)
+        with contextlib.closing(concurrency.ordered_map(group_route_probe, group_paths, cls.max_workers)) as probes:
+            for _group_route in probes:
+                if not _group_route:
+                    continue  
+                # Sub route returns results                                                                     
+                _group_routes.append(_group_route)   
+                # Test if route params includes 'first' to exit when first non zero dataset is found
+                # (closing the probes cancels the outstanding ones)
+                if (bool(_route.get('first'))):
+                    break
             
         return _group_routes
     
@@ -297,29 +635,54 @@ class Api(Raw):
         return _group_dict 
     
     # Response
-    def _response(self, url=None, params=None, route = None):
+    def _response(self, url=None, params=None, route = None, response_data = None, stream = False):
         if (not url):
-            url = self._get_url()
+            url = self._get_url(route)
         else:
             url += ('' if not params else '?' + urlencode(params)) 
         
         #print(f'Route URL: {url}') 
         #print(f'Route max retries: {self.max_retries}') 
-        #time.sleep(self.retry_delay)     
         retries = 0
         while retries < self.max_retries:
-            response = requests.get(url)
-            _data, _route = self._response_data(response, dict(route))
-            if _data is not None:
-                return _data, _route
+            retry_after = None
+            try:
+                response = self._get(url, route, stream)
+                self._check_response(response)
+                _data, _route = (response_data or self._response_data)(response, dict(route))
+                if _data is not None:
+                    self._store(response)
+                    return _data, _route
+            except PermanentError as e:
+                # Fail fast: same request, same error
+                print(f'[ERROR] {e} (no retry): {url}')
+                return None, None
+            except RateLimitError as e:
+                print(f'Rate limited: {e}')
+                # Honour Retry-After, at least a minimal backoff otherwise
+                retry_after = e.retry_after if e.retry_after is not None else rate_limit.backoff_delay(retries, self.retry_delay or 1, self.max_retry_delay)
+                self._limiter().pause(retry_after)
+            except requests.exceptions.RequestException as e:
+                print(f'Request error: {e}')
             
             retries += 1
-            delay = self.retry_delay * retries
-            if (bool(delay)):
-                print(f'Something went wrong. Lets retry after {delay} seconds... please wait...')
-                time.sleep(delay)
+            if retries < self.max_retries:
+                delay = max(retry_after or 0, rate_limit.backoff_delay(retries, self.retry_delay, self.max_retry_delay))
+                if (bool(delay)):
+                    print(f'Something went wrong. Lets retry after {delay:.1f} seconds... please wait...')
+                    time.sleep(delay)
                     
         return None, None        
+    
+    # Http status: rate limits and server errors can be retried, other client errors are permanent
+    def _check_response(self, response):
+        status = response.status_code
+        if status == 429 or (status == 503 and 'Retry-After' in response.headers):
+            raise RateLimitError(f'HTTP {status}', rate_limit.retry_after(response))
+        if self.offline and status == 504:
+            raise PermanentError('Not in http cache (offline)')
+        if 400 <= status < 500 and status != 408:
+            raise PermanentError(f'HTTP error {status} {response.reason}')
                 
     # Response data
     def _response_data(self, response, route = None):
@@ -338,22 +701,22 @@ class Api(Raw):
             #print('[DEBUG]:\n ' + str(data))
             error = data['error']  
             if type(error) is not dict:
-                error = {'code': data['code']  , 'message': error}
+                error = {'code': data.get('code'), 'message': error}
             
-            # TODO if error['code']=='OVER_RATE_LIMIT'  and retry mechanism  
-            #raise Exception('[FATAL] Error ' + str(error['code']) + ': ' + error['message'] ) 
-            print(f'[FATAL] Error {error}') 
-            return None, None
+            if error.get('code') == 'OVER_RATE_LIMIT':
+                raise RateLimitError(f"{error['code']}: {error.get('message')}", rate_limit.retry_after(response))
+            raise PermanentError(f'Error {error}')
         
         return data, route                     
     
-    # Url based on instance properties
-    def _get_url(self):
+    # Url based on instance properties (or on the given route, ex: a page route)
+    def _get_url(self, route=None):
+        route = route or self.route
         route_path = ''
         route_params = {}
-        if self.route:
-            route_path = self._cls()._route_path(self.route)
-            route_params = self.route.get('route_params') or {}
+        if route:
+            route_path = self._cls()._route_path(route)
+            route_params = route.get('route_params') or {}
         
         url =  self.base_url + route_path
         params =   {**(self.base_params or {}), **(route_params)}
@@ -362,13 +725,12 @@ class Api(Raw):
 
     # Default raw to dataframe
     def _raw_df(self):
-        data = None       
-        with requests.Session() as session:
-            response = session.get(self._get_url())
-            data = self._response_data(response)[0]
+        response = self._get(self._get_url())
+        data = self._response_data(response)[0]
            
         if not data: 
             return None
+        self._store(response)
             
         return pd.json_normalize(data)
     
@@ -378,12 +740,10 @@ class Api(Raw):
     
     # Default page params
     def _page_params(self, page):
-        pages_params = self.route.get('route_params') or {}
-        pages_params['page'] = page + 1
-        return pages_params
+        return {'page': page + 1}
         
     # Default route page 
-    def _page_df(self, session, page):
+    def _page_df(self, page):
         
         max_results = self.max_results
         
@@ -393,49 +753,111 @@ class Api(Raw):
         limit = min(total, offset + max_results)    
         print(f'.... {offset + 1} - {limit}')
         
-        page_params = self._page_params(page)
-            
-        self.route['route_params'] = {**(self.route.get('route_params') or {}), **(page_params)}
+        # Each page gets its own route copy as pages may be fetched concurrently
+        page_route = dict(self.route)
+        page_route['route_params'] = {**(self.route.get('route_params') or {}), **(self._page_params(page))}
         
-        data = self._response(None, None, self.route)[0]
+        decoder = self._decoder()
+        if decoder is not None and self.page_path is not None:
+            return self._response(None, None, page_route, self._page_records, stream=True)[0]
+        
+        data = self._response(None, None, page_route)[0]
         if data is not None:                                              
             try :
+                if decoder is not None:
+                    return decoder.decode(self._page_data(data), page_route.get('route'))
                 page_df = pd.json_normalize(self._page_data(data))
                 return page_df
             except Exception as e:
-                print('Exception during json normalize for df!!\n' + e)
+                print('Exception during json normalize for df!!\n' + str(e))
                 #print(json.dumps(data, indent=4))
                 
         return None        
 
     
-    # Default raw to dataframe
-    def _pages_df(self):
+    # Page records decoded while the response is read (the page json is decoded as a whole only if they are
+    # not found, ex: an error message, or for http errors)
+    def _page_records(self, response, route = None):
+        source = (route or {}).get('route')
+        if response.status_code == 200:
+            chunks = self._body_chunks(response, self.page_chunk_size)
+            try:
+                df = self._decoder().decode(json_stream.iter_array(chunks, self.page_path), source)
+                # rest of the document (cached body written to the end)
+                for _ in chunks:
+                    pass
+                return df, route
+            except KeyError:
+                self._read_body(response, chunks)
+            except ValueError as e:
+                print(f"Error decoding JSON: {e}")
+                return None, None
+            finally:
+                response.close()
+        data, route = self._response_data(response, route)
+        if data is None:
+            return None, None
+        return self._decoder().decode(self._page_data(data), source), route
+    
+    # Declared fields of the route data ('fields' route key, class fields for data routes)
+    def _fields(self):
+        route = self.route or {}
+        if 'fields' in route:
+            return route['fields']
+        return None if bool(route.get('info')) else self.fields
+    
+    # Typed page decoder of the declared fields (None: pages are json normalized)
+    def _decoder(self):
+        fields = self._fields()
+        if not fields:
+            return None
+        key = (self._cls(), tuple(fields.items()))
+        with _sessions_lock:
+            decoder = _decoders.get(key)
+            if decoder is None:
+                name = self._cls().__name__
+                decoder = json_stream.RecordsDecoder(fields, lambda unknown: print(f'[WARNING] {name}: fields not declared (dropped): {unknown}'))
+                _decoders[key] = decoder
+        return decoder
+    
+    # Non numeric values of numeric fields set to null while decoding the route pages (ex: EIA '--', 'NA', 'W')
+    def _report_coerced(self):
+        decoder = self._decoder()
+        if decoder is None:
+            return
+        route = self.route.get('route')
+        for field, (count, samples) in decoder.pop_coerced(route).items():
+            print(f'[WARNING] {self._cls().__name__} {route}: {count} non numeric {field} values set to null (ex: {samples})')
+    
+    # Default route pages (generator): up to max_workers pages in flight, yielded in offset order
+    def _pages(self):
         
         route = self.route 
         if not route:
-            return None
-
-        pages_df = pd.DataFrame()
-              
-        # Test first level fot the route
-        with requests.Session() as session:
-            
-            # Define pages for loop
-            max = self.max_results
-            print(f'... Processing {route}')
-            total = int(route['total'])
-            pages = total // max
-            if total % max > 0:
-                pages += 1
+            return
             
-            # Pages loop
-            for page in range(0, pages):
-                page_df = self._page_df(session, page)
-                if (not page_df.empty):
-                    pages_df = pd.concat([pages_df, page_df], ignore_index=True)  
+        # Define pages for loop
+        max = self.max_results
+        print(f'... Processing {route}')
+        total = int(route['total'])
+        pages = total // max
+        if total % max > 0:
+            pages += 1
         
-        return pages_df           
+        # Pages loop
+        for page_df in concurrency.ordered_map(self._page_df, range(0, pages), self.max_workers):
+            if page_df is not None and not page_df.empty:
+                yield page_df
+        self._report_coerced()
+    
+    # Default raw to dataframe
+    def _pages_df(self):
+        if not self.route:
+            return None
+        pages_df = list(self._pages())
+        if not pages_df:
+            return pd.DataFrame()
+        return pd.concat(pages_df, ignore_index=True)           
 
 
 # ---------------------------------------------------------------------------------------------
@@ -446,46 +868,127 @@ class Api(Raw):
 # TODO OR NOT for other file types
 
 class File(Raw):    
+    
+    # Raw file = the downloaded file as is (conditional requests, resumed downloads, checksums)
+    raw_format = 'csv'
+    
+    # Download retries (resumed where the previous attempt stopped)
+    max_retries = 3
+    retry_delay = 5
         
+    @classmethod   
+    def to_check(cls):
+        # Loop over class level routes: compare the current file links with the downloaded ones
+        new_files = []
+        for route in cls.routes:
+            inst = cls(cls.base_url, cls.base_params, route)
+            url = inst._get_url()
+            last = inst._link_index().get(inst._csv_name())
+            if not url:
+                print(f'[ERROR] No file found for route: {route}')
+            elif last is None or last['url'] != url:
+                print(f'NEW FILE: {url} (last downloaded: {last["url"] if last else None})')
+                new_files.append(url)
+            else:
+                print(f'Up to date: {url} (downloaded at {last["downloaded_at"]})')
+        return new_files
+    
     def _pattern(self):
         search = self.route.get('search') or self.route.get('pattern')  or '.csv'
-        search = search.replace('.','@@').replace('*','.*').replace('@@','\.')
-        return r'^.*' + search + '.*$'     
+        return _search_pattern(search)
+    
+    # Unique links of the route search page (fetched once per run when routes share a page)
+    def _page_links(self):
+        page_url = self.base_url + self.route['route'] + self.route['search_url']
+        with _sessions_lock:
+            links = _page_links.get(page_url)
+        if links is None:
+            response = self._get(page_url)
+            links = list(dict.fromkeys(_href_pattern.findall(response.text))) if response.ok else []
+            if links:
+                self._store(response)
+            with _sessions_lock:
+                _page_links[page_url] = links
+        return links
         
-    # Get csv list according to pattern
-    def find_files(self, pattern = r'.*\.csv$'):
-        with requests.Session() as session:
-            # Get response
-            response = session.get(self.base_url + self.route['route'] + self.route['search_url'])
-            pattern = r'href=["\'](.*?)["\']'
-            links = re.findall(pattern, response.text)
-            # Filter the links based on the pattern
-            filtered_links = [link for link in links if re.match(self._pattern(), link)]
-            return filtered_links
+    # Get csv list according to pattern (route search pattern by default)
+    def find_files(self, pattern = None):
+        pattern = re.compile(pattern) if pattern else self._pattern()
+        # Filter the links based on the pattern
+        return [link for link in self._page_links() if pattern.match(link)]
 
     # get The csv url
     def find_file(self):
-        the_csv = []
-        csvs = self.find_files(self._pattern())
-        for csv in csvs:
-            if csv in the_csv:
-                continue
-            the_csv.append(csv)
-
-        if len(the_csv) > 0:
-            return the_csv[0]
+        csvs = self.find_files()
+        if len(csvs) > 0:
+            return csvs[0]
 
         return None
+    
+    # Downloaded file links by csv name (persisted, used by check mode)
+    def _link_index_name(self):
+        return data_cache + 'links/' + self._cls_name() + '.json'
+    
+    def _link_index(self):
+        filename = self._link_index_name()
+        if not os.path.exists(filename):
+            return {}
+        with open(filename, encoding='utf-8') as file:
+            return json.load(file)
+    
+    def _write_link_index(self, url):
+        filename = self._link_index_name()
+        index = self._link_index()
+        index[self._csv_name()] = {'url': url, 'downloaded_at': datetime.now().isoformat(timespec='seconds')}
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename + '.part', 'w', encoding='utf-8') as file:
+            json.dump(index, file, indent=1)
+        os.replace(filename + '.part', filename)
 
     def _get_url(self):
         file_url = self.find_file()
+        if not file_url:
+            return None
         return self.base_url + file_url     
+    
+    # Override method
+    def _route_type(self, route=None):
+        return 'file'
          
     def _raw_df(self):
         pass
     
+    # Downloaded file is kept only if modified (conditional request with cached ETag/Last-Modified)
     def _raw_to_csv(self):
-        download.download_file_with_retry(self._get_url(),self._csv_full_name())
+        url = self._get_url()
+        csv_filename = self._csv_full_name()
+        if not url:
+            print(f'[ERROR] No file found for route: {self.route}')
+            return
+        
+        cache = self._cache()
+        key = cache.key(url)
+        entry = cache.get(key) if os.path.exists(csv_filename) else None
+        if entry is not None and (self.offline or cache.is_fresh(entry, self._cache_ttl())):
+            print(f'File up to date: {csv_filename}')
+            return
+        if self.offline:
+            print(f'[OFFLINE] File not in http cache: {url}')
+            return
+        
+        response = download.download_file_with_retry(url, csv_filename, self.max_retries, self.retry_delay, session=self._session(),
+                                                     timeout=self.timeout, headers=cache.validators(entry))
+        if response is None:
+            return
+        if response.status_code == 304:
+            print(f'File not modified: {csv_filename}')
+            cache.revalidated(key)
+            manifest.touch(csv_filename)
+        else:
+            # Validators only, the body is the raw file itself
+            cache.put(key, url, None, response.headers)
+            manifest.update(csv_filename, etag=response.headers.get('ETag'))
+        self._write_link_index(url)
         
         
 """ TRACKING TODO
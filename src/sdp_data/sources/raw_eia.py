@@ -7,9 +7,27 @@ class Eia_Api(raw.Api):
     
     # API Limit : max results per request
     max_results = 5000
-    # API Throttling : max requests per period
+    # API Throttling : max requests per second (and burst), retries with backoff from retry_delay seconds
+    rate_limit = 2
+    rate_burst = 4
     max_retries = 3
     retry_delay = 5
+    # API Concurrency : max pages in flight for a route
+    max_workers = 4
+    
+    # Data fields (typed page decoding)
+    fields = {
+        'period': 'string', 
+        'countryRegionId': 'string', 'countryRegionName': 'string', 
+        'countryRegionTypeId': 'string', 'countryRegionTypeName': 'string',
+        'productId': 'string', 'productName': 'string', 
+        'activityId': 'string', 'activityName': 'string',
+        'dataFlagId': 'string', 'dataFlagDescription': 'string',
+        'unit': 'string', 'unitName': 'string', 
+        'value': 'float64'
+    }
+    # Data records of a page (decoded while parsed)
+    page_path = ['response', 'data']
             
     base_url = 'https://api.eia.gov/v2'
     base_params = {        
@@ -22,8 +40,12 @@ class Eia_Api(raw.Api):
         'length': max_results
     }
 
+    # Incremental routes: only periods from the last stored one (minus lookback) are requested
+    # and merged by key into the raw file
     routes =[
         {'route': '/international', 'csv_name': '/intl/2020_2021', 'data': True,
+         'incremental': True, 'lookback': 1,
+         'key': ['period', 'countryRegionId', 'productId', 'activityId', 'unit'],
          'route_params': {
              'facets': [
                  {'facet': 'countryRegionTypeId', 'value': 'c'}
@@ -159,11 +181,13 @@ class Eia_Api(raw.Api):
     def _raw_df(self):
         return self._pages_df()
     
+    # Override method
+    def _raw_pages(self):
+        return self._pages()
+    
     # Override method
     def _page_params(self, page):
-        pages_params = self.route.get('route_params') or {}
-        pages_params['offset'] =  page * self.max_results
-        return pages_params
+        return {'offset': page * self.max_results}
     
     # Override method
     def _page_data(self, data):        
@@ -1,10 +1,24 @@
 
 # EMBER (NEW REFERENCE in 2023)
+import os
+import pandas as pd
 import raw
+import utils.sink as sink
 
 class Ember_File(raw.File):
 
     license = ('CC BY-SA 4.0')
+    
+    # Processed long format files (routes with 'typed'): read by chunks with explicit dtypes
+    # and written as parquet partitioned by year (data/_processed/ember/<csv name>/year=2023/)
+    chunk_size = 500000
+    long_format_dtypes = {
+        'Area': 'category', 'Country code': 'category', 'Area type': 'category', 'Continent': 'category', 
+        'Ember region': 'category', 'EU': 'category', 'OECD': 'category', 'G20': 'category', 'G7': 'category', 
+        'ASEAN': 'category', 'Category': 'category', 'Subcategory': 'category', 'Variable': 'category', 
+        'Unit': 'category', 'Value': 'float32', 'YoY absolute change': 'float32', 'YoY % change': 'float32', 
+        'Year': 'int16'
+    }
 
     base_url = 'https://ember-climate.org'      
     routes = [        
@@ -13,14 +27,14 @@ class Ember_File(raw.File):
         # href="/app/uploads/2022/07/yearly_full_release_long_format.csv"
         {'route': '/data-catalogue', 'csv_name':'/elec/all/year', 
             'search_url': '/yearly-electricity-data',     
-            'search': 'full_release_long_format*.csv'
+            'search': 'full_release_long_format*.csv', 'typed': True
         },       
         # ELEC MONTHLY          
         # https://ember-climate.org/data-catalogue/monthly-electricity-data
         # href="/app/uploads/2022/07/monthly_full_release_long_format-4.csv"
         {'route': '/data-catalogue', 'csv_name':'/elec/all/month',
             'search_url': '/monthly-electricity-data',     
-            'search': 'full_release_long_format*.csv'
+            'search': 'full_release_long_format*.csv', 'typed': True
         }, 
         
         # GER YEARLY  
@@ -54,6 +68,35 @@ class Ember_File(raw.File):
         }    
     ] 
     
+    @classmethod   
+    def to_processed(cls):
+        for route in cls.routes:
+            if route.get('typed'):
+                cls(cls.base_url, cls.base_params, route)._typed_to_parquet()
+    
+    # Long format csv to a year partitioned parquet dataset (peak memory = one chunk)
+    def _typed_to_parquet(self):
+        csv_filename = self._csv_full_name(True)
+        if not os.path.exists(csv_filename):
+            print(f'[ERROR] Raw file not found: {csv_filename}')
+            return
+        dataset_path = self._csv_path(False) + self._csv_name()
+        print(f'-- Typed ingest: {csv_filename} -> {dataset_path}/')
+        
+        # Declared dtypes, other columns as text (same dtypes for every chunk)
+        columns = pd.read_csv(csv_filename, nrows=0).columns
+        dtypes = {column: self.long_format_dtypes.get(column, 'string') for column in columns if column != 'Date'}
+        chunks = pd.read_csv(csv_filename, dtype=dtypes, chunksize=self.chunk_size)
+        with sink.PartitionedParquetSink(dataset_path, 'year') as dataset_sink:
+            for chunk in chunks:
+                if 'Date' in chunk.columns:
+                    chunk['Date'] = pd.to_datetime(chunk['Date'], format='%Y-%m-%d')
+                    chunk['year'] = chunk['Date'].dt.year.astype('int16')
+                else:
+                    chunk['year'] = chunk['Year']
+                dataset_sink.write(chunk)
+        print(f'{dataset_sink.rows} rows, {dataset_sink.chunks} chunks')
+    
     
 def main(raw, test):
     Ember_File().main(raw, test)
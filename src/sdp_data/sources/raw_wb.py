@@ -1,10 +1,29 @@
 # WORLDBANK
+import os
+import zipfile
 import pandas as pd
 import raw
+import utils.download as download
+import utils.worldbank as worldbank
+import utils.storage as storage
  
 class Wb_Api(raw.Api):
     
     max_results = 21000 # API MAX=32000 but 21000 seems good tradeoff performance/nb results 
+    max_workers = 4 # Max concurrent pages for a route
+    rate_limit = 10 # Max requests per second
+    rate_burst = 10
+    # Indicators downloaded as one zipped csv (bulk), json pages only as fallback
+    bulk = True
+    # Indicator data fields (typed page decoding), info routes are json normalized
+    fields = {
+        'indicator.id': 'string', 'indicator.value': 'string', 
+        'country.id': 'string', 'country.value': 'string',
+        'countryiso3code': 'string', 'date': 'string', 'value': 'float64', 
+        'unit': 'string', 'obs_status': 'string', 'decimal': 'Int64'
+    }
+    # Data records of a page: second element, after the page metadata (decoded while parsed)
+    page_path = [1]
     base_url = 'https://api.worldbank.org/v2' 
     base_params = {
         'format': 'json',
@@ -44,37 +63,54 @@ class Wb_Api(raw.Api):
     def _info_df(cls, info):
         info_route = next(filter(lambda route: bool(route.get('info')) and route['route'] == '/' + info, cls.routes), None)
         info_inst = cls(cls.base_url, cls.base_params, info_route)
-        info_df = pd.read_csv(info_inst._csv_full_name())
+        info_df = info_inst._read_raw()
         #print(info_df.head())
         return info_df
     
+    # Indicator catalogue: loaded once per run, persisted (parquet) and rebuilt after catalogue_ttl seconds
+    # or when the indicators info file is newer
+    catalogue_ttl = 7 * 24 * 3600
+    _catalogue = None
+    
     @classmethod
-    def __indicators(cls, search):
-        
-        df_indicators = cls._info_df('indicators')
-        
-        # Explode sources
-        #df_indicators['source'] = df_indicators['source'].apply(lambda x : dict(eval(x)) )
-        #source_exploded = df_indicators['source'].apply(pd.Series).add_prefix('source.')
-        #df_indicators = pd.concat([df_indicators.drop('source', axis=1), source_exploded], axis=1)
-        
-        # Exclude archives = 57
-        df_indicators = df_indicators[df_indicators['source.id']!='57']
+    def _indicator_catalogue(cls):
+        if cls._catalogue is not None:
+            return cls._catalogue
+        info_route = next(filter(lambda route: bool(route.get('info')) and route['route'] == '/indicators', cls.routes), None)
+        info_inst = cls(cls.base_url, cls.base_params, info_route)
+        info_filename = storage.find(info_inst._csv_path(True) + info_inst._csv_name())
+        catalogue_filename = raw.data_cache + 'wb/indicator_catalogue.parquet'
         
-        # Exclude: relative indicators (in %)
-        if '.ZS' not in search:
-            df_indicators = df_indicators[~df_indicators['id'].str.endswith('.ZS')]    
-        if '.ZG' not in search:
-            df_indicators = df_indicators[~df_indicators['id'].str.endswith('.ZG')] 
-                    
+        catalogue = worldbank.IndicatorCatalogue.load(catalogue_filename, cls.catalogue_ttl, info_filename)
+        if catalogue is None:
+            # Excluded: archives (source 57), relative indicators (in %) unless asked by the pattern
+            catalogue = worldbank.IndicatorCatalogue.from_df(cls._info_df('indicators'))
+            catalogue.save(catalogue_filename)
+        cls._catalogue = catalogue
+        return catalogue
+    
+    # Country iso2 codes by iso3 code (countries info route), loaded once per run
+    _iso2 = None
+    
+    @classmethod
+    def _countries_iso2(cls):
+        if cls._iso2 is None:
+            cls._iso2 = cls._info_df('countries').set_index('id')['iso2Code']
+        return cls._iso2
+    
+    # Override method
+    @classmethod
+    def _clear_state(cls):
+        cls._catalogue = None
+        cls._iso2 = None
+    
+    @classmethod
+    def __indicators(cls, search):
         # Exclude : Found indicator ending with XU.E (ex: Gdp deflator)
         # df_indicators = df_indicators[~df_indicators['id'].str.endswith('.XU.E')]
         
-        # Matches pattern        
-        search = search.replace('.','@@').replace('*','.*').replace('@@','\.')
-        pattern = r'^' + search + '$'
-        
-        indicators = list(df_indicators.loc[df_indicators['id'].str.contains(pattern), 'id'])
+        # Matches pattern (from the ids sharing its prefix)
+        indicators = cls._indicator_catalogue().match(search)
 
         print(indicators)
         return indicators
@@ -107,14 +143,17 @@ class Wb_Api(raw.Api):
                         
             #response = requests.get(cls.base_url + route_path, {**(cls.base_params), **(cls._route_params(_route)), **(params)})
             
+            # Probed route (with its total) downloaded by _routes once all routes are analyzed
             data, _route =  cls()._response(cls.base_url + route_path, {**(cls.base_params), **(cls._route_params(_route)), **(params)}, dict(_route))
-            
-            inst =  cls(cls.base_url, cls.base_params, _route)                    
-            inst._raw_to_csv()  
-            return data, None
+            return data, _route
         else:
             return None, _route
-        
+
+    # Override method: info routes are needed by the indicator groups
+    @classmethod
+    def _route_prefetch(cls, _route):
+        return bool(_route.get('info'))
+
     # Override method
     def _response_data(self, response, route = None): 
         #print(f'response.url : {response.url}')      
@@ -143,7 +182,80 @@ class Wb_Api(raw.Api):
         
     # Override method
     def _raw_df(self):
-        return self._pages_df()    
+        return self._pages_df()
+    
+    # Override method
+    def _raw_pages(self):
+        if self.bulk and not self.offline and self._indicator():
+            try:
+                bulk_df = self._bulk_df()
+                if bulk_df is not None and not bulk_df.empty:
+                    yield bulk_df
+                    return
+            except Exception as e:
+                print(f'[WARNING] Bulk download failed, falling back to json pages: {e}')
+        yield from self._pages()
+    
+    # Indicator id of an indicator data route (/country/all/indicator/<id>)
+    def _indicator(self):
+        route = (self.route or {}).get('route') or ''
+        if '/indicator/' not in route:
+            return None
+        return route.rsplit('/', 1)[-1]
+    
+    # Bulk indicator archive to the json pages raw schema
+    def _bulk_df(self):
+        indicator = self._indicator()
+        print(f'... Bulk download: {indicator}')
+        zip_filename = self._bulk_zip(indicator)
+        if zip_filename is None:
+            return None
+        try:
+            df = worldbank.read_indicator_zip(zip_filename)
+        except zipfile.BadZipFile:
+            # not kept: downloaded again (not revalidated) next time
+            os.remove(zip_filename)
+            raise
+        
+        countries_iso2 = self._countries_iso2()
+        bulk_df = pd.DataFrame({
+            'indicator.id': df['indicator_code'],
+            'indicator.value': df['indicator_name'],
+            'country.id': df['country_code'].map(countries_iso2),
+            'country.value': df['country_name'],
+            'countryiso3code': df['country_code'],
+            'date': df['year'],
+            'value': df['value'],
+            'unit': '',
+            'obs_status': '',
+            'decimal': pd.NA,
+        })
+        # Same columns and dtypes as the decoded json pages
+        return bulk_df.astype(self.fields)
+       
+    # Bulk archive of an indicator, kept between runs: downloaded only if modified (conditional request with
+    # the cached ETag/Last-Modified), as the other source requests under the rate limit
+    def _bulk_zip(self, indicator):
+        url = worldbank.indicator_csv_url(indicator)
+        zip_filename = raw.data_cache + 'wb/bulk/' + indicator + '.zip'
+        cache = self._cache()
+        key = cache.key(url)
+        entry = cache.get(key) if os.path.exists(zip_filename) else None
+        if entry is not None and cache.is_fresh(entry, self._cache_ttl()):
+            return zip_filename
+        
+        os.makedirs(os.path.dirname(zip_filename), exist_ok=True)
+        self._limiter().acquire()
+        response = download.download_file_with_retry(url, zip_filename, session=self._session(), timeout=self.timeout,
+                                                     headers=cache.validators(entry))
+        if response is None:
+            return None
+        if response.status_code == 304:
+            cache.revalidated(key)
+        else:
+            # Validators only, the body is the archive itself
+            cache.put(key, url, None, response.headers)
+        return zip_filename
        
 #----------------------------------------------------------------
 def main(raw, test):
@@ -0,0 +1,43 @@
+import time
+import unittest
+from sdp_data.utils.concurrency import ordered_map
+
+
+class TestOrderedMap(unittest.TestCase):
+
+    def test_results_in_input_order(self):
+        """
+        Test that results come back in input order even when later calls finish first.
+        :return:
+        """
+        # given calls finishing in reverse order
+        def slow_first(i):
+            time.sleep(0.02 * (5 - i))
+            return i * 10
+
+        # when mapping them concurrently
+        results = list(ordered_map(slow_first, range(5), max_workers=3))
+
+        # expect input order
+        self.assertEqual(results, [0, 10, 20, 30, 40])
+
+    def test_close_stops_pending_calls(self):
+        """
+        Test that closing the generator early does not run every remaining call.
+        :return:
+        """
+        # given a long list of items
+        called = []
+
+        def record(i):
+            called.append(i)
+            return i
+
+        # when only the first result is consumed
+        results = ordered_map(record, range(100), max_workers=2)
+        first = next(results)
+        results.close()
+
+        # expect the first item and only a few started calls
+        self.assertEqual(first, 0)
+        self.assertLess(len(called), 100)
@@ -0,0 +1,160 @@
+import os
+import tempfile
+import functools
+import unittest
+import pandas as pd
+from sdp_data.utils.dag import Stage, Dag
+from sdp_data.utils.stage_cache import StageCache
+
+
+def country():
+    return ['FRA', 'DEU']
+
+
+def population(countries):
+    return {country: os.getpid() for country in countries}
+
+
+def emissions(countries):
+    return {country: 1.0 for country in countries}, os.getpid()
+
+
+def per_capita(population, emissions):
+    return sorted(set(population) & set(emissions))
+
+
+def failing(countries):
+    raise ValueError('no data')
+
+
+STAGES = [
+    Stage('country', country, outputs=['COUNTRY']),
+    Stage('population', population, ['COUNTRY'], ['POPULATION']),
+    Stage('emissions', emissions, ['COUNTRY'], ['EMISSIONS', 'EMISSIONS_PID']),
+    Stage('per_capita', per_capita, ['POPULATION', 'EMISSIONS'], ['PER_CAPITA']),
+]
+
+
+class TestDag(unittest.TestCase):
+
+    def test_target_upstream_stages(self):
+        """
+        Test that a target runs only its upstream stages, and that it returns its datasets only.
+        :return:
+        """
+        # given stages with a shared input
+        dag = Dag(STAGES)
+
+        # when running one target in this process
+        datasets, summary = dag.run(['POPULATION'], max_workers=1)
+
+        # expect the country and population stages only
+        self.assertEqual([result['stage'] for result in summary], ['country', 'population'])
+        self.assertEqual(list(datasets), ['POPULATION'])
+        self.assertEqual(datasets['POPULATION'], {'FRA': os.getpid(), 'DEU': os.getpid()})
+
+    def test_parallel_and_failed_stages(self):
+        """
+        Test that stages run in worker processes, and that a failed stage only skips its dependents.
+        :return:
+        """
+        # given a pipeline with a failing stage and its dependent
+        dag = Dag(STAGES + [Stage('energy', failing, ['COUNTRY'], ['ENERGY']),
+                            Stage('energy_per_capita', per_capita, ['POPULATION', 'ENERGY'], ['ENERGY_PER_CAPITA'])])
+
+        # when running all the targets in a process pool
+        datasets, summary = dag.run(['PER_CAPITA', 'EMISSIONS_PID', 'ENERGY_PER_CAPITA'], max_workers=2)
+
+        # expect results computed in worker processes, dependents of the failed stage skipped
+        status = {result['stage']: result['status'] for result in summary}
+        self.assertEqual(datasets['PER_CAPITA'], ['DEU', 'FRA'])
+        self.assertNotEqual(datasets['EMISSIONS_PID'], os.getpid())
+        self.assertEqual(status['energy'], 'failed')
+        self.assertEqual(status['energy_per_capita'], 'skipped')
+        self.assertEqual(status['per_capita'], 'ok')
+
+    def test_invalid_stages(self):
+        """
+        Test that missing inputs, datasets produced twice and cycles are refused.
+        :return:
+        """
+        # expect
+        with self.assertRaises(ValueError):
+            Dag([Stage('population', population, ['COUNTRY'], ['POPULATION'])])
+        with self.assertRaises(ValueError):
+            Dag(STAGES + [Stage('country_bis', country, outputs=['COUNTRY'])])
+        with self.assertRaises(ValueError):
+            Dag([Stage('a', population, ['B'], ['A']), Stage('b', population, ['A'], ['B'])])
+
+
+def ghg(countries):
+    return pd.DataFrame({'country': countries, 'ghg': [1.5, 2.5], 'pid': os.getpid()})
+
+
+def ghg_per_capita(df_ghg):
+    return df_ghg.assign(ghg_per_capita=df_ghg['ghg'] / 10)
+
+
+def ghg_export(path, countries):
+    df = ghg(countries)
+    df.to_csv(path, index=False)
+    return df
+
+
+class TestDagCache(unittest.TestCase):
+
+    def test_cached_stages(self):
+        """
+        Test that unchanged stages read their outputs from the cache, and that params or force run them again.
+        :return:
+        """
+        # given cached stages and a first run
+        cache = StageCache(tempfile.mkdtemp())
+        stages = [Stage('country', country, outputs=['COUNTRY'], cached=False),
+                  Stage('ghg', ghg, ['COUNTRY'], ['GHG'], params={'year_min': 1990}),
+                  Stage('ghg_per_capita', ghg_per_capita, ['GHG'], ['GHG_PER_CAPITA'])]
+        datasets, summary = Dag(stages).run(['GHG_PER_CAPITA'], max_workers=2, cache=cache)
+
+        # when running again, with another parameter, then forced
+        cached_datasets, cached_summary = Dag(stages).run(['GHG_PER_CAPITA'], max_workers=2, cache=cache)
+        stages[1].params = {'year_min': 2000}
+        _, params_summary = Dag(stages).run(['GHG_PER_CAPITA'], max_workers=1, cache=cache)
+        _, forced_summary = Dag(stages).run(['GHG_PER_CAPITA'], max_workers=1, cache=cache, force=True)
+
+        # expect the same outputs from the cache, stages run again after a change or forced
+        status = lambda summary: [result['status'] for result in summary]
+        self.assertEqual(status(summary), ['ok', 'ok', 'ok'])
+        self.assertEqual(status(cached_summary), ['ok', 'cached', 'cached'])
+        pd.testing.assert_frame_equal(cached_datasets['GHG_PER_CAPITA'], datasets['GHG_PER_CAPITA'])
+        self.assertEqual(status(params_summary), ['ok', 'ok', 'ok'])
+        self.assertEqual(status(forced_summary), ['ok', 'ok', 'ok'])
+
+    def test_cached_stage_exports(self):
+        """
+        Test that the files exported by a cached stage are written again when deleted or edited.
+        :return:
+        """
+        # given a stage exporting a csv, run once
+        path = tempfile.mkdtemp()
+        export = os.path.join(path, 'GHG_prod.csv')
+        cache = StageCache(os.path.join(path, 'cache'))
+        stages = [Stage('country', country, outputs=['COUNTRY'], cached=False),
+                  Stage('ghg', functools.partial(ghg_export, export), ['COUNTRY'], ['GHG'], exports=[export])]
+        Dag(stages).run(max_workers=1, cache=cache)
+        with open(export) as file:
+            exported = file.read()
+
+        # when the export is deleted, then edited
+        os.remove(export)
+        _, deleted_summary = Dag(stages).run(max_workers=1, cache=cache)
+        with open(export) as file:
+            restored = file.read()
+        with open(export, 'w') as file:
+            file.write('country,ghg\nFRA,0\n')
+        Dag(stages).run(max_workers=1, cache=cache)
+
+        # expect the cached export back, without running the stage
+        self.assertEqual(deleted_summary[-1]['status'], 'cached')
+        self.assertEqual(restored, exported)
+        with open(export) as file:
+            self.assertEqual(file.read(), exported)
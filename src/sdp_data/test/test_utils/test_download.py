@@ -0,0 +1,73 @@
+import os
+import hashlib
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from sdp_data.utils.download import download_file_with_retry
+
+CONTENT = b'Area,Year,Value\n' + b'France,2022,1.5\n' * 5000
+
+
+class FlakyRangeHandler(BaseHTTPRequestHandler):
+    """
+    Drops the connection halfway through the first download, then serves byte ranges.
+    """
+    requests_headers = []
+
+    def do_GET(self):
+        FlakyRangeHandler.requests_headers.append(dict(self.headers))
+        range_header = self.headers.get('Range')
+        if range_header:
+            start = int(range_header.split('=')[1].split('-')[0])
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{len(CONTENT) - 1}/{len(CONTENT)}')
+            self.send_header('Content-Length', str(len(CONTENT) - start))
+            self.send_header('ETag', '"v1"')
+            self.end_headers()
+            self.wfile.write(CONTENT[start:])
+        else:
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(CONTENT)))
+            self.send_header('ETag', '"v1"')
+            self.end_headers()
+            self.wfile.write(CONTENT[:len(CONTENT) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestDownloadFileWithRetry(unittest.TestCase):
+
+    def setUp(self):
+        FlakyRangeHandler.requests_headers = []
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FlakyRangeHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}/release_long_format.csv'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_resume_after_dropped_connection(self):
+        """
+        Test that a dropped download resumes with a Range request and is verified.
+        :return:
+        """
+        # given a server dropping the first download halfway
+        file_path = os.path.join(tempfile.mkdtemp(), 'release_long_format.csv')
+
+        # when downloading with retries
+        response = download_file_with_retry(self.url, file_path, max_retries=3, retry_delay=0, timeout=5, chunk_size=1024,
+                                            sha256=hashlib.sha256(CONTENT).hexdigest())
+
+        # expect the complete file, resumed from the received bytes
+        self.assertIsNotNone(response)
+        with open(file_path, 'rb') as file:
+            self.assertEqual(file.read(), CONTENT)
+        self.assertTrue(FlakyRangeHandler.requests_headers[1]['Range'].startswith('bytes='))
+        self.assertEqual(FlakyRangeHandler.requests_headers[1]['If-Range'], '"v1"')
+        self.assertFalse(os.path.exists(file_path + '.part'))
+
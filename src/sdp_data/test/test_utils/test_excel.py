@@ -0,0 +1,57 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+import sdp_data.utils.excel as excel
+
+
+class TestReadExcel(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.workbook = os.path.join(self.path, 'ghg.xlsx')
+        df = pd.DataFrame({'country': ['France', None, 'Germany'], 'gas': ['CH4', 'N2O', 'CO2'],
+                           1990: [1.5, np.nan, 2.0], 1991: [1, 2, 3]})
+        with pd.ExcelWriter(self.workbook) as writer:
+            df.to_excel(writer, sheet_name='data', index=False)
+            df.assign(unit=['Mt', 0.001, None]).to_excel(writer, sheet_name='mixed', index=False)
+
+    def test_same_as_read_excel(self):
+        """
+        Test that sheets parsed then served from the sidecars are the ones read by pd.read_excel.
+        :return:
+        """
+        # given
+        expected = pd.read_excel(self.workbook, sheet_name=None)
+
+        # when reading twice, the second time from the sidecars only
+        with mock.patch.object(excel, 'cache_path', os.path.join(self.path, 'cache')):
+            parsed = excel.read_excel(self.workbook, sheet_name=None)
+            with mock.patch.object(pd.ExcelFile, 'parse', side_effect=AssertionError('workbook parsed again')):
+                cached = excel.read_excel(self.workbook, sheet_name=['data', 'mixed'])
+                first_sheet = excel.read_excel(self.workbook)
+
+        # expect same values, column names (years as int) and types
+        for sheet in ['data', 'mixed']:
+            pd.testing.assert_frame_equal(parsed[sheet], expected[sheet])
+            pd.testing.assert_frame_equal(cached[sheet], expected[sheet])
+        pd.testing.assert_frame_equal(first_sheet, expected['data'])
+        self.assertEqual([type(value) for value in cached['mixed']['unit']], [str, float, float])
+
+    def test_workbook_changed(self):
+        """
+        Test that the sidecars are not used anymore once the workbook content changed.
+        :return:
+        """
+        # given sidecars of the workbook
+        with mock.patch.object(excel, 'cache_path', os.path.join(self.path, 'cache')):
+            excel.read_excel(self.workbook, sheet_name='data')
+
+            # when the workbook is written again
+            pd.DataFrame({'country': ['Spain']}).to_excel(self.workbook, sheet_name='data', index=False)
+            df = excel.read_excel(self.workbook, sheet_name='data')
+
+        # expect
+        self.assertEqual(df['country'].tolist(), ['Spain'])
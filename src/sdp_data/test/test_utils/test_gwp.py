@@ -0,0 +1,37 @@
+import unittest
+import pandas as pd
+from sdp_data.utils.gwp import GwpTable
+
+
+class TestGwpTable(unittest.TestCase):
+
+    def test_to_co2eq_per_set(self):
+        """
+        Test that emissions are converted with the GWP of the selected set, aliases and extra gases included.
+        :return:
+        """
+        # given emissions by gas and by PIK unit
+        ghg = pd.Series([2.0, 1.0, 1.0, 3.0])
+        gas = pd.Series(['CO2', 'CH4', 'N2O', 'F-Gas']).astype('category')
+        unit = pd.Series(['CO2 * gigagram / a', 'CH4 * gigagram / a', 'N2O * gigagram / a', 'CO2 * gigagram / a'])
+        aliases = {'CO2 * gigagram / a': 'CO2', 'CH4 * gigagram / a': 'CH4', 'N2O * gigagram / a': 'N2O'}
+
+        # when
+        ar4 = GwpTable('AR4', gases={'F-Gas': 1}).to_co2eq(ghg, gas)
+        ar6_ch4_ar5 = GwpTable('AR6_CH4_AR5').to_co2eq(ghg, unit, aliases=aliases)
+
+        # expect
+        self.assertEqual(ar4.tolist(), [2.0, 25.0, 298.0, 3.0])
+        self.assertEqual(ar6_ch4_ar5.tolist(), [2.0, 28.0, 273.0, 3.0])
+
+    def test_unknown_gases(self):
+        """
+        Test that all the unknown gases are reported at once, and unknown sets refused.
+        :return:
+        """
+        # expect
+        with self.assertRaises(ValueError) as context:
+            GwpTable('AR5').to_co2eq(pd.Series([1.0, 1.0, 1.0]), pd.Series(['CH4', 'HFC', 'PFC']))
+        self.assertIn("'HFC', 'PFC'", str(context.exception))
+        with self.assertRaises(ValueError):
+            GwpTable('AR7')
@@ -0,0 +1,81 @@
+import time
+import tempfile
+import unittest
+from sdp_data.utils.http_cache import ResponseCache
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_cached_response_and_validators(self):
+        """
+        Test that a stored body is served back with its validators.
+        :return:
+        """
+        # given a cached response with an ETag
+        cache = ResponseCache(tempfile.mkdtemp())
+        key = cache.key('https://api.test.org/regions', {'format': 'json'})
+        cache.put(key, 'https://api.test.org/regions', b'[1, 2]', {'ETag': '"abc"', 'Content-Type': 'application/json'})
+
+        # when reading it back
+        entry = cache.get(key)
+        response = cache.response(key, 'https://api.test.org/regions', entry)
+
+        # expect the body and a conditional request header
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [1, 2])
+        self.assertEqual(cache.validators(entry), {'If-None-Match': '"abc"'})
+
+    def test_least_recently_used_eviction(self):
+        """
+        Test that the least recently used entry is evicted when the cache is full.
+        :return:
+        """
+        # given a cache holding two 4 bytes entries out of 10
+        cache = ResponseCache(tempfile.mkdtemp(), max_size=10)
+        cache.put('a', 'url_a', b'aaaa', {})
+        time.sleep(0.01)
+        cache.put('b', 'url_b', b'bbbb', {})
+        time.sleep(0.01)
+        cache.get('a')
+
+        # when a third entry is stored
+        cache.put('c', 'url_c', b'cccc', {})
+
+        # expect 'b' (least recently used) to be evicted
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+
+    def test_offline_miss(self):
+        """
+        Test that a missing entry is answered as not cached.
+        :return:
+        """
+        # given an empty cache
+        cache = ResponseCache(tempfile.mkdtemp())
+
+        # when asking for a response
+        response = cache.response(cache.key('https://api.test.org/none'), 'https://api.test.org/none')
+
+        # expect a 504 (only-if-cached semantics)
+        self.assertEqual(response.status_code, 504)
+
+    def test_index_written_on_flush(self):
+        """
+        Test that the index is written once on flush, not on every request.
+        :return:
+        """
+        # given a cache with two stored responses
+        path = tempfile.mkdtemp()
+        cache = ResponseCache(path)
+        cache.put('a', 'url_a', b'aaaa', {})
+        cache.put('b', 'url_b', b'bbbb', {'ETag': '"b"'})
+
+        # when flushing
+        self.assertIsNone(ResponseCache(path).get('a'))
+        cache.flush()
+
+        # expect the entries in a new cache of the same folder
+        reopened = ResponseCache(path)
+        self.assertIsNotNone(reopened.get('a'))
+        self.assertEqual(reopened.get('b')['etag'], '"b"')
@@ -0,0 +1,74 @@
+import json
+import unittest
+from sdp_data.utils.json_stream import iter_array, RecordsDecoder
+
+EIA_RESPONSE = {'response': {'total': 3, 'warnings': [{'warning': 'Incomplete return'}],
+                             'data': [{'period': '2020', 'countryRegionId': 'FRA', 'value': 1.5},
+                                      {'period': '2021', 'countryRegionId': 'DEU', 'value': 12345678901},
+                                      {'period': '2022', 'countryRegionId': 'ITA', 'value': None}]}}
+WB_RESPONSE = [{'page': 1, 'pages': 1}, [{'country': {'id': 'FR', 'value': 'Côte'}, 'date': '2022', 'value': 3}]]
+
+
+# Document bytes in chunks of size bytes (values and utf-8 characters split across chunks)
+def chunks(document, size):
+    data = json.dumps(document, ensure_ascii=False).encode('utf-8')
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestJsonStream(unittest.TestCase):
+
+    def test_nested_array_across_chunks(self):
+        """
+        Test that the nested array records are parsed whatever the chunk boundaries.
+        :return:
+        """
+        # given the EIA response split in chunks of 1 to 16 bytes
+        for size in (1, 3, 16):
+            # when iterating over response.data
+            records = list(iter_array(chunks(EIA_RESPONSE, size), ['response', 'data']))
+
+            # expect the same records as a full json load
+            self.assertEqual(records, EIA_RESPONSE['response']['data'])
+
+    def test_records_decoded_while_parsed(self):
+        """
+        Test that the records of an array are decoded to the declared fields, a missing array reported.
+        :return:
+        """
+        # given the World Bank response (page metadata then records) and a decoder of three fields
+        decoder = RecordsDecoder({'country.id': 'string', 'country.value': 'string', 'value': 'float64'})
+
+        # when decoding the records of the second element
+        df = decoder.decode(iter_array(chunks(WB_RESPONSE, 5), [1]))
+
+        # expect flattened columns, and a KeyError for an error message without records
+        self.assertEqual(df.columns.tolist(), ['country.id', 'country.value', 'value'])
+        self.assertEqual(df.iloc[0].tolist(), ['FR', 'Côte', 3.0])
+        with self.assertRaises(KeyError):
+            list(iter_array(chunks([{'message': [{'id': '120'}]}], 4), [1]))
+
+    def test_decoder_typed_columns(self):
+        """
+        Test that pages get the declared typed columns and unknown fields are reported once.
+        :return:
+        """
+        # given a decoder of three EIA fields
+        unknown_fields = []
+        decoder = RecordsDecoder({'period': 'string', 'countryRegionId': 'string', 'value': 'float64'},
+                                 unknown_fields.append)
+
+        # when decoding two pages, the second one without a field and with a non numeric value
+        page_1 = decoder.decode(EIA_RESPONSE['response']['data'])
+        page_2 = decoder.decode([{'period': '2023', 'value': '--'}])
+
+        # expect the same columns and dtypes, the unknown field reported once
+        self.assertEqual(page_1.dtypes.tolist(), page_2.dtypes.tolist())
+        self.assertEqual(page_1['value'].tolist()[:2], [1.5, 12345678901])
+        self.assertTrue(page_2['value'].isna().all())
+        self.assertEqual(decoder.pop_coerced(), {'value': (1, ['--'])})
+        self.assertEqual(decoder.pop_coerced(), {})
+        self.assertTrue(page_2['countryRegionId'].isna().all())
+        self.assertEqual(unknown_fields, [])
+        decoder.decode([{'period': '2023', 'unitName': 'TWh'}])
+        decoder.decode([{'period': '2024', 'unitName': 'TWh'}])
+        self.assertEqual(unknown_fields, [['unitName']])
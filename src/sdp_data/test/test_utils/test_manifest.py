@@ -0,0 +1,42 @@
+import os
+import tempfile
+import unittest
+import sdp_data.utils.manifest as manifest
+
+
+class TestManifest(unittest.TestCase):
+
+    def test_changed_since_run(self):
+        """
+        Test that only a content change moves the change run of a raw file.
+        :return:
+        """
+        # given a raw file written by a first run, then rewritten unchanged by a second run
+        data_path = tempfile.mkdtemp()
+        os.makedirs(os.path.join(data_path, 'ember'))
+        file_path = os.path.join(data_path, 'ember', 'ember_file_elec_all_year.csv')
+        with open(file_path, 'w') as file:
+            file.write('Area,Year,Value\nFrance,2022,1.5\n')
+        manifest.run_id = '2024-01-01T00:00:00'
+        manifest.update(file_path, etag='"v1"')
+        manifest.run_id = '2024-02-01T00:00:00'
+        entry = manifest.update(file_path)
+
+        # when checking changes since the first run
+        changed = manifest.changed_since('ember_file_elec_all_year', '2024-01-01T00:00:00', data_path)
+
+        # expect no change, the file stats and etag recorded
+        self.assertFalse(changed)
+        self.assertEqual(entry['rows'], 1)
+        self.assertEqual(entry['columns'], ['Area', 'Year', 'Value'])
+        self.assertEqual(entry['etag'], '"v1"')
+
+        # when a third run changes the content
+        with open(file_path, 'a') as file:
+            file.write('Germany,2022,2.5\n')
+        manifest.run_id = '2024-03-01T00:00:00'
+        manifest.update(file_path)
+
+        # expect a change since the second run, unknown files always changed
+        self.assertTrue(manifest.changed_since('ember_file_elec_all_year', '2024-02-01T00:00:00', data_path))
+        self.assertTrue(manifest.changed_since('bp_file_energy_review_world', '2024-02-01T00:00:00', data_path))
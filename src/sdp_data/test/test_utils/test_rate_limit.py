@@ -0,0 +1,40 @@
+import time
+import unittest
+import requests
+from sdp_data.utils.rate_limit import TokenBucket, backoff_delay, retry_after
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_rate_after_burst(self):
+        """
+        Test that requests beyond the burst are spaced by the rate.
+        :return:
+        """
+        # given a bucket of 20 requests per second with a burst of 2
+        bucket = TokenBucket(rate=20, burst=2)
+
+        # when acquiring 6 tokens
+        start = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        elapsed = time.monotonic() - start
+
+        # expect about 4 / 20 seconds of waiting
+        self.assertGreaterEqual(elapsed, 0.15)
+
+    def test_backoff_and_retry_after(self):
+        """
+        Test the backoff bounds and the Retry-After parsing.
+        :return:
+        """
+        # given a rate limited response
+        response = requests.Response()
+        response.headers['Retry-After'] = '7'
+
+        # when computing the delays
+        delays = [backoff_delay(3, base=1, cap=5) for _ in range(50)]
+
+        # expect jittered delays under the cap and the server delay
+        self.assertTrue(all(0 <= delay <= 5 for delay in delays))
+        self.assertEqual(retry_after(response), 7.0)
@@ -0,0 +1,251 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+import zipfile
+import requests
+import pandas as pd
+
+# raw sources import the utils modules as top level modules (run from src/sdp_data)
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+import raw
+import sources.raw_wb as raw_wb
+
+
+class TestRaw(unittest.TestCase):
+
+    def setUp(self):
+        self.data_raw, self.data_cache = raw.data_raw, raw.data_cache
+        raw.data_raw = tempfile.mkdtemp() + '/'
+        raw.data_cache = tempfile.mkdtemp() + '/'
+
+    def tearDown(self):
+        raw.data_raw, raw.data_cache = self.data_raw, self.data_cache
+
+    def test_raw_without_route(self):
+        """
+        Test that a route that could not be probed (no route) is reported, not raised.
+        :return:
+        """
+        # given an api instance without route (ex: failed info route probe)
+        inst = raw.Api('https://api.test.org', {})
+
+        # when writing its raw file
+        inst._raw_to_csv()
+
+        # expect no raw file
+        self.assertEqual(os.listdir(os.path.join(raw.data_raw, 'api')), [])
+
+    def test_raw_csv_export(self):
+        """
+        Test that a parquet raw file is also exported as csv (raw csv read by the notebooks).
+        :return:
+        """
+        # given an api route with one page
+        class Test_Api(raw.Api):
+            fields = {'period': 'string', 'value': 'float64'}
+
+            def _raw_pages(self):
+                yield pd.DataFrame({'period': ['2022', '2023'], 'value': [1.5, None]}).astype(self.fields)
+        inst = Test_Api('https://api.test.org', {}, {'route': '/data'})
+
+        # when writing its raw file
+        inst._raw_to_csv()
+
+        # expect the parquet file and its csv copy
+        pd.testing.assert_frame_equal(pd.read_csv(inst._csv_full_name(True), dtype={'period': str}),
+                                      pd.read_parquet(inst._raw_full_name(True)), check_dtype=False)
+
+    def test_page_records_decoded_while_parsed(self):
+        """
+        Test that api page records are decoded to the declared fields and that error bodies are still raised.
+        :return:
+        """
+        # given an api with declared fields and the records path of its pages
+        class Test_Api(raw.Api):
+            fields = {'period': 'string', 'value': 'float64'}
+            page_path = ['response', 'data']
+            page_chunk_size = 7
+        inst = Test_Api('https://api.test.org', {}, {'route': '/data'})
+
+        # when decoding a data page and an error body
+        df, _ = inst._page_records(response(b'{"response": {"total": 3, "data": [{"period": "2022", "value": 1.5},'
+                                            b' {"period": "2023", "value": null}, {"period": "2024", "value": "W"}]}}'),
+                                   dict(inst.route))
+
+        # expect typed columns, the non numeric value counted for the route, and the api error
+        self.assertEqual(df['period'].tolist(), ['2022', '2023', '2024'])
+        self.assertEqual(df['value'].dtype, 'float64')
+        self.assertEqual(df['value'].isna().tolist(), [False, True, True])
+        self.assertEqual(inst._decoder().pop_coerced('/data'), {'value': (1, ['W'])})
+        with self.assertRaises(raw.PermanentError):
+            inst._page_records(response(b'{"error": "invalid api_key"}'))
+
+    def test_pages_streamed_and_cached(self):
+        """
+        Test that a page is decoded while downloaded, its body cached to the end and streamed from the cache.
+        :return:
+        """
+        # given an api with declared fields answering one streamed page, cached for an hour
+        body = (b'{"response": {"total": 2, "data": [{"period": "2022", "value": 1.5}, {"period": "2023", "value": 2}]},'
+                b' "apiVersion": "2.1"}')
+        requests_kwargs = []
+
+        class Session:
+            def get(self, url, **kwargs):
+                requests_kwargs.append(kwargs)
+                return streamed(body)
+
+        class Test_Api(raw.Api):
+            fields = {'period': 'string', 'value': 'float64'}
+            page_path = ['response', 'data']
+            page_chunk_size = 7
+
+            @classmethod
+            def _session(cls):
+                return Session()
+        inst = Test_Api('https://api.test.org', {}, {'route': '/data', 'total': 2, 'cache_ttl': 3600})
+
+        # when fetching the page twice
+        df = inst._page_df(0)
+        page_url = inst._get_url(dict(inst.route, route_params=inst._page_params(0)))
+        entry = Test_Api._cache().get(Test_Api._cache().key(page_url))
+        cached_df = inst._page_df(0)
+
+        # expect one streamed request, the whole body cached, the same page from the cache
+        self.assertEqual([kwargs['stream'] for kwargs in requests_kwargs], [True])
+        self.assertEqual(df['value'].tolist(), [1.5, 2.0])
+        self.assertEqual(entry['size'], len(body))
+        pd.testing.assert_frame_equal(cached_df, df)
+
+    def test_incremental_merges_keep_types(self):
+        """
+        Test that successive incremental merges keep the declared dtypes and the nulls of the raw file.
+        :return:
+        """
+        # given a stored raw file and an incremental route of an api with declared fields
+        class Test_Api(raw.Api):
+            fields = {'period': 'string', 'id': 'string', 'value': 'float64'}
+        inst = Test_Api('https://api.test.org', {}, {'route': '/data', 'incremental': True, 'since': '2022',
+                                                     'key': ['period', 'id']})
+        raw_filename = inst._raw_full_name(True)
+        write(raw_filename, Test_Api.fields, {'period': ['2021', '2022'], 'id': ['a', 'a'], 'value': [None, 1.0]})
+
+        # when merging new periods twice
+        write(raw_filename + '.new', Test_Api.fields, {'period': ['2022', '2023'], 'id': ['a', 'a'], 'value': [2.0, None]})
+        inst._merge_raw(raw_filename + '.new', raw_filename)
+        write(raw_filename + '.new', Test_Api.fields, {'period': ['2023', '2024'], 'id': ['a', 'a'], 'value': [3.0, 4.0]})
+        inst._merge_raw(raw_filename + '.new', raw_filename)
+
+        # expect numeric values, and nulls still null
+        df = pd.read_parquet(raw_filename).sort_values('period')
+        self.assertEqual(df['value'].dtype, 'float64')
+        self.assertEqual(df['period'].tolist(), ['2021', '2022', '2023', '2024'])
+        self.assertTrue(pd.isna(df['value'].iloc[0]))
+        self.assertEqual(df['value'].tolist()[1:], [2.0, 3.0, 4.0])
+
+    def test_error_body_not_cached(self):
+        """
+        Test that an error body sent with a 200 (World Bank message) is not cached, a data page is.
+        :return:
+        """
+        # given a World Bank api answering an error message, then a data page
+        bodies = [b'[{"message": [{"id": "120", "value": "Invalid value"}]}]',
+                  b'[{"page": 1, "pages": 1, "total": 1}, [{"id": "EAS"}]]']
+
+        class Session:
+            def get(self, url, **kwargs):
+                return response(bodies.pop(0))
+
+        class Test_Api(raw_wb.Wb_Api):
+            max_retries = 1
+
+            @classmethod
+            def _session(cls):
+                return Session()
+        url = Test_Api.base_url + '/regions?format=json'
+        key = Test_Api._cache().key(url)
+
+        # when requesting the route twice
+        error_data, _ = Test_Api()._response(url, None, {'route': '/regions', 'info': True})
+        error_entry = Test_Api._cache().get(key)
+        data, _ = Test_Api()._response(url, None, {'route': '/regions', 'info': True})
+
+        # expect only the data page cached
+        self.assertIsNone(error_data)
+        self.assertIsNone(error_entry)
+        self.assertIsNotNone(data)
+        self.assertIsNotNone(Test_Api._cache().get(key))
+
+    def test_bulk_archive_revalidated(self):
+        """
+        Test that a World Bank bulk archive is kept and revalidated, each download taking a rate limit token.
+        :return:
+        """
+        # given a bulk archive with an ETag, then not modified
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zip_file:
+            zip_file.writestr('API_SP.POP.TOTL_DS2_en_csv_v2.csv',
+                              '\n\n\n\n"Country Name","Country Code","Indicator Name","Indicator Code","2022",\n'
+                              '"France","FRA","Population, total","SP.POP.TOTL","68082000",\n')
+        requests_headers = []
+
+        class Session:
+            def get(self, url, headers=None, **kwargs):
+                requests_headers.append(headers)
+                if 'If-None-Match' in headers:
+                    return streamed(b'', 304)
+                response = streamed(archive.getvalue())
+                response.headers['ETag'] = '"v1"'
+                return response
+
+        class Limiter:
+            tokens = 0
+
+            def acquire(self):
+                Limiter.tokens += 1
+
+        class Test_Api(raw_wb.Wb_Api):
+            _iso2 = pd.Series({'FRA': 'FR'})
+
+            @classmethod
+            def _session(cls):
+                return Session()
+
+            @classmethod
+            def _limiter(cls):
+                return Limiter()
+        inst = Test_Api(Test_Api.base_url, Test_Api.base_params, {'route': '/country/all/indicator/SP.POP.TOTL'})
+
+        # when reading the indicator twice
+        df = inst._bulk_df()
+        revalidated_df = inst._bulk_df()
+
+        # expect a conditional request the second time, and the same data from the kept archive
+        self.assertEqual(Limiter.tokens, 2)
+        self.assertNotIn('If-None-Match', requests_headers[0])
+        self.assertEqual(requests_headers[1]['If-None-Match'], '"v1"')
+        self.assertEqual(df[['country.id', 'date', 'value']].values.tolist(), [['FR', '2022', 68082000.0]])
+        pd.testing.assert_frame_equal(revalidated_df, df)
+
+
+def write(path, fields, data):
+    with raw.sink.new_sink(path, 'parquet', fields) as raw_sink:
+        raw_sink.write(pd.DataFrame(data).astype(fields))
+
+
+# Response read from its raw stream (stream=True)
+def streamed(body, status_code=200):
+    response = requests.Response()
+    response.status_code = status_code
+    response.raw = io.BytesIO(body)
+    return response
+
+
+def response(body):
+    response = requests.Response()
+    response.status_code = 200
+    response._content = body
+    response._content_consumed = True
+    return response
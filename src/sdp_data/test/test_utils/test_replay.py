@@ -0,0 +1,87 @@
+import tempfile
+import threading
+import unittest
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from sdp_data.utils.replay import FixtureStore, RecordAdapter, ReplayAdapter, mount
+
+BODY = b'{"response": {"total": 2, "data": [{"period": "2022"}, {"period": "2023"}]}}'
+
+
+class JsonHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestRecordReplay(unittest.TestCase):
+
+    def test_replay_without_server(self):
+        """
+        Test that a recorded response is replayed once the server is gone, api key ignored.
+        :return:
+        """
+        # given a response recorded from a local server
+        server = ThreadingHTTPServer(('127.0.0.1', 0), JsonHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_port}/v2/international/data?length=2&offset=0'
+        path = tempfile.mkdtemp()
+        mount(requests.Session(), RecordAdapter(FixtureStore(path))).get(url + '&api_key=secret')
+        server.shutdown()
+        server.server_close()
+
+        # when replaying it (with another api key) and an unknown request
+        adapter = ReplayAdapter(FixtureStore(path))
+        session = mount(requests.Session(), adapter)
+        response = session.get(url + '&api_key=other')
+        missing = session.get(url.replace('offset=0', 'offset=2'))
+
+        # expect the recorded body and a miss
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['response']['total'], 2)
+        self.assertEqual(missing.status_code, 404)
+        self.assertEqual(adapter.misses, 1)
+
+    def test_record_streamed_response(self):
+        """
+        Test that a streamed response is recorded as the caller reads it, once read to the end.
+        :return:
+        """
+        # given a recording session and a local server
+        server = ThreadingHTTPServer(('127.0.0.1', 0), JsonHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_port}/v2/international/data'
+        store = FixtureStore(tempfile.mkdtemp())
+
+        # when streaming the response in chunks
+        response = mount(requests.Session(), RecordAdapter(store)).get(url, stream=True)
+        recorded_before_read = len(store)
+        chunks = list(response.iter_content(16))
+        server.shutdown()
+        server.server_close()
+
+        # expect the body recorded after the last chunk
+        self.assertEqual(recorded_before_read, 0)
+        self.assertEqual(b''.join(chunks), BODY)
+        self.assertEqual(store.get('GET', url)[1], BODY)
+
+    def test_injected_errors(self):
+        """
+        Test that injected errors fail requests before the fixtures are read.
+        :return:
+        """
+        # given a replay failing every request
+        session = mount(requests.Session(), ReplayAdapter(FixtureStore(tempfile.mkdtemp()), error_rate=1))
+
+        # when sending a request
+        response = session.get('https://api.eia.gov/v2/international')
+
+        # expect a retryable server error
+        self.assertEqual(response.status_code, 503)
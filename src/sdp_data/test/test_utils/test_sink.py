@@ -0,0 +1,94 @@
+import os
+import tempfile
+import unittest
+import pandas as pd
+from sdp_data.utils.sink import new_sink, PartitionedParquetSink
+
+
+class TestSink(unittest.TestCase):
+
+    def test_csv_pages_appended(self):
+        """
+        Test that pages are appended to a single csv with the first page columns.
+        :return:
+        """
+        # given two pages, the second one with columns in another order
+        path = os.path.join(tempfile.mkdtemp(), 'pages.csv')
+        page_1 = pd.DataFrame({'period': ['2020', '2021'], 'value': [1.0, 2.0]})
+        page_2 = pd.DataFrame({'value': [3.0], 'period': ['2022']})
+
+        # when streaming them to the sink
+        with new_sink(path, 'csv') as sink:
+            sink.write(page_1)
+            sink.write(page_2)
+
+        # expect one csv with all rows
+        df = pd.read_csv(path, dtype={'period': str})
+        self.assertEqual(sink.rows, 3)
+        self.assertEqual(df['period'].tolist(), ['2020', '2021', '2022'])
+        self.assertEqual(df['value'].tolist(), [1.0, 2.0, 3.0])
+
+    def test_failed_run_keeps_previous_file(self):
+        """
+        Test that an exception while streaming keeps the previous file untouched.
+        :return:
+        """
+        # given an existing raw file
+        path = os.path.join(tempfile.mkdtemp(), 'pages.csv')
+        pd.DataFrame({'value': [1]}).to_csv(path, index=False)
+
+        # when the run fails after a first page
+        with self.assertRaises(ValueError):
+            with new_sink(path, 'csv') as sink:
+                sink.write(pd.DataFrame({'value': [2]}))
+                raise ValueError('page failed')
+
+        # expect the previous content and no part file
+        self.assertEqual(pd.read_csv(path)['value'].tolist(), [1])
+        self.assertFalse(os.path.exists(path + '.part'))
+
+    def test_partitioned_chunks_same_schema(self):
+        """
+        Test that chunks with different categories are written to one dataset partitioned by year.
+        :return:
+        """
+        # given two chunks with their own categories
+        path = os.path.join(tempfile.mkdtemp(), 'ember_file_elec_all_month')
+        chunk_1 = pd.DataFrame({'Area': pd.Categorical(['France', 'Germany']), 'Value': [1.0, 2.0], 'year': [2022, 2023]})
+        chunk_2 = pd.DataFrame({'Area': pd.Categorical(['Spain']), 'Value': [3.0], 'year': [2023]})
+
+        # when streaming them to a partitioned sink
+        with PartitionedParquetSink(path, 'year') as sink:
+            sink.write(chunk_1)
+            sink.write(chunk_2)
+
+        # expect one folder per year, a year read alone
+        self.assertEqual(sorted(os.listdir(path)), ['year=2022', 'year=2023'])
+        df = pd.read_parquet(path, filters=[('year', '=', 2023)])
+        self.assertEqual(sorted(df['Area'].astype(str).tolist()), ['Germany', 'Spain'])
+
+    def test_parquet_declared_fields(self):
+        """
+        Test that parquet pages keep the declared dtypes and that a page not fitting them fails.
+        :return:
+        """
+        # given declared fields and two pages, the second one without a value
+        path = os.path.join(tempfile.mkdtemp(), 'pages.parquet')
+        fields = {'date': 'string', 'value': 'float64', 'decimal': 'Int64'}
+        page_1 = pd.DataFrame({'date': ['2021'], 'value': [1.5], 'decimal': pd.array([1], dtype='Int64')})
+        page_2 = pd.DataFrame({'date': ['2022'], 'value': [None], 'decimal': pd.array([None], dtype='Int64')}).astype(fields)
+
+        # when streaming them to a parquet sink
+        with new_sink(path, 'parquet', fields) as sink:
+            sink.write(page_1)
+            sink.write(page_2)
+
+        # expect declared dtypes and nulls, a text value failing the write
+        df = pd.read_parquet(path)
+        self.assertEqual(df['value'].dtype, 'float64')
+        self.assertEqual(df['decimal'].dtype, 'Int64')
+        self.assertEqual(df['decimal'].isna().tolist(), [False, True])
+        with self.assertRaises(Exception):
+            with new_sink(path, 'parquet', fields) as sink:
+                sink.write(pd.DataFrame({'date': ['2023'], 'value': ['n/a'], 'decimal': [1]}))
+        self.assertEqual(len(pd.read_parquet(path)), 2)
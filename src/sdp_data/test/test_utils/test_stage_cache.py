@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import importlib
+import tempfile
+import unittest
+import pandas as pd
+from sdp_data.utils.dag import Stage
+from sdp_data.utils.stage_cache import StageCache, module_files
+
+
+def clean(df):
+    return df
+
+
+class TestStageCache(unittest.TestCase):
+
+    def test_key_files_and_inputs(self):
+        """
+        Test that the key changes with the raw files content and the input keys, not with a touched file.
+        :return:
+        """
+        # given a stage reading a raw file
+        path = tempfile.mkdtemp()
+        file_path = os.path.join(path, 'raw.csv')
+        with open(file_path, 'w') as file:
+            file.write('country,ghg\nFRA,1\n')
+        cache = StageCache(os.path.join(path, 'cache'))
+        stage = Stage('clean', clean, ['RAW'], ['CLEAN'], files=[file_path])
+        key = cache.key(stage, ['a'])
+
+        # when the file is touched, then changed
+        os.utime(file_path, (time.time() + 10, time.time() + 10))
+        touched_key = cache.key(stage, ['a'])
+        with open(file_path, 'w') as file:
+            file.write('country,ghg\nFRA,2\n')
+        changed_key = cache.key(stage, ['a'])
+
+        # expect
+        self.assertEqual(touched_key, key)
+        self.assertNotEqual(changed_key, key)
+        self.assertNotEqual(cache.key(stage, ['b']), key)
+
+    def test_key_modules_code(self):
+        """
+        Test that the key changes with the code of the modules a stage uses under the code root, not with others.
+        :return:
+        """
+        # given a stage whose function uses a helper module of its package
+        path = tempfile.mkdtemp()
+        code_root = os.path.join(path, 'stage_pkg')
+        os.makedirs(code_root)
+        for name, source in [('__init__.py', ''), ('helper.py', 'FACTOR = 1\n'),
+                             ('stages.py', 'from . import helper\n\n\ndef scale(df):\n    return df * helper.FACTOR\n')]:
+            with open(os.path.join(code_root, name), 'w') as file:
+                file.write(source)
+        sys.path.insert(0, path)
+        try:
+            stages = importlib.import_module('stage_pkg.stages')
+        finally:
+            sys.path.remove(path)
+        cache = StageCache(os.path.join(path, 'cache'), code_root=code_root)
+        stage = Stage('scale', stages.scale, ['RAW'], ['SCALED'])
+        key = cache.key(stage, [])
+
+        # when the helper module changes
+        with open(os.path.join(code_root, 'helper.py'), 'w') as file:
+            file.write('FACTOR = 1000\n')
+
+        # expect
+        self.assertEqual(module_files([stages.scale], code_root),
+                         [os.path.join(code_root, 'helper.py'), os.path.join(code_root, 'stages.py')])
+        self.assertNotEqual(cache.key(stage, []), key)
+
+    def test_evict_least_recently_used(self):
+        """
+        Test that the least recently used entries are evicted when the cache is over its max size.
+        :return:
+        """
+        # given a cache holding two entries
+        cache = StageCache(tempfile.mkdtemp())
+        df = pd.DataFrame({'value': range(1000)})
+        for key in ['a', 'b']:
+            cache.put(key, 'stage', StageCache.write(cache.path, key, {'OUT': df}))
+        cache.max_size = cache.size() * 1.2
+        cache._index['a']['accessed_at'] = cache._index['b']['accessed_at'] + 1
+
+        # when a third entry is added
+        cache.put('c', 'stage', StageCache.write(cache.path, 'c', {'OUT': df}))
+
+        # expect the least recently used out
+        self.assertIsNone(cache.get('b', ['OUT']))
+        self.assertFalse(os.path.exists(os.path.join(cache.path, 'b')))
+        self.assertIsNotNone(cache.get('a', ['OUT']))
+        self.assertIsNotNone(cache.get('c', ['OUT']))
@@ -0,0 +1,33 @@
+import os
+import time
+import tempfile
+import unittest
+import pandas as pd
+from sdp_data.utils.stats import output_stats
+
+
+class TestOutputStats(unittest.TestCase):
+
+    def test_files_written_since(self):
+        """
+        Test that only data files written since the run start are counted.
+        :return:
+        """
+        # given an old csv, then a new csv, a new parquet and a log file
+        path = tempfile.mkdtemp()
+        old_filename = os.path.join(path, 'old.csv')
+        pd.DataFrame({'value': [1, 2]}).to_csv(old_filename, index=False)
+        os.utime(old_filename, (time.time() - 60, time.time() - 60))
+        since = time.time() - 1
+        pd.DataFrame({'value': [1, 2, 3]}).to_csv(os.path.join(path, 'new.csv'), index=False)
+        pd.DataFrame({'value': [1.0, 2.0]}).to_parquet(os.path.join(path, 'new.parquet'))
+        with open(os.path.join(path, 'run.log'), 'w') as file:
+            file.write('log\n')
+
+        # when counting the outputs
+        stats = output_stats(path, since=since)
+
+        # expect the new data files only
+        self.assertEqual(stats['files'], 2)
+        self.assertEqual(stats['rows'], 5)
+        self.assertGreater(stats['bytes'], 0)
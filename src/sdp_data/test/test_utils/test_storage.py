@@ -0,0 +1,30 @@
+import os
+import tempfile
+import unittest
+import pandas as pd
+from sdp_data.utils.sink import new_sink
+from sdp_data.utils.storage import read, export_csv
+
+
+class TestStorage(unittest.TestCase):
+
+    def test_read_projection_and_csv_export(self):
+        """
+        Test that a raw parquet file is found without extension, read by columns and exported as csv.
+        :return:
+        """
+        # given a parquet raw file written in two pages
+        name = os.path.join(tempfile.mkdtemp(), 'eia_api_international')
+        with new_sink(name + '.parquet', 'parquet') as sink:
+            sink.write(pd.DataFrame({'period': ['2021'], 'countryRegionId': ['FRA'], 'value': [1.5]}))
+            sink.write(pd.DataFrame({'period': ['2022'], 'countryRegionId': ['DEU'], 'value': [None]}))
+
+        # when reading two columns, as values and as text, then exporting it
+        df = read(name, columns=['period', 'value'])
+        text_df = read(name, columns=['value'], text=True)
+        export_csv(name + '.parquet', name + '.csv')
+
+        # expect the projected columns and the same rows in the csv
+        self.assertEqual(df.columns.tolist(), ['period', 'value'])
+        self.assertEqual(text_df['value'].tolist(), ['1.5', ''])
+        self.assertEqual(pd.read_csv(name + '.csv', dtype=str)['period'].tolist(), ['2021', '2022'])
@@ -0,0 +1,67 @@
+import io
+import unittest
+import contextlib
+import numpy as np
+import pandas as pd
+from sdp_data.utils.units import UnitRegistry, units
+
+
+class TestUnitRegistry(unittest.TestCase):
+
+    def test_convert_to_target_units(self):
+        """
+        Test that the units of a target dict are converted, others kept as is (missing units included).
+        :return:
+        """
+        # given
+        df = pd.DataFrame({'final_energy': [1500.0, 250.0, 3.5, 7.0, np.nan],
+                           'final_energy_unit': ['Ktoe', 'GWh', 'Mtoe', None, 'Ktoe']})
+
+        # when
+        final_energy = units.convert(df['final_energy'], df['final_energy_unit'], {'Ktoe': 'Mtoe', 'GWh': 'TWh'})
+
+        # expect
+        self.assertEqual(final_energy.tolist()[:4], [1.5, 0.25, 3.5, 7.0])
+        self.assertTrue(np.isnan(final_energy.tolist()[4]))
+
+    def test_convert_per_dimension(self):
+        """
+        Test that each value is converted to the canonical unit of its dimension, unknown units reported together.
+        :return:
+        """
+        # given factor tables by energy source
+        registry = UnitRegistry.from_factors({'Oil': {'Mb/d': 1, 'TBPD': 0.001}, 'Gas': {'BCF': 1, 'BCM': 35.3147}},
+                                             {'Oil': 'Mb/d', 'Gas': 'BCF'})
+        df = pd.DataFrame({'energy': [2000.0, 2.0, 1.0], 'energy_unit': ['TBPD', 'BCM', 'BCF'],
+                           'energy_source': ['Oil', 'Gas', 'Gas']})
+
+        # when
+        energy = registry.convert(df['energy'], df['energy_unit'].astype('category'), dimension=df['energy_source'])
+
+        # expect
+        self.assertEqual(energy.tolist(), [2.0, 2 * 35.3147, 1.0])
+        with self.assertRaises(ValueError) as context:
+            registry.convert(df['energy'], pd.Series(['TBPD', 'TJ', 'Gb']), dimension=df['energy_source'])
+        self.assertIn('TJ (Gas)', str(context.exception))
+        self.assertIn('Gb (Gas)', str(context.exception))
+
+    def test_convert_reports_units_without_dimension_or_target(self):
+        """
+        Test that units without dimension raise, and units without target in a dict are reported (kept as is).
+        :return:
+        """
+        # given
+        registry = UnitRegistry.from_factors({'Hard Coal': {'Mt': 1 / 1.5}}, {'Hard Coal': 'Mtoe'})
+        values = pd.Series([3.0, 3.0, 3.0])
+
+        # when
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            energy = units.convert(values, pd.Series(['Ktoe', 'Mtoe', 'Gb']), {'Ktoe': 'Mtoe'})
+
+        # expect
+        self.assertEqual(energy.tolist(), [0.003, 3.0, 3.0])
+        self.assertIn("['Gb']", output.getvalue())
+        with self.assertRaises(ValueError) as context:
+            registry.convert(values, pd.Series(['Mt', 'Mt', 'Mt']), dimension=pd.Series(['Hard Coal', None, 'Lignite']))
+        self.assertIn('Mt (no dimension)', str(context.exception))
+        self.assertIn('Mt (Lignite)', str(context.exception))
@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+import zipfile
+import pandas as pd
+from sdp_data.utils.worldbank import read_indicator_zip, IndicatorCatalogue
+
+DATA_CSV = ('﻿"Data Source","World Development Indicators",\n'
+            '\n'
+            '"Last Updated Date","2024-06-28",\n'
+            '\n'
+            '"Country Name","Country Code","Indicator Name","Indicator Code","2021","2022",\n'
+            '"France","FRA","Population, total","SP.POP.TOTL","67749632","68082000",\n'
+            '"Aruba","ABW","Population, total","SP.POP.TOTL","106537","",\n')
+
+
+class TestReadIndicatorZip(unittest.TestCase):
+
+    def test_melt_years(self):
+        """
+        Test that the bulk csv is read from the archive and melted to one row per country and year.
+        :return:
+        """
+        # given a bulk archive with a metadata member and the indicator csv
+        zip_path = os.path.join(tempfile.mkdtemp(), 'SP.POP.TOTL.zip')
+        with zipfile.ZipFile(zip_path, 'w') as archive:
+            archive.writestr('Metadata_Country_API_SP.POP.TOTL_DS2_en_csv_v2.csv', 'Country Code,Region\n')
+            archive.writestr('API_SP.POP.TOTL_DS2_en_csv_v2.csv', DATA_CSV.encode('utf-8'))
+
+        # when reading it
+        df = read_indicator_zip(zip_path)
+
+        # expect countries in file order, most recent year first
+        self.assertEqual(df['country_code'].tolist(), ['FRA', 'FRA', 'ABW', 'ABW'])
+        self.assertEqual(df['year'].tolist(), ['2022', '2021', '2022', '2021'])
+        self.assertEqual(df['value'].tolist()[:2], [68082000, 67749632])
+        self.assertTrue(df['value'].isna().tolist()[2])
+
+
+class TestIndicatorCatalogue(unittest.TestCase):
+
+    def test_match_glob_patterns(self):
+        """
+        Test that glob patterns match from the index, without archives and relative indicators unless asked.
+        :return:
+        """
+        # given a catalogue (not sorted) with an archived and relative indicators
+        df = pd.DataFrame({'id': ['SP.POP.TOTL', 'EG.USE.PCAP.KG.OE', 'EG.USE.ELEC.KH.PC', 'EG.USE.COMM.FO.ZS',
+                                  'EG.USE.CRNW.ZS', 'EG.USE.OLD', 'EN.ATM.CO2E.KT'],
+                           'source.id': ['2', '2', '2', '2', '2', '57', '2']})
+        catalogue = IndicatorCatalogue.from_df(df)
+
+        # when matching patterns
+        # expect catalogue order, archives and relative indicators excluded unless in the pattern
+        self.assertEqual(catalogue.match('EG.USE.*'), ['EG.USE.PCAP.KG.OE', 'EG.USE.ELEC.KH.PC'])
+        self.assertEqual(catalogue.match('EG.USE.*.ZS'), ['EG.USE.COMM.FO.ZS', 'EG.USE.CRNW.ZS'])
+        self.assertEqual(catalogue.match('*CO2*'), ['EN.ATM.CO2E.KT'])
+        self.assertEqual(catalogue.match('SP.POP.TOTL'), ['SP.POP.TOTL'])
+        self.assertEqual(catalogue.match('SP.POP'), [])
@@ -1,5 +1,9 @@
+import os
+import tempfile
+import zipfile
 import requests
 from pandas import json_normalize
+from src.sdp_data.utils.worldbank import indicator_csv_url, read_indicator_zip
 
 class WorldBankScrapper:
 
@@ -13,6 +17,30 @@ class WorldBankScrapper:
             indicator_code = "NY.GDP.MKTP.CD"
             value_rename = "gdp"
 
+        # bulk zipped csv first, json api as fallback
+        try:
+            population_data = self.run_bulk(indicator_code)
+        except (requests.RequestException, IOError, ValueError, StopIteration, zipfile.BadZipFile) as e:
+            print("Bulk download failed, using the json api: %s" % e)
+            population_data = self.run_json(indicator_code)
+        return population_data.rename(columns={'value': value_rename})
+
+    @staticmethod
+    def run_bulk(indicator_code):
+        with tempfile.TemporaryDirectory() as tmp_path:
+            zip_path = os.path.join(tmp_path, indicator_code + ".zip")
+            with requests.get(indicator_csv_url(indicator_code), stream=True, timeout=(10, 120)) as response:
+                response.raise_for_status()
+                with open(zip_path, "wb") as file:
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        file.write(chunk)
+            population_data = read_indicator_zip(zip_path)
+
+        population_data = population_data[['country_code', 'year', 'country_name', 'value']]
+        return population_data.rename(columns={'country_code': 'country_code_a3'})
+
+    @staticmethod
+    def run_json(indicator_code):
         # Define the World Bank API URL
         url = "https://api.worldbank.org/v2/country/all/indicator/%s?format=json&per_page=20000" % indicator_code
         response = requests.get(url)
@@ -22,6 +50,5 @@ class WorldBankScrapper:
         # clean
         population_data = json_normalize(data[1])
         population_data = population_data[['countryiso3code', 'date', 'country.value', 'value']]
-        population_data = population_data.rename(columns={'countryiso3code': 'country_code_a3', 'date': 'year', 'country.value': 'country_name', 'value': value_rename})
+        population_data = population_data.rename(columns={'countryiso3code': 'country_code_a3', 'date': 'year', 'country.value': 'country_name'})
         return population_data
-
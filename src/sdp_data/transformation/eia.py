@@ -1,83 +1,13 @@
-from src.sdp_data.utils.iso3166 import countries
 from src.sdp_data.utils.translation import CountryTranslatorFrenchToEnglish
 from src.sdp_data.transformation.demographic.countries import StatisticsPerCountriesAndZonesJoiner
 from src.sdp_data.utils.format import StatisticsDataframeFormatter
-import requests
-import json
+from src.sdp_data.utils.excel import read_excel
+from src.sdp_data.utils.units import units
+from src.sdp_data.utils.iea_stats import EiaScrapper
 import pandas as pd
 import os
 
 
-class EiaScrapper:  # TODO - à refactorer
-
-    def __init__(self) -> None:
-        self.list_countries = countries
-        self.list_countries_fix = {"AUSTRALI": "Australia",
-                                   "BOSNIAHERZ": "Bosnia and Herzegovina",
-                                   "BOLIVIA": "Bolivia",
-                                   "BRUNEI": "Brunei Darussalam",
-                                   "CONGOREP": "Democratic Republic of the Congo",
-                                   "COTEIVOIRE": "Côte d'Ivoire",
-                                   "COSTARICA": "Costa Rica",
-                                   "DOMINICANR": "Dominican Republic",
-                                   "ELSALVADOR": "Salvador",
-                                   "FYROM": "North Macedonia",
-                                   "IRAN": "Iran",
-                                   "HONGKONG": "Hong Kong Special Administrative Region (China)",
-                                   "KOREA": "South Korea", "KOREADPR": "North Korea", "MOLDOVA": "Moldova",
-                                   "NETHLAND": "Netherlands", "NZ": "New Zealand", "RUSSIA": "Russian Federation",
-                                   "SAUDIARABI": "Saudi Arabia", "SOUTHAFRIC": "South Africa", "SRILANKA": "Sri Lanka",
-                                   "SSUDAN": "South Sudan", "SYRIA": "Syria", "TAIPEI": "Taiwan",
-                                   "TANZANIA": "Tanzania", "UK": "United Kingdom", "USA": "United States",
-                                   "VIETNAM": "Viet Nam", "VENEZUELA": "Venezuela"}
-
-    def collect_eai_dataset(self, url_end):
-
-        country_list = [country.apolitical_name for country in self.list_countries]
-        country_list += self.list_countries_fix.keys()
-
-        url_start = "https://www.iea.org/api/stats/getData.php?country="
-        urls = {}
-        for country in country_list:
-            urls[country] = url_start + country + url_end
-
-        empty_country = " {\
-        \"empty\": [\
-            {\
-                \"value\": \"empty\",\
-                \"formattedValue\": \"empty\",\
-                \"product\": \"empty\",\
-                \"flow\": \"empty\"\
-            }]}"
-
-        txt = "{"
-        i = 0
-        for country, url in urls.items():
-            if i > 0:
-                txt += ","
-            res = requests.get(url).text
-            if res.find("2000") == -1:
-                txt += "\"" + country + "\":" + empty_country
-            else:
-                txt += "\"" + country + "\":" + json.dumps(json.loads(res)["colData"])
-            i += 1
-
-        txt += "}"
-
-        result = json.loads(txt)
-
-        data = []
-        for country in result:
-            for year in result[country]:
-                for g in result[country][year]:
-                    c = self.list_countries_fix.get(country, country)
-                    data.append([c, year, g['flow'], g['product'], g['value'], "Ktoe"])
-
-        df = pd.DataFrame(data, columns=['country', 'year', 'flow', 'product', 'final_energy', 'final_energy_unit'])
-        df = df[df["final_energy"].notnull()]
-        return df
-
-
 class EiaDataProcessor:
 
     def __init__(self) -> None:
@@ -133,20 +63,6 @@ class EiaDataProcessor:
         self.list_final_cols_to_drop = None
         self.file_name = None
 
-    @staticmethod
-    def convert_energy_ktoe_to_mtoe(final_energy: float, final_energy_unit: str):
-        if final_energy_unit == "Ktoe":
-            return final_energy * 0.001
-        else:
-            return final_energy
-
-    @staticmethod
-    def convert_energy_gigawatt_to_terrawatt(final_energy: float, final_energy_unit: str):
-        if final_energy_unit == "GWh":
-            return final_energy * 0.001
-        else:
-            return final_energy
-
     @staticmethod
     def select_and_sort_values(df_iea_energy: pd.DataFrame):
 
@@ -158,25 +74,24 @@ class EiaDataProcessor:
 
         return df_iea_energy
 
-    def prepare_data(self, df_country: pd.DataFrame):
+    def prepare_data(self, df_country: pd.DataFrame, api_workers=None):
         """
         Collects EIA dataset from API and then prepare the data
+        :param api_workers: max concurrent requests to the api (EiaScrapper.max_workers if None)
         """
         # collect the dataset using EAI API
         print("\n----- prepare dataset %s" % self.dataset_label)
         try:  # TODO - à corriger une fois que l'on aura retrouvé les accès à EIA
-            df_iea_data = EiaScrapper().collect_eai_dataset(self.end_url)
+            df_iea_data = EiaScrapper(api_workers).collect_eai_dataset(self.end_url)
         except:
-            df_iea_data = pd.read_excel(os.path.join(os.path.dirname(__file__), "../../../data/thibaud/eia_api/" + self.file_name))
+            df_iea_data = read_excel(os.path.join(os.path.dirname(__file__), "../../../data/thibaud/eia_api/" + self.file_name))
 
         # clean EAI dataset
         df_iea_data = df_iea_data.rename({"flow": "sector", "product": "energy_family"}, axis=1)
         df_iea_data["sector"] = df_iea_data["sector"].replace(self.dict_replace_flow)
         df_iea_data["energy_family"] = df_iea_data["energy_family"].replace(self.dict_replace_product)
         df_iea_data["final_energy"] = pd.to_numeric(df_iea_data["final_energy"], errors="coerce")
-        df_iea_data["final_energy"] = df_iea_data.apply(lambda row: self.convert_energy_ktoe_to_mtoe(row["final_energy"], row["final_energy_unit"]), axis=1)
-        df_iea_data["final_energy"] = df_iea_data.apply(lambda row: self.convert_energy_gigawatt_to_terrawatt(row["final_energy"], row["final_energy_unit"]), axis=1)
-        df_iea_data["final_energy"] = pd.to_numeric(df_iea_data["final_energy"])
+        df_iea_data["final_energy"] = units.convert(df_iea_data["final_energy"], df_iea_data["final_energy_unit"], {"Ktoe": "Mtoe", "GWh": "TWh"})
         df_iea_data["final_energy_unit"] = df_iea_data["final_energy_unit"].replace({"GWh": "TWh", "Ktoe": "Mtoe"})
         df_iea_data["original_dataset"] = self.dataset_label
 
@@ -276,8 +191,8 @@ class EiaElectricityGenerationByEnergyProcessor(EiaDataProcessor):
         self.df_electricity_by_energy_family = None
         self.file_name = "iea_api_electricity_generation_by_energy_family.xlsx"
 
-    def prepare_data(self, df_country: pd.DataFrame):
-        df_electricity_by_energy_family = super().prepare_data(df_country)
+    def prepare_data(self, df_country: pd.DataFrame, api_workers=None):
+        df_electricity_by_energy_family = super().prepare_data(df_country, api_workers)
         df_electricity_by_energy_family["source"] = "IEA"
         df_electricity_by_energy_family = df_electricity_by_energy_family.rename({"sector": "energy_family"}, axis=1)
         self.df_electricity_by_energy_family = df_electricity_by_energy_family
@@ -5,6 +5,7 @@ import sys
 sys.path.insert(0, r'C:\Users\HP\Desktop\shiftdataportal_data')
 from src.sdp_data.utils.translation import CountryTranslatorFrenchToEnglish
 from src.sdp_data.utils.utils import diff_evaluation
+from src.sdp_data.utils.units import UnitRegistry
 
 
 # Class to update recent data
@@ -18,6 +19,7 @@ class FossilProvenReservesProdGeneratorNEW:
             'Gas': {'BCF': 1, 'BCM': 35.3147}
         }
         self.default_unit = {'Oil': 'Mb/d', 'Coal': 'MTOE', 'Gas': 'BCF'}
+        self.units = UnitRegistry.from_factors(self.dict_units_coef, self.default_unit)
 
     def process(self, df):
         """
@@ -70,8 +72,7 @@ class FossilProvenReservesProdGeneratorNEW:
                               eia_api.energy_unit.isin(self.identify_units(eia_api, 'Gas', 'BCF'))) | (
                                       eia_api.energy_source == 'Coal') & (
                               eia_api.energy_unit.isin(self.identify_units(eia_api, 'Coal', 'MTOE')))]
-        eia_api['energy'] = eia_api.apply(
-            lambda x: self.dict_units_coef[x['energy_source']][x['energy_unit']] * x['energy'], axis=1)
+        eia_api['energy'] = self.units.convert(eia_api['energy'], eia_api['energy_unit'], dimension=eia_api['energy_source'])
         eia_api['energy_unit'] = eia_api['energy_source'].map(self.default_unit)
 
         eia_api.drop_duplicates(subset=['year', 'energy_source', 'type', 'group_name'], inplace=True)
@@ -93,7 +94,7 @@ class FossilProvenReservesProdGeneratorNEW:
         Calculate net imports data by subtracting exports from imports.
         """
         df_net_imports = df.copy()
-        df_net_imports['energy'] = df.apply(lambda x: x['energy'] if x['type'] == 'Imports' else -x['energy'], axis=1)
+        df_net_imports['energy'] = df['energy'].where(df['type'] == 'Imports', -df['energy'])
         df_net_imports = df_net_imports[df_net_imports['type'].notnull()]
         df_net_imports = df_net_imports.groupby(['group_name', 'energy_unit', 'energy_source', 'year', 'source'])[
             'energy'].sum().reset_index()
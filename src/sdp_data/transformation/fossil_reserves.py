@@ -3,20 +3,27 @@ import numpy as np
 import sys
 sys.path.insert(0, r'C:\Users\HP\Desktop\shiftdataportal_data')
 from src.sdp_data.utils.translation import CountryTranslatorFrenchToEnglish
+from src.sdp_data.utils.units import UnitRegistry
 
 
 class CoalReservesConsolidatedProdGenerator:
 
     def __init__(self):
-        # Initialize any necessary variables or state here
-        self.dict_energy_converter = {'Hard Coal': 1.5, 'Brown Coal': 3}
+        # Mt of coal per Mtoe, by coal type
+        self.units = UnitRegistry.from_factors({'Hard Coal': {'Mt': 1 / 1.5}, 'Brown Coal': {'Mt': 1 / 3}},
+                                               {'Hard Coal': 'Mtoe', 'Brown Coal': 'Mtoe'})
 
     def process(self, df):
         df["year"] = df["year"].astype(int)
         df["proven_reserves"] = df["proven_reserves"].str.replace(" ", "").replace("-", "")
         df['proven_reserves'] = pd.to_numeric(df['proven_reserves'], errors='coerce')
-        df["proven_reserves_energy"] = df.apply(
-            lambda row: row['proven_reserves'] / self.dict_energy_converter.get(row['coal_type'], np.nan), axis=1)
+        # Reserves of a missing or unknown coal type have no energy content (left empty)
+        known = df['coal_type'].isin(list(self.units.canonicals))
+        if not known.all():
+            print("[WARNING] Coal reserves without energy content (unknown coal type): %s"
+                  % sorted(set(map(str, df.loc[~known, 'coal_type']))))
+        df["proven_reserves_energy"] = self.units.convert(df['proven_reserves'].where(known), df['unit'].where(known),
+                                                          dimension=df['coal_type'].where(known))
         df["proven_reserves_energy_unit"] = "Mtoe"
         df.rename(columns={'country': 'group_name'}, inplace=True)
         df['source'] = "Survey of Energy Resources, World Energy Council 2010"
@@ -184,6 +191,7 @@ class BpFossilWithZonesProdGeneratorNEW:
             'Gas': {'Tcm': 0.001, 'Bcm': 1}
         }
         self.default_unit = {'Oil': 'Gb', 'Gas': 'Bcm'}
+        self.units = UnitRegistry.from_factors(self.dict_units_coef, self.default_unit)
 
     def process(self, df):
         """
@@ -221,9 +229,9 @@ class BpFossilWithZonesProdGeneratorNEW:
 
         df_bp_oilgal_proven_reserves_stacked = df_bp_oilgal_proven_reserves_stacked.reset_index(drop=True)
 
-        df_bp_oilgal_proven_reserves_stacked['proven_reserves'] = df_bp_oilgal_proven_reserves_stacked.apply(
-            lambda x: self.dict_units_coef[x['energy_source']][x['proven_reserves_unit']] * x['proven_reserves'],
-            axis=1)
+        df_bp_oilgal_proven_reserves_stacked['proven_reserves'] = self.units.convert(
+            df_bp_oilgal_proven_reserves_stacked['proven_reserves'], df_bp_oilgal_proven_reserves_stacked['proven_reserves_unit'],
+            dimension=df_bp_oilgal_proven_reserves_stacked['energy_source'])
         df_bp_oilgal_proven_reserves_stacked['proven_reserves_unit'] = df_bp_oilgal_proven_reserves_stacked[
             'energy_source'].map(self.default_unit)
 
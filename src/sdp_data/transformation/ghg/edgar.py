@@ -2,30 +2,21 @@ import pandas as pd
 import numpy as np
 from src.sdp_data.utils.translation import CountryTranslatorFrenchToEnglish, SectorTranslator
 from src.sdp_data.utils.format import StatisticsDataframeFormatter
+from src.sdp_data.utils.gwp import GwpTable
 
 
 class EdgarCleaner:
 
-    def __init__(self):
+    def __init__(self, gwp_set="AR4"):
         self.dict_gas_to_replace = {"PFC": "F-Gas", "HFC": "F-Gas", "SF6": "F-Gas"}
+        # N2O and CH4 with the AR4 GWP  # TODO - mettre à jour conversion pour les gaz EDGAR
+        # F-gases are already in CO2eq  # TODO - ajouter une conversion pour ces gas ?
+        self.gwp_table = GwpTable(gwp_set, gases={gas: 1 for gas in ["SF6", "HFC", "HFCs", "PFC", "F-Gas"]})
 
     @staticmethod
     def melt_years(df_edgar_stacked: pd.DataFrame):
         return pd.melt(df_edgar_stacked, id_vars=["country", "sector", "gas"], var_name='year', value_name='ghg')
 
-    @staticmethod
-    def convert_ghg_with_gas(ghg, gas):
-        if gas == "N2O":  # TODO - mettre à jour conversion pour les gaz EDGAR
-            return ghg * 298
-        elif gas == "CH4":
-            return ghg * 25
-        elif gas == "CO2":
-            return ghg
-        elif gas in ["SF6", "HFC", "HFCs", "PFC", "F-Gas"]:  # TODO - ajouter une conversion pour ces gas ?
-            return ghg
-        else:
-            raise ValueError("ERR : unknown gas : %s" % gas)
-
     @staticmethod
     def custom_sum_sentive_nan(series):
         if series.isna().all():
@@ -60,7 +51,7 @@ class EdgarCleaner:
         # convert ghg and drop missing values # TODO - ajouter la conversion des données non CO2 comme dans les données Edgar ?
         df_edgar_stacked["gas"] = df_edgar_stacked["gas"].replace(self.dict_gas_to_replace)
         df_edgar_stacked["ghg"] = 0.001 * pd.to_numeric(df_edgar_stacked["ghg"], errors="coerce")
-        df_edgar_stacked["ghg"] = df_edgar_stacked.apply(lambda row: self.convert_ghg_with_gas(row["ghg"], row["gas"]), axis=1)
+        df_edgar_stacked["ghg"] = self.gwp_table.to_co2eq(df_edgar_stacked["ghg"], df_edgar_stacked["gas"])
         df_edgar_stacked["ghg_unit"] = "MtCO2eq"
 
         # sum all ghg and clean countries
@@ -1,11 +1,12 @@
 import pandas as pd
 from src.sdp_data.utils.translation import CountryTranslatorFrenchToEnglish, CountryIsoCodeTranslator
 from src.sdp_data.utils.format import StatisticsDataframeFormatter
+from src.sdp_data.utils.gwp import GwpTable
 
 
 class PikCleaner:
 
-    def __init__(self):
+    def __init__(self, gwp_set="AR6_CH4_AR5"):
         self.list_countries_to_remove = ["World", "Non-Annex-I Parties to the Convention",  "Annex-I Parties to the Convention",
                                          "BASIC countries (Brazil, South Africa, India and China)", "Umbrella Group",
                                          "Umbrella Group (28)", "Least Developed Countries", "European Union (28)",
@@ -19,29 +20,18 @@ class PikCleaner:
                                     "HFCS (AR6GWP100)": "HFCS", "PFCS (AR6GWP100)": "PFCS",
                                     "SF6": "SF6", "NF3": "NF3"
                                     }
+        # GWP per unit (HFCS and PFCS are already in CO2 * gigagram / a, AR6GWP100)
+        self.dict_unit_to_gas = {"CO2 * gigagram / a": "CO2", "N2O * gigagram / a": "N2O", "CH4 * gigagram / a": "CH4",
+                                 "SF6 * gigagram / a": "SF6", "NF3 * gigagram / a": "NF3"}
+        self.gwp_table = GwpTable(gwp_set)
 
-    @staticmethod
-    def convert_ghg_with_gas(ghg, ghg_unit):
-        if ghg_unit == "CO2 * gigagram / a":
-            return ghg
-        elif ghg_unit == "N2O * gigagram / a":
-            return ghg * 273
-        elif ghg_unit == "CH4 * gigagram / a":
-            return ghg * 28
-        elif ghg_unit == "SF6 * gigagram / a":
-            return ghg * 25200
-        elif ghg_unit == "NF3 * gigagram / a":
-            return ghg * 17400
-        else:
-            raise ValueError("ERR : unknown ghg_unit : %s" % ghg_unit)
-        
     def convert_ghg_unit(self, df_pik: pd.DataFrame):
         """
         Convert the GHG unit to MtCO2eq.
         :param df_pik:
         :return:
         """
-        df_pik["ghg"] = df_pik.apply(lambda x: self.convert_ghg_with_gas(x["ghg"], x["ghg_unit"]), axis=1)
+        df_pik["ghg"] = self.gwp_table.to_co2eq(df_pik["ghg"], df_pik["ghg_unit"], aliases=self.dict_unit_to_gas)
         df_pik["ghg"] /= 1000
         df_pik["ghg_unit"] = "MtCO2eq"
         return df_pik
@@ -0,0 +1,29 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def ordered_map(func, items, max_workers=1):
+    """
+    Lazily applies func to each item with at most max_workers calls in flight.
+    Results are yielded in the input order (not completion order), so callers can
+    consume pages or probes as if they were fetched one after another.
+    Closing the generator (break) cancels the calls not started yet.
+    """
+    if not max_workers or max_workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        try:
+            for item in items:
+                pending.append(executor.submit(func, item))
+                # Keep every worker busy while waiting for the oldest call
+                if len(pending) > max_workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,240 @@
+import os
+import time
+import hashlib
+import traceback
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from .stage_cache import StageCache, read_output
+
+
+class Stage:
+    """
+    A pipeline step: func(*inputs) returns its outputs (one value, or a tuple in outputs order).
+    Inputs and outputs are dataset names (ex: COUNTRY, GHG_PIK_CLEAN), not file paths.
+    files (raw files read), processors (classes used) and params are the stage cache key, with its inputs:
+    a stage not cached (ex: web scrapping) runs every time.
+    exports are the files func writes (ex: published csv): cached with the outputs, written again on a cache hit.
+    """
+
+    def __init__(self, name, func, inputs=(), outputs=(), files=(), processors=(), params=None, cached=True,
+                 exports=()):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.files = list(files)
+        self.processors = list(processors)
+        self.params = params or {}
+        self.cached = cached
+        self.exports = list(exports)
+
+    def __repr__(self):
+        return f'Stage({self.name}: {self.inputs} -> {self.outputs})'
+
+
+# Input dataset stored in the stage cache, read by the process running the stage
+class _Cached:
+
+    def __init__(self, path):
+        self.path = path
+
+
+# Content fingerprint of a dataframe (output of a stage not cached)
+def _fingerprint(df):
+    import pandas as pd
+    if isinstance(df, pd.DataFrame):
+        return hashlib.sha256(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()
+    return hashlib.sha256(repr(df).encode('utf-8')).hexdigest()
+
+
+def _run_stage(func, args, outputs, cache_path=None, key=None, exports=()):
+    start = time.time()
+    args = [read_output(arg.path) if isinstance(arg, _Cached) else arg for arg in args]
+    result = func(*args)
+    if len(outputs) == 1:
+        result = (result,)
+    if len(result) != len(outputs):
+        raise ValueError(f'{len(result)} results for {len(outputs)} outputs: {outputs}')
+    result = dict(zip(outputs, result))
+
+    size = None
+    fingerprints = {}
+    if cache_path and key:
+        try:
+            size = StageCache.write(cache_path, key, result, exports)
+        except Exception as e:
+            print(f'[WARNING] Outputs not cached: {e}')
+    elif cache_path:
+        fingerprints = {output: _fingerprint(df) for output, df in result.items()}
+    return result, time.time() - start, size, fingerprints
+
+
+class Dag:
+    """
+    Stages scheduled from their inputs and outputs: a stage starts as soon as its inputs are computed,
+    independent stages run at the same time in worker processes.
+    """
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+        self.producers = {}
+        for stage in self.stages:
+            for output in stage.outputs:
+                if output in self.producers:
+                    raise ValueError(f'Dataset {output} produced by {self.producers[output].name} and {stage.name}')
+                self.producers[output] = stage
+        for stage in self.stages:
+            missing = [input for input in stage.inputs if input not in self.producers]
+            if missing:
+                raise ValueError(f'Stage {stage.name}: no stage produces {missing}')
+        self.order = self._topological_order()
+
+    def datasets(self):
+        return list(self.producers)
+
+    def stage(self, target):
+        """
+        Stage producing a dataset, or stage of that name.
+        """
+        stage = self.producers.get(target) or next((stage for stage in self.stages if stage.name == target), None)
+        if stage is None:
+            raise KeyError(f'Unknown dataset or stage: {target}')
+        return stage
+
+    def _topological_order(self):
+        order = []
+        state = {}
+
+        def visit(stage, path):
+            if state.get(stage.name) == 'done':
+                return
+            if state.get(stage.name) == 'visiting':
+                raise ValueError(f'Cycle: {" -> ".join(path + [stage.name])}')
+            state[stage.name] = 'visiting'
+            for input in stage.inputs:
+                visit(self.producers[input], path + [stage.name])
+            state[stage.name] = 'done'
+            order.append(stage)
+
+        for stage in self.stages:
+            visit(stage, [])
+        return order
+
+    def required(self, targets=None):
+        """
+        Stages needed to compute the targets (datasets or stage names), in execution order.
+        All stages if no targets.
+        """
+        if not targets:
+            return list(self.order)
+        pending = [self.stage(target) for target in targets]
+        required = set()
+        while pending:
+            stage = pending.pop()
+            if stage.name not in required:
+                required.add(stage.name)
+                pending.extend(self.producers[input] for input in stage.inputs)
+        return [stage for stage in self.order if stage.name in required]
+
+    def run(self, targets=None, max_workers=None, cache=None, force=False):
+        """
+        Runs the stages required by the targets, max_workers processes (1 = in this process, in order).
+        A failed stage only stops the stages depending on it.
+        :param cache: StageCache: a stage with the same key as a previous run reads its outputs from the cache
+        :param force: runs all the stages (outputs still cached)
+        :return: (datasets of the targets, summary list of dict stage, status, duration)
+        """
+        stages = self.required(targets)
+        max_workers = max_workers or os.cpu_count() or 1
+        # Remaining consumers of each dataset: freed once consumed (unless a target)
+        consumers = {}
+        for stage in stages:
+            for input in stage.inputs:
+                consumers[input] = consumers.get(input, 0) + 1
+        keep = set()
+        for target in targets or ():
+            keep.update([target] if target in self.producers else self.stage(target).outputs)
+
+        # Computed datasets: dataframes, or cached outputs (parquet paths) read only if needed
+        datasets = {}
+        dataset_keys = {}
+        summary = []
+        pending = list(stages)
+        failed = set()
+        executor = ProcessPoolExecutor(max_workers=max_workers) if max_workers > 1 else None
+        running = {}
+        try:
+            while pending or running:
+                # Skip stages depending on a failed dataset
+                for stage in [stage for stage in pending if any(input in failed for input in stage.inputs)]:
+                    pending.remove(stage)
+                    failed.update(stage.outputs)
+                    summary.append({'stage': stage.name, 'status': 'skipped', 'duration': 0})
+                    print(f'[WARNING] Stage {stage.name} skipped (failed inputs)')
+
+                ready = [stage for stage in pending if all(input in datasets for input in stage.inputs)]
+                for stage in ready:
+                    pending.remove(stage)
+                    key = None
+                    if cache is not None and stage.cached:
+                        key = cache.key(stage, [dataset_keys[input] for input in stage.inputs])
+                        paths = None if force else cache.get(key, stage.outputs, stage.exports)
+                        if paths is not None:
+                            restored = cache.restore(key, stage.exports)
+                            if restored:
+                                print(f'-- Stage {stage.name} exports written from the cache: {restored}')
+                            datasets.update({output: _Cached(path) for output, path in paths.items()})
+                            dataset_keys.update({output: StageCache.dataset_key(key, output) for output in stage.outputs})
+                            summary.append({'stage': stage.name, 'status': 'cached', 'duration': 0})
+                            print(f'-- Stage {stage.name} cached')
+                            self._free(stage, consumers, keep, datasets)
+                            continue
+
+                    args = [datasets[input] for input in stage.inputs]
+                    run_args = (stage.func, args, stage.outputs, cache.path if cache is not None else None, key, stage.exports)
+                    print(f'-- Stage {stage.name} started')
+                    if executor is None:
+                        self._done(stage, key, lambda: _run_stage(*run_args), datasets, dataset_keys, cache, failed, summary)
+                        self._free(stage, consumers, keep, datasets)
+                    else:
+                        running[executor.submit(_run_stage, *run_args)] = (stage, key)
+                if executor is None or not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, key = running.pop(future)
+                    self._done(stage, key, future.result, datasets, dataset_keys, cache, failed, summary)
+                    self._free(stage, consumers, keep, datasets)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        return {name: read_output(df.path) if isinstance(df, _Cached) else df for name, df in datasets.items()}, summary
+
+    @staticmethod
+    def _done(stage, key, result, datasets, dataset_keys, cache, failed, summary):
+        try:
+            outputs, duration, size, fingerprints = result()
+            datasets.update(outputs)
+            if key is not None:
+                dataset_keys.update({output: StageCache.dataset_key(key, output) for output in stage.outputs})
+                if size is not None:
+                    cache.put(key, stage.name, size)
+            else:
+                dataset_keys.update(fingerprints)
+            summary.append({'stage': stage.name, 'status': 'ok', 'duration': round(duration, 1)})
+            print(f'-- Stage {stage.name} done in {duration:.1f}s')
+        except Exception:
+            failed.update(stage.outputs)
+            summary.append({'stage': stage.name, 'status': 'failed', 'duration': 0})
+            print(f'[ERROR] Stage {stage.name} failed')
+            traceback.print_exc()
+
+    # Drops the datasets no remaining stage needs (inputs consumed, outputs never used)
+    @staticmethod
+    def _free(stage, consumers, keep, datasets):
+        for input in stage.inputs:
+            consumers[input] -= 1
+        for name in stage.inputs + stage.outputs:
+            if not consumers.get(name) and name not in keep:
+                datasets.pop(name, None)
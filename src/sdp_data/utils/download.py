@@ -1,83 +1,106 @@
+import os
 import requests
 import time
-import csv
-import json
+import hashlib
 
-def download_file_with_retry(url, file_path, max_retries=1, retry_delay=1):
-    retries = 0
-    while retries < max_retries:
-        with requests.Session() as session:
-            try:
-                response = session.get(url)
-                response.raise_for_status()  # Raise an exception if the request was not successful
-                with open(file_path, 'wb') as file:
-                    file.write(response.content)
-                print("File downloaded successfully.")
-                return
-            except (requests.RequestException, IOError) as e:
-                print(f"An error occurred while downloading the file: {e}")
-                retries += 1
-                if retries < max_retries:
-                    print("Retrying...")
-                    time.sleep(retry_delay)
-    
-    print("Maximum number of retries exceeded. File download failed.")
-    
-    
-def stream_file_to_with_retry(url, file_path, max_retries=1, retry_delay=5):
-    retries = 0
-    while retries < max_retries:
-        try:
-            response = requests.get(url, stream=True)
-            response.raise_for_status()  # Raise an exception if the request was not successful
-
-            with open(file_path, 'w', newline='') as file:
-                csv_writer = csv.writer(file)
-                for chunk in response.iter_content(chunk_size=1024):
-                    if chunk:
-                        csv_writer.writerow(chunk.decode().split(','))
+# Keep-alive session with a sized connection pool and gzip/deflate encoding
+def new_session(pool_size=10):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'})
+    return session
 
-            print("CSV data written successfully.")
-            return
-        except (requests.RequestException, IOError) as e:
-            print(f"An error occurred while streaming and appending CSV data to file: {e}")
-            retries += 1
-            if retries < max_retries:
-                print("Retrying...")
-                time.sleep(retry_delay)
 
-    print("Maximum number of retries exceeded. Streaming and appending CSV data to file failed.")
+def download_file_with_retry(url, file_path, max_retries=1, retry_delay=1, session=None, timeout=None, headers=None,
+                             chunk_size=1024 * 1024, sha256=None):
+    """
+    Streams url in chunks to a '.part' file, resumed with a Range request after a failure.
+    The file is verified (Content-Length or sha256 checksum) then moved into place atomically.
+    Returns the response (status 304 if headers hold validators and the file is not modified) or None on failure.
+    """
+    session = session or new_session()
+    part_path = file_path + '.part'
+    if os.path.exists(part_path):
+        os.remove(part_path)
     
-        
-def stream_json_to_csv_with_retry(url, csv_path, max_retries=3, retry_delay=1):
+    # Validator of the first response: resume only if the file has not changed since (If-Range)
+    validator = None
+    expected_size = None
     retries = 0
     while retries < max_retries:
         try:
-            response = requests.get(url, stream=True)
-            response.raise_for_status()  # Raise an exception if the request was not successful
+            # Identity encoding: ranges and Content-Length apply to the file bytes
+            request_headers = {**(headers or {}), 'Accept-Encoding': 'identity'}
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            if offset and validator:
+                request_headers.pop('If-None-Match', None)
+                request_headers.pop('If-Modified-Since', None)
+                request_headers['Range'] = f'bytes={offset}-'
+                request_headers['If-Range'] = validator
             
-            with open(csv_path, 'w', newline='') as csv_file:
-                writer = csv.writer(csv_file)
+            with session.get(url, headers=request_headers, timeout=timeout, stream=True) as response:
+                response.raise_for_status()  # Raise an exception if the request was not successful
+                if response.status_code == 304:
+                    return response
+                
+                if response.status_code == 206:
+                    print(f"Resuming download at byte {offset}...")
+                    mode = 'ab'
+                    expected_size = _content_range_size(response) or expected_size
+                else:
+                    mode = 'wb'
+                    validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+                    expected_size = int(response.headers['Content-Length']) if 'Content-Length' in response.headers else None
                 
-                # Assuming the JSON data is a list of dictionaries
-                for data_row in response.iter_lines():
-                    if data_row:
-                        row = json.loads(data_row)
-                        writer.writerow(row.values())
+                with open(part_path, mode) as file:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if chunk:
+                            file.write(chunk)
             
-            print("JSON data streamed to CSV successfully.")
-            return
+            # Verify before moving into place
+            size = os.path.getsize(part_path)
+            if expected_size is not None and size != expected_size:
+                raise IOError(f"Incomplete file: {size} bytes of {expected_size}")
+            if sha256 is not None and file_sha256(part_path) != sha256:
+                os.remove(part_path)
+                raise IOError("Checksum mismatch")
+            
+            os.replace(part_path, file_path)
+            print("File downloaded successfully.")
+            return response
         except (requests.RequestException, IOError) as e:
-            print(f"An error occurred while streaming JSON data to CSV: {e}")
+            print(f"An error occurred while downloading the file: {e}")
             retries += 1
             if retries < max_retries:
                 print("Retrying...")
                 time.sleep(retry_delay)
     
-    print("Maximum number of retries exceeded. Streaming JSON data to CSV failed.")
-
-
+    if os.path.exists(part_path):
+        os.remove(part_path)
+    print("Maximum number of retries exceeded. File download failed.")
+    return None
 
 
+# Total size from a 206 Content-Range header (bytes start-end/total)
+def _content_range_size(response):
+    content_range = response.headers.get('Content-Range', '')
+    total = content_range.rsplit('/', 1)[-1]
+    return int(total) if total.isdigit() else None
 
 
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+    
+    
+# Streams url as is to file_path (a csv file stays byte for byte the same)
+def stream_file_to_with_retry(url, file_path, max_retries=1, retry_delay=5, session=None, timeout=None):
+    response = download_file_with_retry(url, file_path, max_retries, retry_delay, session=session, timeout=timeout)
+    if response is None:
+        print("Maximum number of retries exceeded. Streaming CSV data to file failed.")
+    return response
@@ -0,0 +1,182 @@
+import os
+import json
+import datetime
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+from .download import file_sha256
+
+# Parquet sidecars of the workbooks sheets
+cache_path = os.path.join(os.path.dirname(__file__), "../../../data/_cache/excel/")
+
+
+def read_excel(path, sheet_name=0, **kwargs):
+    """
+    pd.read_excel served from typed parquet sidecars: each (workbook, sheet, read options) is parsed once.
+    Sidecars are kept while the workbook size and mtime (or else its sha256) do not change.
+    The workbook is opened once for all the sheets not cached yet.
+    :param sheet_name: as pd.read_excel: name or position, list of them (dict of dataframes), None for all sheets
+    :param kwargs: pd.read_excel options (header, skiprows, usecols...)
+    :return: dataframe, or dict of dataframes
+    """
+    workbook = _Workbook(path)
+    if sheet_name is None:
+        sheets = workbook.sheet_names()
+    elif isinstance(sheet_name, list):
+        sheets = sheet_name
+    else:
+        sheets = [sheet_name]
+
+    dfs = workbook.read(sheets, kwargs)
+    if sheet_name is None or isinstance(sheet_name, list):
+        return dfs
+    return dfs[sheet_name]
+
+
+class _Workbook:
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.sidecar_path = os.path.join(cache_path, hashlib.sha256(self.path.encode("utf-8")).hexdigest()[:16])
+        self.meta = self._valid_meta()
+
+    def sheet_names(self):
+        if self.meta.get("sheet_names") is None:
+            with pd.ExcelFile(self.path) as excel_file:
+                self.meta["sheet_names"] = excel_file.sheet_names
+            self._save_meta()
+        return self.meta["sheet_names"]
+
+    def read(self, sheets, kwargs):
+        # Sheets by name (a position is the same sidecar as its name)
+        names = {sheet: self.sheet_names()[sheet] if isinstance(sheet, int) else sheet for sheet in sheets}
+        dfs = {}
+        missing = []
+        for name in dict.fromkeys(names.values()):
+            df = self._read_sidecar(name, kwargs)
+            if df is None:
+                missing.append(name)
+            else:
+                dfs[name] = df
+
+        if missing:
+            with pd.ExcelFile(self.path) as excel_file:
+                for name in missing:
+                    dfs[name] = excel_file.parse(name, **kwargs)
+                    self._write_sidecar(name, kwargs, dfs[name])
+            self._save_meta()
+        return {sheet: dfs[names[sheet]] for sheet in sheets}
+
+    # ---------------------------------------------------------------------------------------------
+    # Private
+
+    # Sidecars metadata, reset if the workbook content changed
+    def _valid_meta(self):
+        stat = os.stat(self.path)
+        meta = {}
+        meta_path = os.path.join(self.sidecar_path, "meta.json")
+        if os.path.exists(meta_path):
+            try:
+                with open(meta_path, "r", encoding="utf-8") as file:
+                    meta = json.load(file)
+            except (IOError, ValueError) as e:
+                print(f"[WARNING] Excel sidecars metadata unreadable, parsing again: {e}")
+        if meta.get("size") == stat.st_size and meta.get("mtime_ns") == stat.st_mtime_ns:
+            return meta
+
+        sha256 = file_sha256(self.path)
+        if meta.get("sha256") != sha256:
+            shutil.rmtree(self.sidecar_path, ignore_errors=True)
+            meta = {"path": self.path, "sha256": sha256, "sheet_names": None, "sheets": {}}
+        meta.update({"size": stat.st_size, "mtime_ns": stat.st_mtime_ns})
+        os.makedirs(self.sidecar_path, exist_ok=True)
+        self._save_meta(meta)
+        return meta
+
+    def _save_meta(self, meta=None):
+        meta_path = os.path.join(self.sidecar_path, "meta.json")
+        tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(meta or self.meta, file)
+        os.replace(tmp_path, meta_path)
+
+    # Sidecar of a sheet read with these options
+    @staticmethod
+    def _entry(sheet, kwargs):
+        options = json.dumps([sheet, kwargs], sort_keys=True, default=str)
+        return hashlib.sha256(options.encode("utf-8")).hexdigest()[:16]
+
+    def _read_sidecar(self, sheet, kwargs):
+        entry = self.meta["sheets"].get(self._entry(sheet, kwargs))
+        if entry is None:
+            return None
+        parquet_path = os.path.join(self.sidecar_path, entry["file"])
+        if not os.path.exists(parquet_path):
+            return None
+        stored = pd.read_parquet(parquet_path)
+        df = pd.DataFrame({i: _decode(stored[str(i)], stored[f"{i}.type"]) if f"{i}.type" in stored else stored[str(i)]
+                           for i in range(len(entry["columns"]))})
+        df.columns = [_column(name) for name in entry["columns"]]
+        return df
+
+    def _write_sidecar(self, sheet, kwargs, df):
+        # Parquet columns are positions, headers (ex: years as int) restored from the metadata
+        columns = [_column_meta(name) for name in df.columns]
+        if None in columns:
+            print(f"[WARNING] Excel sheet {sheet} of {self.path} not cached: unsupported column names")
+            return
+        entry = self._entry(sheet, kwargs)
+        parquet_path = os.path.join(self.sidecar_path, entry + ".parquet")
+        try:
+            stored = {}
+            for i, (_, serie) in enumerate(df.items()):
+                if serie.dtype == object:
+                    # ex: a column mixing numbers and text, kept as is by pd.read_excel
+                    stored[str(i)], stored[f"{i}.type"] = _encode(serie)
+                else:
+                    stored[str(i)] = serie
+            pd.DataFrame(stored).to_parquet(parquet_path + ".tmp", index=False)
+        except Exception as e:
+            print(f"[WARNING] Excel sheet {sheet} of {self.path} not cached: {e}")
+            return
+        os.replace(parquet_path + ".tmp", parquet_path)
+        self.meta["sheets"][entry] = {"sheet": sheet, "file": entry + ".parquet", "columns": columns}
+
+
+def _column_meta(name):
+    for type, numpy_type in ((bool, np.bool_), (int, np.integer), (float, np.floating), (str, str)):
+        if isinstance(name, (type, numpy_type)):
+            return [type.__name__, type(name)]
+    return None
+
+
+def _column(meta):
+    type, name = meta
+    return {"bool": bool, "int": int, "float": float, "str": str}[type](name)
+
+
+# Values of an object column: text and type code (None, str, int, float, bool, datetime) per cell
+_value_types = (type(None), str, int, float, bool, datetime.datetime)
+
+
+def _encode(serie):
+    types = serie.map(type)
+    unknown = set(types) - set(_value_types)
+    if unknown:
+        raise ValueError(f"unsupported values {unknown} in column {serie.name}")
+    codes = types.map({value_type: code for code, value_type in enumerate(_value_types)}).astype("int8")
+    texts = serie.map(lambda value: value.isoformat() if isinstance(value, datetime.datetime) else repr(value))
+    return texts.where(codes != 1, serie).astype(object), codes
+
+
+def _decode(texts, codes):
+    values = np.empty(len(texts), dtype=object)
+    texts = texts.to_numpy(dtype=object)
+    codes = codes.to_numpy()
+    parse = {0: lambda text: None, 1: str, 2: int, 3: float, 4: lambda text: text == "True", 5: datetime.datetime.fromisoformat}
+    for code, value_type in parse.items():
+        mask = codes == code
+        if mask.any():
+            values[mask] = [value_type(text) for text in texts[mask]]
+    return pd.Series(values, dtype=object)
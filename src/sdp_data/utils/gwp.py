@@ -0,0 +1,44 @@
+from .units import UnitRegistry
+
+# GWP100 (tCO2eq per t of gas) of the IPCC assessment reports
+GWP_SETS = {
+    "AR4": {"CO2": 1, "CH4": 25, "N2O": 298, "SF6": 22800, "NF3": 17200},
+    "AR5": {"CO2": 1, "CH4": 28, "N2O": 265, "SF6": 23500, "NF3": 16100},
+    "AR6": {"CO2": 1, "CH4": 27.9, "N2O": 273, "SF6": 25200, "NF3": 17400},
+}
+# AR6 with the AR5 methane GWP (PIK data as published on the portal)
+GWP_SETS["AR6_CH4_AR5"] = {**GWP_SETS["AR6"], "CH4": GWP_SETS["AR5"]["CH4"]}
+
+
+class GwpTable:
+    """
+    GWP of each gas from a named set (GWP_SETS), to convert emissions to CO2eq in bulk.
+    """
+
+    def __init__(self, gwp_set="AR6", gases=None):
+        """
+        :param gwp_set: name of the set (AR4, AR5, AR6, AR6_CH4_AR5)
+        :param gases: other gases GWP (ex: {"F-Gas": 1} for emissions already in CO2eq)
+        """
+        if gwp_set not in GWP_SETS:
+            raise ValueError("ERR : unknown GWP set : %s (sets: %s)" % (gwp_set, list(GWP_SETS)))
+        self.gwp_set = gwp_set
+        self.gwp = {**GWP_SETS[gwp_set], **(gases or {})}
+
+    def to_co2eq(self, series_ghg, series_gas, aliases=None):
+        """
+        Converts emissions to CO2eq: one GWP lookup per distinct gas.
+        :param series_ghg: emissions of each gas
+        :param series_gas: gas of each value
+        :param aliases: dict key -> gas if series_gas holds other keys (ex: PIK units "N2O * gigagram / a")
+        :return: emissions in CO2eq
+        :raise ValueError: listing all the unknown gases
+        """
+        gwp = {key: self.gwp[gas] for key, gas in aliases.items() if gas in self.gwp} if aliases else self.gwp
+        if series_gas.isna().any():
+            raise ValueError("ERR : missing gas for %s values" % series_gas.isna().sum())
+        registry = UnitRegistry().define("GWP " + self.gwp_set, "CO2eq", gwp)
+        try:
+            return registry.convert(series_ghg, series_gas, "CO2eq")
+        except ValueError as e:
+            raise ValueError("ERR : no %s GWP. %s" % (self.gwp_set, e))
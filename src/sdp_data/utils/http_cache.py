@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import requests
+from urllib.parse import urlencode
+from requests.structures import CaseInsensitiveDict
+
+
+class ResponseCache:
+    """
+    On-disk http response cache.
+    Bodies are stored by key (url + params) with their ETag/Last-Modified validators so that
+    expired entries can be revalidated with a conditional request instead of downloaded again.
+    The cache is bounded in size: least recently used entries are evicted first.
+    The index is kept in memory and written by flush() (once per run), not on every request.
+    """
+
+    index_name = 'index.json'
+
+    def __init__(self, path, max_size=2 * 1024 ** 3):
+        self.path = path
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+        self._index = self._load_index()
+        self._dirty = False
+
+    @staticmethod
+    def key(url, params=None):
+        if params:
+            url += '?' + urlencode(sorted(params.items()))
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            if entry['size'] and not os.path.exists(self._body_path(key)):
+                # Body removed outside the cache
+                self._index.pop(key)
+                self._dirty = True
+                return None
+            entry['accessed_at'] = time.time()
+            self._dirty = True
+            return dict(entry)
+
+    @staticmethod
+    def is_fresh(entry, ttl):
+        return bool(ttl) and (time.time() - entry['fetched_at']) < ttl
+
+    @staticmethod
+    def validators(entry):
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, key, url, body, headers):
+        """
+        Stores a response body (or only its validators when body is None, ex: downloaded files).
+        """
+        size = len(body) if body else 0
+        with self._lock:
+            if body:
+                tmp_path = self._body_path(key) + '.tmp'
+                with open(tmp_path, 'wb') as file:
+                    file.write(body)
+                os.replace(tmp_path, self._body_path(key))
+            self._put_entry(key, url, size, headers)
+
+    def iter_body(self, key, response, chunk_size):
+        """
+        Chunks of a streamed response body, written to a part file as they are read (stored by put_streamed()).
+        """
+        with open(self._part_path(key), 'wb') as file:
+            for chunk in response.iter_content(chunk_size):
+                file.write(chunk)
+                yield chunk
+
+    def put_streamed(self, key, url, headers):
+        """
+        Stores the body written by iter_body(), read to the end.
+        """
+        with self._lock:
+            os.replace(self._part_path(key), self._body_path(key))
+            self._put_entry(key, url, os.path.getsize(self._body_path(key)), headers)
+
+    def read_streamed(self, key):
+        """
+        Body written so far by iter_body().
+        """
+        with open(self._part_path(key), 'rb') as file:
+            return file.read()
+
+    def revalidated(self, key):
+        """
+        The server answered 304 Not Modified: the entry is fresh again.
+        """
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is not None:
+                entry['fetched_at'] = entry['accessed_at'] = time.time()
+                self._dirty = True
+
+    def response(self, key, url, entry=None, stream=False):
+        """
+        Cached entry as a requests Response (504 if not cached, as for an 'only-if-cached' request).
+        :param stream: body read from the file as it is consumed (iter_content), not loaded
+        """
+        response = requests.Response()
+        response.url = url
+        response.headers = CaseInsensitiveDict()
+        entry = entry or self._index.get(key)
+        if entry is None:
+            response.status_code = 504
+            response.reason = 'Not cached (offline)'
+            response._content = b''
+            return response
+
+        response.status_code = 200
+        response.reason = 'OK (cached)'
+        if entry.get('content_type'):
+            response.headers['Content-Type'] = entry['content_type']
+        if entry['size'] and stream:
+            response.raw = open(self._body_path(key), 'rb')
+        elif entry['size']:
+            with open(self._body_path(key), 'rb') as file:
+                response._content = file.read()
+        else:
+            response._content = b''
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers) or 'utf-8'
+        return response
+
+    def size(self):
+        return sum(entry['size'] for entry in self._index.values())
+
+    def flush(self):
+        """
+        Writes the index if it changed (atomically: a reader never sees a partial index).
+        """
+        with self._lock:
+            # nothing changed, or cache folder removed (ex: benchmark data reset)
+            if not self._dirty or not os.path.isdir(self.path):
+                return
+            self._save_index()
+            self._dirty = False
+
+    # ---------------------------------------------------------------------------------------------
+    # Private
+
+    def _body_path(self, key):
+        return os.path.join(self.path, key)
+
+    # Index entry of a stored body (lock held)
+    def _put_entry(self, key, url, size, headers):
+        now = time.time()
+        self._index[key] = {'url': url,
+                            'size': size,
+                            'etag': headers.get('ETag'),
+                            'last_modified': headers.get('Last-Modified'),
+                            'content_type': headers.get('Content-Type'),
+                            'fetched_at': now,
+                            'accessed_at': now}
+        self._evict(key)
+        self._dirty = True
+
+    def _part_path(self, key):
+        return os.path.join(self.path, key + '.part')
+
+    def _index_path(self):
+        return os.path.join(self.path, self.index_name)
+
+    def _load_index(self):
+        if not os.path.exists(self._index_path()):
+            return {}
+        try:
+            with open(self._index_path(), 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (IOError, ValueError) as e:
+            print(f'[WARNING] Http cache index unreadable, starting empty: {e}')
+            return {}
+
+    def _save_index(self):
+        tmp_path = f'{self._index_path()}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(self._index, file)
+        os.replace(tmp_path, self._index_path())
+
+    # Least recently used entries out until the cache fits its max size
+    def _evict(self, keep_key=None):
+        total = self.size()
+        if total <= self.max_size:
+            return
+        for key, entry in sorted(self._index.items(), key=lambda item: item[1]['accessed_at']):
+            if total <= self.max_size:
+                break
+            if key == keep_key:
+                continue
+            if entry['size'] and os.path.exists(self._body_path(key)):
+                os.remove(self._body_path(key))
+            total -= entry['size']
+            self._index.pop(key)
@@ -0,0 +1,118 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import requests
+import pandas as pd
+from .iso3166 import countries
+from .download import new_session
+from .concurrency import ordered_map
+
+
+class EiaScrapper:  # TODO - à refactorer
+    """
+    IEA stats api collector (one request per country), shared by the IEA and EIA processors.
+    """
+
+    url_start = "https://www.iea.org/api/stats/getData.php?country="
+    # max concurrent requests of a collector (processes running collectors at the same time share the api)
+    max_workers = 16
+    timeout = (10, 60)
+    # persisted country responses, kept one day
+    cache_path = os.path.join(os.path.dirname(__file__), "../../../data/_cache/iea_api/")
+    cache_ttl = 24 * 3600
+    # keep-alive session of the process, created on first use
+    _session = None
+    _session_lock = threading.Lock()
+
+    def __init__(self, max_workers=None) -> None:
+        self.max_workers = max_workers or self.max_workers
+        self.list_countries = countries
+        self.list_countries_fix = {"AUSTRALI": "Australia",
+                                   "BOSNIAHERZ": "Bosnia and Herzegovina",
+                                   "BOLIVIA": "Bolivia",
+                                   "BRUNEI": "Brunei Darussalam",
+                                   "CONGOREP": "Democratic Republic of the Congo",
+                                   "COTEIVOIRE": "Côte d'Ivoire",
+                                   "COSTARICA": "Costa Rica",
+                                   "DOMINICANR": "Dominican Republic",
+                                   "ELSALVADOR": "Salvador",
+                                   "FYROM": "North Macedonia",
+                                   "IRAN": "Iran",
+                                   "HONGKONG": "Hong Kong Special Administrative Region (China)",
+                                   "KOREA": "South Korea", "KOREADPR": "North Korea", "MOLDOVA": "Moldova",
+                                   "NETHLAND": "Netherlands", "NZ": "New Zealand", "RUSSIA": "Russian Federation",
+                                   "SAUDIARABI": "Saudi Arabia", "SOUTHAFRIC": "South Africa", "SRILANKA": "Sri Lanka",
+                                   "SSUDAN": "South Sudan", "SYRIA": "Syria", "TAIPEI": "Taiwan",
+                                   "TANZANIA": "Tanzania", "UK": "United Kingdom", "USA": "United States",
+                                   "VIETNAM": "Viet Nam", "VENEZUELA": "Venezuela"}
+
+    def collect_eai_dataset(self, url_end):
+        """
+        Collects the dataset of every country, max_workers countries at a time with a shared session.
+        Country responses are persisted (cache_path): after a partial failure, only missing countries are fetched again.
+        :param url_end: series, products and flows of the dataset (ex: "&series=GAS&products=NATGAS&flows=TOTIND")
+        :return: dataframe with columns country, year, flow, product, final_energy, final_energy_unit
+        """
+        country_list = [country.apolitical_name for country in self.list_countries]
+        country_list += self.list_countries_fix.keys()
+        country_list = list(dict.fromkeys(country_list))
+
+        dataset_path = os.path.join(self.cache_path, hashlib.sha1(url_end.encode("utf-8")).hexdigest()[:16])
+        os.makedirs(dataset_path, exist_ok=True)
+        responses = ordered_map(lambda country: self.get_country_response(country, url_end, dataset_path),
+                                country_list, self.max_workers)
+
+        # parse each response straight to columns
+        columns = {"country": [], "year": [], "flow": [], "product": [], "final_energy": []}
+        failed_countries = []
+        for country, res in zip(country_list, responses):
+            if res is None:
+                failed_countries.append(country)
+                continue
+            # countries without data
+            if res.find("2000") == -1:
+                continue
+            c = self.list_countries_fix.get(country, country)
+            for year, values in json.loads(res)["colData"].items():
+                for g in values:
+                    columns["country"].append(c)
+                    columns["year"].append(year)
+                    columns["flow"].append(g["flow"])
+                    columns["product"].append(g["product"])
+                    columns["final_energy"].append(g["value"])
+        if failed_countries:
+            raise IOError("EIA api failed for %s countries: %s" % (len(failed_countries), ", ".join(failed_countries)))
+
+        df = pd.DataFrame(columns)
+        df["final_energy_unit"] = "Ktoe"
+        df = df[df["final_energy"].notnull()]
+        return df
+
+    @classmethod
+    def session(cls):
+        with cls._session_lock:
+            if cls._session is None:
+                cls._session = new_session(cls.max_workers)
+        return cls._session
+
+    def get_country_response(self, country, url_end, dataset_path):
+        """
+        Response text of a country, from the persisted responses if fresh enough.
+        :return: the response text or None if the request failed
+        """
+        file_path = os.path.join(dataset_path, country + ".json")
+        if os.path.exists(file_path) and time.time() - os.path.getmtime(file_path) < self.cache_ttl:
+            with open(file_path, encoding="utf-8") as file:
+                return file.read()
+        try:
+            response = self.session().get(self.url_start + country + url_end, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            print("EIA api error for %s: %s" % (country, e))
+            return None
+        with open(file_path + ".part", "w", encoding="utf-8") as file:
+            file.write(response.text)
+        os.replace(file_path + ".part", file_path)
+        return response.text
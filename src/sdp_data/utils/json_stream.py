@@ -0,0 +1,198 @@
+import json
+import codecs
+import threading
+import pandas as pd
+
+_decoder = json.JSONDecoder()
+_whitespace = ' \t\n\r'
+
+
+class _Reader:
+    """
+    Incremental reader over text decoded from byte (or str) chunks.
+    Only the unread part of the document is kept in memory (plus the value being decoded).
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder('utf-8-sig')()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        if self._eof:
+            return False
+        for chunk in self._chunks:
+            text = self._utf8.decode(chunk) if isinstance(chunk, bytes) else chunk
+            if text:
+                self._buffer = self._buffer[self._pos:] + text
+                self._pos = 0
+                return True
+        self._buffer = self._buffer[self._pos:] + self._utf8.decode(b'', final=True)
+        self._pos = 0
+        self._eof = True
+        return False
+
+    # Next non whitespace character (not consumed), '' at the end of the document
+    def peek(self):
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _whitespace:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, chars):
+        char = self.peek()
+        if char == '' or char not in chars:
+            raise ValueError(f'Invalid json: expected {chars!r}, got {char!r} at {self._pos}')
+        self._pos += 1
+        return char
+
+    # Next complete json value, more chunks read until it can be decoded
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buffer, self._pos)
+                # a number at the end of the buffer may continue in the next chunk
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
+
+
+def _descend(reader, path):
+    # Move the reader to the value at path (object keys and array indexes)
+    for step in path:
+        if isinstance(step, int):
+            reader.expect('[')
+            for _ in range(step):
+                if reader.peek() == ']':
+                    raise KeyError(step)
+                reader.value()
+                if reader.expect(',]') == ']':
+                    raise KeyError(step)
+            if reader.peek() == ']':
+                raise KeyError(step)
+        else:
+            reader.expect('{')
+            while True:
+                if reader.peek() == '}':
+                    raise KeyError(step)
+                key = reader.value()
+                reader.expect(':')
+                if key == step:
+                    break
+                # sibling value skipped (decoded then dropped)
+                reader.value()
+                if reader.expect(',}') == '}':
+                    raise KeyError(step)
+
+
+def iter_array(chunks, path=()):
+    """
+    Yields the elements of a json array one by one, without loading the whole document.
+    :param chunks: iterable of bytes or str (ex: response.iter_content(chunk_size))
+    :param path: keys and indexes of the array in the document
+                 (ex: ['response', 'data'] for EIA, [1] for World Bank, () for a top level array)
+    :raise KeyError: if the document has no value at path (ex: an error message)
+    """
+    reader = _Reader(chunks)
+    _descend(reader, path)
+    if reader.peek() == 'n':
+        # null instead of an empty array (ex: World Bank page without data)
+        return
+    reader.expect('[')
+    if reader.peek() == ']':
+        return
+    while True:
+        yield reader.value()
+        if reader.expect(',]') == ']':
+            return
+
+
+# Nested objects flattened with '.' separated keys (same as pd.json_normalize)
+def flatten(record, prefix=''):
+    flat = {}
+    for key, value in record.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, prefix + key + '.'))
+        else:
+            flat[prefix + key] = value
+    return flat
+
+
+class RecordsDecoder:
+    """
+    Decodes json records to typed columns of declared fields ({field: dtype}, '.' for nested fields),
+    without inferring a schema per page: every page has the same columns and dtypes.
+    Fields not declared are dropped and reported once (on_unknown callback).
+    Values of numeric fields that are not numbers (ex: EIA '--', 'NA', 'W') are set to null and counted
+    by source (ex: a route), see pop_coerced().
+    """
+
+    # Sample values kept per source and field
+    max_coerced_samples = 5
+
+    def __init__(self, fields, on_unknown=None):
+        self.fields = dict(fields)
+        self.on_unknown = on_unknown
+        self._paths = [tuple(field.split('.')) for field in self.fields]
+        # record shapes (top level keys) already checked for unknown fields
+        self._shapes = set()
+        self.unknown = set()
+        # (source, field) -> (count, sample values) of the values set to null (pages may be decoded concurrently)
+        self.coerced = {}
+        self._lock = threading.Lock()
+
+    def decode(self, records, source=None):
+        """
+        :param source: counts the values set to null under that source (ex: a route)
+        """
+        columns = [[] for _ in self._paths]
+        for record in records:
+            shape = tuple(record)
+            if shape not in self._shapes:
+                self._check(record, shape)
+            for path, values in zip(self._paths, columns):
+                value = record
+                for key in path:
+                    value = value.get(key) if isinstance(value, dict) else None
+                values.append(value)
+        return pd.DataFrame({field: self._typed(values, self.fields[field], source, field)
+                             for field, values in zip(self.fields, columns)})
+
+    def pop_coerced(self, source=None):
+        """
+        :return: dict field -> (count, sample values) of the values of a source set to null, since the last call
+        """
+        with self._lock:
+            return {field: self.coerced.pop((key_source, field))
+                    for key_source, field in list(self.coerced) if key_source == source}
+
+    def _check(self, record, shape):
+        self._shapes.add(shape)
+        unknown = set(flatten(record)) - set(self.fields) - self.unknown
+        if unknown:
+            self.unknown |= unknown
+            if self.on_unknown is not None:
+                self.on_unknown(sorted(unknown))
+
+    def _typed(self, values, dtype, source, field):
+        if dtype in ('float64', 'float32', 'Int64'):
+            series = pd.Series(values, dtype=object)
+            typed = pd.to_numeric(series, errors='coerce')
+            coerced = series[typed.isna() & series.notna()]
+            if len(coerced):
+                with self._lock:
+                    count, samples = self.coerced.get((source, field), (0, []))
+                    samples = samples + [str(value) for value in coerced.unique() if str(value) not in samples]
+                    self.coerced[(source, field)] = (count + len(coerced), samples[:self.max_coerced_samples])
+            return typed.astype(dtype)
+        return pd.Series(values, dtype=dtype)
@@ -0,0 +1,122 @@
+import os
+import csv
+import json
+import glob
+import threading
+from datetime import datetime
+from .download import file_sha256
+from .stats import file_rows
+
+# One manifest per source folder (ex: data/_raw/ember/manifest.json)
+MANIFEST_NAME = 'manifest.json'
+
+# Id of the current run (a timestamp: run ids sort in time order)
+run_id = datetime.now().isoformat(timespec='seconds')
+
+_lock = threading.Lock()
+
+
+# Column names of a csv or parquet file
+def file_columns(file_path):
+    if file_path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        return pq.read_schema(file_path).names
+    with open(file_path, encoding='utf-8', newline='') as file:
+        return next(csv.reader(file), [])
+
+
+# Raw file name without folder and extension (ex: ember_file_elec_all_year)
+def file_name(file_path):
+    return os.path.splitext(os.path.basename(file_path))[0]
+
+
+def read(path):
+    """
+    Entries of the manifest of a source folder, by file name.
+    :return: dict {name: {path, sha256, rows, columns, fetched_at, etag, run_id, changed_at}}
+    """
+    filename = os.path.join(path, MANIFEST_NAME)
+    if not os.path.exists(filename):
+        return {}
+    with open(filename, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def update(file_path, etag=None, fetched_at=None):
+    """
+    Records a raw file write: content hash, rows and columns, fetch time and upstream ETag.
+    changed_at and run_id only move when the content hash changes.
+    :return: the file entry
+    """
+    fetched_at = fetched_at or datetime.now().isoformat(timespec='seconds')
+    sha256 = file_sha256(file_path)
+    with _lock:
+        path = os.path.dirname(file_path)
+        entries = read(path)
+        name = file_name(file_path)
+        previous = entries.get(name) or {}
+        file_entry = {
+            'path': file_path,
+            'sha256': sha256,
+            'rows': previous.get('rows') if previous.get('sha256') == sha256 else file_rows(file_path),
+            'columns': previous.get('columns') if previous.get('sha256') == sha256 else file_columns(file_path),
+            'fetched_at': fetched_at,
+            'etag': etag or previous.get('etag'),
+            'run_id': previous.get('run_id'),
+            'changed_at': previous.get('changed_at'),
+        }
+        if previous.get('sha256') != sha256:
+            file_entry['run_id'] = run_id
+            file_entry['changed_at'] = fetched_at
+        entries[name] = file_entry
+        _write(path, entries)
+    return file_entry
+
+
+# Content unchanged upstream (ex: HTTP 304): only the fetch time moves
+def touch(file_path, fetched_at=None):
+    with _lock:
+        path = os.path.dirname(file_path)
+        entries = read(path)
+        file_entry = entries.get(file_name(file_path))
+        if file_entry is None:
+            return None
+        file_entry['fetched_at'] = fetched_at or datetime.now().isoformat(timespec='seconds')
+        _write(path, entries)
+    return file_entry
+
+
+def _write(path, entries):
+    filename = os.path.join(path, MANIFEST_NAME)
+    with open(filename + '.part', 'w', encoding='utf-8') as file:
+        json.dump(entries, file, indent=1)
+    os.replace(filename + '.part', filename)
+
+
+def entry(name, data_path='data/_raw/'):
+    """
+    Manifest entry of a raw file, searched in every source folder.
+    :param name: raw file name (ex: ember_file_elec_all_year)
+    :return: the entry or None if the file was never recorded
+    """
+    for filename in sorted(glob.glob(os.path.join(data_path, '*', MANIFEST_NAME))):
+        with open(filename, encoding='utf-8') as file:
+            entries = json.load(file)
+        if name in entries:
+            return entries[name]
+    return None
+
+
+def changed_since(name, since, data_path='data/_raw/'):
+    """
+    Tells if the content of a raw file changed after a run.
+    :param since: run id or datetime (ex: the run id of the last processing)
+    :return: True if changed after since, or if unknown (never recorded or no since)
+    """
+    file_entry = entry(name, data_path)
+    if file_entry is None or not since or not file_entry.get('changed_at'):
+        return True
+    if isinstance(since, datetime):
+        return file_entry['changed_at'] > since.isoformat(timespec='seconds')
+    # changed by a later run
+    return file_entry['run_id'] > since
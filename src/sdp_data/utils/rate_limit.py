@@ -0,0 +1,61 @@
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: at most `rate` requests per second on average, with bursts up to `burst`.
+    rate=None means unlimited (the bucket can still be paused, ex: after a 429 Retry-After).
+    """
+
+    def __init__(self, rate=None, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if not self.rate:
+                        return
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    # Hold every caller (all workers of the source) for delay seconds
+    def pause(self, delay):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+
+
+# Full jitter exponential backoff: random delay in [0, min(cap, base * 2^retries)]
+def backoff_delay(retries, base, cap=60):
+    return random.uniform(0, min(cap, base * 2 ** retries))
+
+
+# Retry-After header (seconds or http date) in seconds, None if missing or invalid
+def retry_after(response):
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,183 @@
+import io
+import os
+import gzip
+import json
+import time
+import random
+import shutil
+import tempfile
+import hashlib
+import threading
+import requests
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from requests.adapters import HTTPAdapter
+from urllib3.response import HTTPResponse
+
+# Query params never stored in fixtures (secrets)
+SECRET_PARAMS = ('api_key', 'apikey', 'token')
+# Response headers kept in fixtures
+KEPT_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Retry-After')
+
+
+# Request url without secrets and with sorted params: same request, same fixture
+def fixture_url(url):
+    parts = urlsplit(url)
+    params = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                    if key.lower() not in SECRET_PARAMS)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(params), ''))
+
+
+class FixtureStore:
+    """
+    Recorded http responses: an index.json (url, status, headers) and one gzipped body per request.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._index_filename = os.path.join(path, 'index.json')
+        self._lock = threading.Lock()
+        self._index = {}
+        if os.path.exists(self._index_filename):
+            with open(self._index_filename, encoding='utf-8') as file:
+                self._index = json.load(file)
+
+    @staticmethod
+    def key(method, url):
+        return hashlib.sha256((method + ' ' + fixture_url(url)).encode('utf-8')).hexdigest()
+
+    def get(self, method, url):
+        key = self.key(method, url)
+        with self._lock:
+            entry = self._index.get(key)
+        if entry is None:
+            return None, None
+        with gzip.open(self._body_filename(key), 'rb') as file:
+            return entry, file.read()
+
+    def put(self, method, url, status, headers, body):
+        """
+        :param body: bytes, or a binary file read from its current position
+        """
+        key = self.key(method, url)
+        with self._lock:
+            os.makedirs(os.path.join(self.path, 'bodies'), exist_ok=True)
+            with gzip.open(self._body_filename(key), 'wb') as file:
+                if isinstance(body, bytes):
+                    file.write(body)
+                else:
+                    shutil.copyfileobj(body, file)
+            self._index[key] = {'method': method, 'url': fixture_url(url), 'status': status,
+                                'headers': {name: headers[name] for name in KEPT_HEADERS if name in headers}}
+            with open(self._index_filename + '.part', 'w', encoding='utf-8') as file:
+                json.dump(self._index, file, indent=1)
+            os.replace(self._index_filename + '.part', self._index_filename)
+
+    def __len__(self):
+        return len(self._index)
+
+    def _body_filename(self, key):
+        return os.path.join(self.path, 'bodies', key + '.gz')
+
+
+class _RecordedBody:
+    """
+    Raw body of a response recorded (decompressed, to a temporary file) as the caller reads it:
+    stored once read to the end, streamed responses stay streamed.
+    """
+
+    def __init__(self, raw, on_end):
+        self._raw = raw
+        self._on_end = on_end
+        self._file = tempfile.TemporaryFile()
+
+    def stream(self, amt=2 ** 16, decode_content=None):
+        for chunk in self._raw.stream(amt, decode_content=True):
+            self._file.write(chunk)
+            yield chunk
+        self._end()
+
+    def read(self, amt=None, decode_content=None, **kwargs):
+        chunk = self._raw.read(amt, decode_content=True, **kwargs)
+        self._file.write(chunk)
+        if amt is None or not chunk:
+            self._end()
+        return chunk
+
+    def _end(self):
+        if self._file.closed:
+            return
+        self._file.seek(0)
+        try:
+            self._on_end(self._file)
+        finally:
+            self._file.close()
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class RecordAdapter(HTTPAdapter):
+    """
+    Sends requests as usual and records every response in the fixture store (once its body is read to the end).
+    """
+
+    def __init__(self, store, **kwargs):
+        super().__init__(**kwargs)
+        self.store = store
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        # partial and not modified responses are not the resource
+        if response.status_code not in (206, 304):
+            response.raw = _RecordedBody(response.raw, lambda body: self.store.put(
+                request.method, request.url, response.status_code, response.headers, body))
+        return response
+
+
+class ReplayAdapter(HTTPAdapter):
+    """
+    Serves recorded responses, no network. Unknown requests get a 404.
+    :param latency: seconds added to each response, or a (min, max) range
+    :param error_rate: share of requests failing with error_status (0 = connection error)
+    """
+
+    def __init__(self, store, latency=0, error_rate=0, error_status=503, seed=None, **kwargs):
+        super().__init__(**kwargs)
+        self.store = store
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = 0
+        self.misses = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        with self._lock:
+            self.requests += 1
+            delay = self.latency if not isinstance(self.latency, (tuple, list)) else self._random.uniform(*self.latency)
+            error = self.error_rate and self._random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if error:
+            if not self.error_status:
+                raise requests.exceptions.ConnectionError(f'Injected connection error: {request.url}', request=request)
+            return self._response(request, self.error_status, {'Retry-After': '0'}, b'')
+
+        entry, body = self.store.get(request.method, request.url)
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            return self._response(request, 404, {'X-Replay': 'miss'}, b'')
+        return self._response(request, entry['status'], entry['headers'], body)
+
+    def _response(self, request, status, headers, body):
+        raw = HTTPResponse(body=io.BytesIO(body), headers={**headers, 'Content-Length': str(len(body))},
+                           status=status, preload_content=False, decode_content=False)
+        return self.build_response(request, raw)
+
+
+def mount(session, adapter):
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
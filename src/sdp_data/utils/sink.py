@@ -0,0 +1,156 @@
+import os
+import shutil
+import pandas as pd
+
+
+class CsvSink:
+    """
+    Appends dataframe pages to a csv file as they arrive (peak memory = one page).
+    Pages are written to a '.part' file moved into place on close, so a failed run
+    keeps the previous file. The declared fields ({column: dtype}), or else the first page, fix the columns.
+    """
+
+    extension = 'csv'
+
+    def __init__(self, path, fields=None):
+        self.path = path
+        self.tmp_path = path + '.part'
+        self.fields = dict(fields) if fields else None
+        self.columns = list(self.fields) if self.fields else None
+        self.rows = 0
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+        return False
+
+    def write(self, df):
+        if df is None or df.empty:
+            return
+        df = self._conform(df)
+        self._write(df)
+        self.rows += len(df)
+
+    def close(self):
+        self._close_file()
+        if self.rows:
+            os.replace(self.tmp_path, self.path)
+        elif os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def discard(self):
+        self._close_file()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    # ---------------------------------------------------------------------------------------------
+    # Private
+
+    # Same columns (and order) for every page
+    def _conform(self, df):
+        if self.columns is None:
+            self.columns = list(df.columns)
+            return df
+        new_columns = [column for column in df.columns if column not in self.columns]
+        if new_columns:
+            print(f'[WARNING] Columns not in first page dropped: {new_columns}')
+        return df.reindex(columns=self.columns)
+
+    def _write(self, df):
+        if self._file is None:
+            self._file = open(self.tmp_path, 'w', encoding='utf-8', newline='')
+            df.to_csv(self._file, index=False)
+        else:
+            df.to_csv(self._file, index=False, header=False)
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ParquetSink(CsvSink):
+    """
+    Same as CsvSink but each page is a parquet row group.
+    The schema is that of the declared fields, or else of the first page (text columns as strings):
+    a page that does not fit it fails the write instead of losing values.
+    Strings are dictionary encoded and pages compressed (zstd).
+    """
+
+    extension = 'parquet'
+    compression = 'zstd'
+
+    def __init__(self, path, fields=None):
+        super().__init__(path, fields)
+        self.schema = None
+
+    def _write(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self.fields:
+            # json normalized pages: mixed values (ex: numbers and text) stored as text
+            text_columns = [column for column in df.columns if df[column].dtype == object]
+            if text_columns:
+                df = df.astype({column: 'string' for column in text_columns})
+        if self.schema is None:
+            typed_df = pd.DataFrame({field: pd.Series(dtype=dtype) for field, dtype in self.fields.items()}) if self.fields else df
+            self.schema = pa.Schema.from_pandas(typed_df, preserve_index=False)
+            self._file = pq.ParquetWriter(self.tmp_path, self.schema, compression=self.compression, use_dictionary=True)
+        self._file.write_table(pa.Table.from_pandas(df, schema=self.schema, preserve_index=False))
+
+
+class PartitionedParquetSink(CsvSink):
+    """
+    Parquet dataset partitioned by a column (folders <column>=<value>/), one file per chunk and partition.
+    Dtypes of the first chunk are kept (categories as dictionaries), later chunks are cast to its schema.
+    The dataset is written to a '.part' folder moved into place on close.
+    """
+
+    extension = 'parquet'
+
+    def __init__(self, path, partition_column):
+        super().__init__(path)
+        self.partition_column = partition_column
+        self.schema = None
+        self.chunks = 0
+
+    def close(self):
+        if self.rows:
+            if os.path.exists(self.path):
+                shutil.rmtree(self.path)
+            os.replace(self.tmp_path, self.path)
+        else:
+            self.discard()
+
+    def discard(self):
+        if os.path.exists(self.tmp_path):
+            shutil.rmtree(self.tmp_path)
+
+    def _write(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.schema is None:
+            if os.path.exists(self.tmp_path):
+                shutil.rmtree(self.tmp_path)
+            # Same dictionary index type whatever the number of categories of a chunk
+            self.schema = pa.schema([pa.field(field.name, pa.dictionary(pa.int32(), field.type.value_type))
+                                     if pa.types.is_dictionary(field.type) else field for field in table.schema])
+        pq.write_to_dataset(table.cast(self.schema), self.tmp_path, partition_cols=[self.partition_column],
+                            basename_template=f'part-{self.chunks}-{{i}}.parquet', compression=ParquetSink.compression)
+        self.chunks += 1
+
+
+sinks = {'csv': CsvSink, 'parquet': ParquetSink}
+
+
+def new_sink(path, format='csv', fields=None):
+    return sinks[format](path, fields)
@@ -0,0 +1,244 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import inspect
+import pandas as pd
+from .download import file_sha256
+
+
+class StageCache:
+    """
+    On-disk cache of pipeline stage outputs (one parquet file per output dataset).
+    Entries are keyed by what the outputs are computed from: the stage input datasets (their own keys),
+    its raw files content, its processors code (with the modules it depends on, under code_root)
+    and its parameters. An unchanged stage is a cache lookup.
+    The files a stage exports (ex: published csv) are stored with its outputs, to be written again on a hit.
+    The cache is bounded in size: least recently used entries are evicted first.
+    """
+
+    index_name = 'index.json'
+    files_name = 'files.json'
+
+    def __init__(self, path, max_size=5 * 1024 ** 3, code_root=None):
+        """
+        :param code_root: folder of the pipeline code: the source files of the modules (under it) the stages code
+            depends on are part of the keys. None: only the stages code itself
+        """
+        self.path = path
+        self.max_size = max_size
+        self.code_root = code_root
+        os.makedirs(self.path, exist_ok=True)
+        self._index = self._load(self.index_name)
+        # Raw files sha256 by path, reused while their size and mtime do not change
+        self._files = self._load(self.files_name)
+
+    def key(self, stage, input_keys):
+        """
+        Key of a stage run: sha256 of its name, input dataset keys, raw files, processors code (and modules)
+        and parameters.
+        :param input_keys: keys of the stage input datasets, in stage inputs order
+        """
+        sha = hashlib.sha256()
+        sha.update(stage.name.encode('utf-8'))
+        for input_key in input_keys:
+            sha.update(input_key.encode('utf-8'))
+        for file_path in stage.files:
+            sha.update(self.file_fingerprint(file_path).encode('utf-8'))
+        codes = [stage.func] + list(stage.processors)
+        for code in codes:
+            sha.update(code_fingerprint(code).encode('utf-8'))
+        if self.code_root:
+            for module_path in module_files(codes, self.code_root):
+                sha.update(self.file_fingerprint(module_path).encode('utf-8'))
+        sha.update(json.dumps(stage.params, sort_keys=True, default=str).encode('utf-8'))
+        return sha.hexdigest()
+
+    @staticmethod
+    def dataset_key(stage_key, dataset):
+        return hashlib.sha256((stage_key + dataset).encode('utf-8')).hexdigest()
+
+    def file_fingerprint(self, file_path):
+        """
+        Content sha256 of a raw file (of each file of a folder), recomputed only when the size or mtime changed.
+        """
+        if os.path.isdir(file_path):
+            return ''.join(self.file_fingerprint(os.path.join(file_path, name)) for name in sorted(os.listdir(file_path)))
+        if not os.path.exists(file_path):
+            return 'missing:' + file_path
+        stat = os.stat(file_path)
+        known = self._files.get(file_path)
+        if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+            return known['sha256']
+        sha256 = file_sha256(file_path)
+        self._files[file_path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256}
+        self._save(self.files_name, self._files)
+        return sha256
+
+    def get(self, key, outputs, exports=()):
+        """
+        :param exports: files exported by the stage, cached too
+        :return: dict output dataset -> parquet path, or None if not cached
+        """
+        entry = self._index.get(key)
+        if entry is None:
+            return None
+        paths = {output: self._output_path(key, output) for output in outputs}
+        export_paths = [_export_path(os.path.join(self.path, key), i, export) for i, export in enumerate(exports)]
+        if not all(os.path.exists(path) for path in list(paths.values()) + export_paths):
+            # Files removed outside the cache
+            self._index.pop(key)
+            self._save(self.index_name, self._index)
+            return None
+        entry['accessed_at'] = time.time()
+        self._save(self.index_name, self._index)
+        return paths
+
+    def restore(self, key, exports):
+        """
+        Writes again the exported files of a cached stage run that are missing or differ from the cached ones.
+        :return: restored file paths
+        """
+        restored = []
+        for i, export in enumerate(exports):
+            cached_path = _export_path(os.path.join(self.path, key), i, export)
+            if os.path.exists(export) and self.file_fingerprint(export) == self.file_fingerprint(cached_path):
+                continue
+            os.makedirs(os.path.dirname(os.path.abspath(export)), exist_ok=True)
+            shutil.copy2(cached_path, export)
+            restored.append(export)
+        return restored
+
+    @staticmethod
+    def write(path, key, outputs, exports=()):
+        """
+        Writes the outputs of a stage run (from any process), made visible by put().
+        :param outputs: dict output dataset -> dataframe
+        :param exports: files written by the stage run, copied in the entry
+        :return: written size in bytes
+        """
+        entry_path = os.path.join(path, key)
+        tmp_path = entry_path + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for output, df in outputs.items():
+            df.to_parquet(os.path.join(tmp_path, output + '.parquet'), index=False, compression='zstd')
+        for i, export in enumerate(exports):
+            export_path = _export_path(tmp_path, i, export)
+            os.makedirs(os.path.dirname(export_path), exist_ok=True)
+            shutil.copy2(export, export_path)
+        shutil.rmtree(entry_path, ignore_errors=True)
+        os.replace(tmp_path, entry_path)
+        return sum(os.path.getsize(os.path.join(folder, name))
+                   for folder, _, names in os.walk(entry_path) for name in names)
+
+    def put(self, key, stage_name, size):
+        now = time.time()
+        self._index[key] = {'stage': stage_name, 'size': size, 'created_at': now, 'accessed_at': now}
+        self._evict(key)
+        self._save(self.index_name, self._index)
+
+    def size(self):
+        return sum(entry['size'] for entry in self._index.values())
+
+    # ---------------------------------------------------------------------------------------------
+    # Private
+
+    def _output_path(self, key, output):
+        return os.path.join(self.path, key, output + '.parquet')
+
+    def _load(self, name):
+        file_path = os.path.join(self.path, name)
+        if not os.path.exists(file_path):
+            return {}
+        try:
+            with open(file_path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (IOError, ValueError) as e:
+            print(f'[WARNING] Stage cache {name} unreadable, starting empty: {e}')
+            return {}
+
+    def _save(self, name, data):
+        file_path = os.path.join(self.path, name)
+        with open(file_path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(data, file)
+        os.replace(file_path + '.tmp', file_path)
+
+    # Least recently used entries out until the cache fits its max size
+    def _evict(self, keep_key=None):
+        total = self.size()
+        for key, entry in sorted(self._index.items(), key=lambda item: item[1]['accessed_at']):
+            if total <= self.max_size:
+                break
+            if key == keep_key:
+                continue
+            shutil.rmtree(os.path.join(self.path, key), ignore_errors=True)
+            total -= entry['size']
+            self._index.pop(key)
+
+
+def code_fingerprint(code):
+    """
+    sha256 of the source code of a class or function (of the function wrapped by a partial or bound method).
+    """
+    code = _unwrap(code)
+    try:
+        source = inspect.getsource(code)
+    except (OSError, TypeError):
+        source = getattr(code, '__qualname__', repr(code))
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+def module_files(codes, root):
+    """
+    Source files under root of the modules of classes or functions, and of the modules they depend on,
+    transitively (ex: a stage module and the utils it uses). Functions depend on the globals they reference,
+    modules and classes on all the globals of their module.
+    :return: sorted absolute paths
+    """
+    root = os.path.abspath(root) + os.sep
+    files, seen = set(), set()
+    pending = [_unwrap(code) for code in codes]
+    while pending:
+        obj = pending.pop()
+        module = obj if inspect.ismodule(obj) else inspect.getmodule(obj)
+        module_path = os.path.abspath(getattr(module, '__file__', None) or '')
+        if module is None or not module_path.startswith(root) or id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        files.add(module_path)
+        if inspect.isfunction(obj):
+            values = [obj.__globals__[name] for name in _code_names(obj.__code__) if name in obj.__globals__]
+        else:
+            values = vars(module).values()
+            obj = module
+            if id(module) in seen:
+                continue
+            seen.add(id(module))
+        pending.extend(value for value in values
+                       if inspect.ismodule(value) or inspect.isclass(value) or inspect.isfunction(value))
+    return sorted(files)
+
+
+# Global (and attribute) names used by a function code, nested functions included
+def _code_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _code_names(const)
+    return names
+
+
+# Copy of an exported file in a cache entry (numbered: exports of different folders can share a name)
+def _export_path(entry_path, i, export):
+    return os.path.join(entry_path, 'exports', f'{i}_{os.path.basename(export)}')
+
+
+def _unwrap(code):
+    code = getattr(code, 'func', code)
+    return getattr(code, '__func__', code)
+
+
+def read_output(path):
+    return pd.read_parquet(path)
@@ -0,0 +1,47 @@
+import os
+
+# Output files counted in run summaries
+DATA_EXTENSIONS = ('.csv', '.parquet')
+
+
+# Rows of a csv (without header) or parquet file, None if unknown
+def file_rows(file_path, chunk_size=1024 * 1024):
+    if file_path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        return pq.read_metadata(file_path).num_rows
+    if file_path.endswith('.csv'):
+        lines = 0
+        last = b'\n'
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(chunk_size), b''):
+                lines += chunk.count(b'\n')
+                last = chunk[-1:]
+        # last line without line break
+        if last != b'\n':
+            lines += 1
+        return max(0, lines - 1)
+    return None
+
+
+def output_stats(path, since=None):
+    """
+    Counts the data files written in path (recursively) since a timestamp.
+    Rows are counted from line breaks, so quoted multi line values are over counted.
+    :param path: output folder of a source (ex: data/_raw/eia/)
+    :param since: time.time() timestamp, all files if None
+    :return: dict with files, bytes and rows
+    """
+    stats = {'files': 0, 'bytes': 0, 'rows': 0}
+    if not os.path.isdir(path):
+        return stats
+    for root, _, files in os.walk(path):
+        for name in files:
+            if not name.endswith(DATA_EXTENSIONS):
+                continue
+            file_path = os.path.join(root, name)
+            if since is not None and os.path.getmtime(file_path) < since:
+                continue
+            stats['files'] += 1
+            stats['bytes'] += os.path.getsize(file_path)
+            stats['rows'] += file_rows(file_path) or 0
+    return stats
@@ -0,0 +1,56 @@
+import os
+import pandas as pd
+
+# Storage formats, in reading preference order
+FORMATS = ('parquet', 'csv')
+
+
+def find(name, formats=FORMATS):
+    """
+    Stored file (or parquet dataset folder) of a name without extension, parquet first.
+    :param name: path without extension (ex: data/_raw/wb/__info_wb_api_countries)
+    :return: the path or None if not stored in any format
+    """
+    for format in formats:
+        path = name + '.' + format
+        if os.path.exists(path):
+            return path
+    # partitioned dataset folder (ex: data/_processed/ember/ember_file_elec_all_month/)
+    if os.path.isdir(name):
+        return name
+    return None
+
+
+def read(path, columns=None, filters=None, text=False):
+    """
+    Loads a csv or parquet file (or a parquet dataset folder) reading only the given columns.
+    :param path: file path, or path without extension (parquet first, then csv)
+    :param columns: columns to load, all if None
+    :param filters: parquet row filters (ex: [('year', '=', 2022)]), partitions not read are skipped
+    :param text: values as text (csv not typed, parquet values converted)
+    :return: dataframe
+    """
+    found = path if os.path.exists(path) else find(path)
+    if found is None:
+        raise FileNotFoundError(f'No csv or parquet file for: {path}')
+    if found.endswith('.csv'):
+        if text:
+            return pd.read_csv(found, usecols=columns, dtype=str, keep_default_na=False)
+        return pd.read_csv(found, usecols=columns)
+    df = pd.read_parquet(found, columns=columns, filters=filters)
+    if text:
+        df = df.astype(object).where(df.notna(), '').astype(str)
+    return df
+
+
+def export_csv(parquet_path, csv_path):
+    """
+    Writes a csv copy of a parquet file, one row group at a time.
+    """
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(parquet_path)
+    with open(csv_path + '.part', 'w', encoding='utf-8', newline='') as file:
+        for i in range(parquet_file.num_row_groups):
+            parquet_file.read_row_group(i).to_pandas().to_csv(file, index=False, header=(i == 0))
+    os.replace(csv_path + '.part', csv_path)
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+
+class UnitRegistry:
+    """
+    Units by dimension: each dimension has a canonical unit and the factor of each unit to it
+    (value in canonical unit = value * factor).
+    A dimension can be a physical quantity (energy) or a source specific one (ex: 'Gas' reserves volumes).
+    """
+
+    def __init__(self):
+        self.canonicals = {}
+        self.factors = {}
+
+    @classmethod
+    def from_factors(cls, dict_units_coef, default_unit):
+        """
+        Registry of factor tables by dimension, ex: {'Gas': {'BCF': 1, 'BCM': 35.3147}} and {'Gas': 'BCF'}.
+        """
+        registry = cls()
+        for dimension, factors in dict_units_coef.items():
+            registry.define(dimension, default_unit[dimension], factors)
+        return registry
+
+    def define(self, dimension, canonical, factors):
+        self.canonicals[dimension] = canonical
+        self.factors[dimension] = {canonical: 1, **factors}
+        return self
+
+    def dimension(self, unit):
+        """
+        :return: the dimension of a unit, None if unknown or in several dimensions
+        """
+        dimensions = [dimension for dimension, factors in self.factors.items() if unit in factors]
+        return dimensions[0] if len(dimensions) == 1 else None
+
+    def factor(self, unit, target=None, dimension=None):
+        """
+        Factor from unit to target (canonical unit of the dimension if None).
+        :return: the factor, None if a unit is unknown in the dimension
+        """
+        dimension = dimension if dimension is not None else self.dimension(unit)
+        factors = self.factors.get(dimension, {})
+        target = target if target is not None else self.canonicals.get(dimension)
+        if unit not in factors or target not in factors:
+            return None
+        if target == self.canonicals[dimension]:
+            return factors[unit]
+        return factors[unit] / factors[target]
+
+    def convert(self, series_value, series_unit, target=None, dimension=None):
+        """
+        Converts values in bulk: the factor is resolved once per distinct (dimension, unit, target).
+        :param series_value: values
+        :param series_unit: unit of each value
+        :param target: target unit, or dict unit -> target unit (other units kept as is, with a warning
+                       listing those not already a target unit), or None for the canonical unit of the dimension
+        :param dimension: dimension of the units (or of each value, as a series), found from the units if None
+        :return: converted values (the unit column is left to the caller), values without unit kept as is
+        :raise ValueError: listing all the unknown units (units without dimension included)
+        """
+        # Distinct units (categorical codes, -1 if missing), by dimension if given per value
+        codes, keys = pd.factorize(pd.Series(series_unit, index=series_value.index))
+        keys = [(unit, dimension) for unit in keys]
+        unknown = []
+        if isinstance(dimension, pd.Series):
+            dimension_codes, dimensions = pd.factorize(dimension)
+            unknown += [f"{keys[code][0]} (no dimension)" for code in np.unique(codes[(codes >= 0) & (dimension_codes < 0)])]
+            pair_codes = codes * len(dimensions) + dimension_codes
+            valid = (codes >= 0) & (dimension_codes >= 0)
+            pairs, codes[valid] = np.unique(pair_codes[valid], return_inverse=True)
+            codes[~valid] = -1
+            keys = [(keys[pair // len(dimensions)][0], dimensions[pair % len(dimensions)]) for pair in pairs]
+
+        # A factor for each distinct unit, the last one (code -1: values without unit) is 1
+        factors = np.ones(len(keys) + 1)
+        untargeted = []
+        for i, (unit, unit_dimension) in enumerate(keys):
+            unit_target = target.get(unit) if isinstance(target, dict) else target
+            if isinstance(target, dict) and unit_target is None:
+                if unit not in target.values():
+                    untargeted.append(str(unit))
+                continue
+            factor = self.factor(unit, unit_target, unit_dimension)
+            if factor is None:
+                unknown.append(f"{unit} ({unit_dimension})" if unit_dimension is not None else str(unit))
+            else:
+                factors[i] = factor
+        if unknown:
+            raise ValueError(f"Unknown units {sorted(set(unknown))} (to {target})")
+        if untargeted:
+            print(f"[WARNING] Units without target kept as is: {sorted(set(untargeted))} (to {target})")
+
+        return series_value * factors[codes]
+
+
+# Energy and electricity units
+units = UnitRegistry()
+units.define("energy", "Mtoe", {"Ktoe": 0.001, "ktoe": 0.001, "toe": 10 ** -6, "TJ": 2.388 * 10 ** -5, "PJ": 0.02388,
+                                "QBTU": 25.199})
+units.define("electricity", "TWh", {"GWh": 0.001, "MWh": 10 ** -6, "kWh": 10 ** -9})
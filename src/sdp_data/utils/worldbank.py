@@ -0,0 +1,99 @@
+import os
+import re
+import time
+import bisect
+import zipfile
+import pandas as pd
+
+# World Bank bulk download: a whole indicator (all countries, all years) as one zipped csv
+BULK_URL = 'https://api.worldbank.org/v2/en/indicator/%s?downloadformat=csv'
+
+ID_COLUMNS = ['Country Name', 'Country Code', 'Indicator Name', 'Indicator Code']
+
+
+def indicator_csv_url(indicator):
+    return BULK_URL % indicator
+
+
+def read_indicator_zip(zip_path):
+    """
+    Reads the indicator csv of a World Bank bulk archive, decompressed as a stream (no extraction),
+    and melts the year columns to one row per country and year.
+    Rows are ordered as the json api: countries in file order, most recent year first.
+    :return: dataframe with columns country_code, country_name, indicator_code, indicator_name, year, value
+    """
+    with zipfile.ZipFile(zip_path) as archive:
+        # API_<indicator>_DS2_... (the other members are country and indicator metadata)
+        data_name = next(name for name in archive.namelist() if name.startswith('API_'))
+        with archive.open(data_name) as data_file:
+            df = pd.read_csv(data_file, skiprows=4, encoding='utf-8-sig')
+
+    years = sorted([column for column in df.columns if str(column).strip().isdigit()], reverse=True)
+    df['order'] = range(len(df))
+    df = df.melt(id_vars=ID_COLUMNS + ['order'], value_vars=years, var_name='year', value_name='value')
+    df = df.sort_values('order', kind='stable').drop(columns='order').reset_index(drop=True)
+    df['year'] = df['year'].astype(str).str.strip()
+
+    return df.rename(columns={'Country Code': 'country_code', 'Country Name': 'country_name',
+                              'Indicator Code': 'indicator_code', 'Indicator Name': 'indicator_name'})
+
+
+class IndicatorCatalogue:
+    """
+    World Bank indicator ids sorted for prefix search, with the archive and suffix facets precomputed.
+    A glob pattern (ex: 'EG.USE.*') is answered from the ids sharing its literal prefix only.
+    """
+
+    # Archived indicators source
+    archive_source = '57'
+    # Relative indicators (%, growth rates): only matched by patterns asking for them
+    relative_suffixes = ('.ZS', '.ZG')
+
+    def __init__(self, ids, source_ids):
+        # catalogue order kept for the results
+        self.ids = [str(id) for id in ids]
+        order = sorted(range(len(self.ids)), key=self.ids.__getitem__)
+        self._sorted_ids = [self.ids[i] for i in order]
+        self._positions = order
+        self._archived = {i for i, source_id in enumerate(source_ids) if str(source_id) == self.archive_source}
+        self._suffixes = {suffix: {i for i, id in enumerate(self.ids) if id.endswith(suffix)}
+                          for suffix in self.relative_suffixes}
+
+    @classmethod
+    def from_df(cls, df):
+        return cls(df['id'].tolist(), df['source.id'].tolist())
+
+    def match(self, pattern):
+        """
+        Indicator ids matching a glob pattern, archives and relative indicators (unless asked) excluded.
+        :return: ids in catalogue order
+        """
+        prefix = pattern.split('*', 1)[0]
+        start = bisect.bisect_left(self._sorted_ids, prefix)
+        end = bisect.bisect_left(self._sorted_ids, prefix + '\uffff') if prefix else len(self._sorted_ids)
+        regex = re.compile('^' + re.escape(pattern).replace(r'\*', '.*') + '$')
+
+        excluded = set(self._archived)
+        for suffix, positions in self._suffixes.items():
+            if suffix not in pattern:
+                excluded |= positions
+        positions = sorted(self._positions[i] for i in range(start, end)
+                           if self._positions[i] not in excluded and regex.match(self._sorted_ids[i]))
+        return [self.ids[i] for i in positions]
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        source_ids = [self.archive_source if i in self._archived else '' for i in range(len(self.ids))]
+        pd.DataFrame({'id': self.ids, 'source.id': source_ids}).to_parquet(path + '.part', index=False)
+        os.replace(path + '.part', path)
+
+    @classmethod
+    def load(cls, path, ttl, source_path=None):
+        """
+        Persisted catalogue if younger than ttl seconds (and than the source file), None otherwise.
+        """
+        if not os.path.exists(path) or time.time() - os.path.getmtime(path) > ttl:
+            return None
+        if source_path and os.path.exists(source_path) and os.path.getmtime(source_path) > os.path.getmtime(path):
+            return None
+        return cls.from_df(pd.read_parquet(path))